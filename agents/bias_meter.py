@@ -14,24 +14,13 @@ This is useful for ensuring balanced contracts and identifying potentially
 one-sided agreements that may need renegotiation.
 """
 from google import genai
-from google.genai.errors import ClientError
 
+from agents.runtime import arun_agent, run_agent
+from agents.schemas import BiasAnalysis
 
-def analyze_bias(contract_text: str, client: genai.Client) -> dict:
-    """
-    Analyzes contract fairness and bias between parties.
-
-    Args:
-        contract_text: The contract text to analyze
-        client: The Gemini AI client instance
-
-    Returns:
-        Dictionary containing bias analysis results with score and reasoning
-    """
-    if not contract_text or len(contract_text.strip()) < 20:
-        return {"error": "Please provide a valid contract text."}
 
-    prompt = f"""
+def _build_prompt(contract_text: str) -> str:
+    return f"""
 You are a contract fairness analyzer.
 
 Analyze the contract and determine:
@@ -43,26 +32,36 @@ Contract:
 {contract_text}
 """
 
-    try:
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt
-        )
-    except ClientError as e:
-        if "429" in str(e):
-            return {"error": "AI quota exceeded. Please try again later."}
-        return {"error": str(e)}
 
-    if getattr(response, "text", None):
-        return {"bias_analysis": response.text}
+def analyze_bias(contract_text: str, client: genai.Client) -> dict:
+    """
+    Analyzes contract fairness and bias between parties.
+
+    Args:
+        contract_text: The contract text to analyze
+        client: The Gemini AI client instance
 
-    try:
-        for c in response.candidates:
-            for p in c.content.parts:
-                if hasattr(p, "text"):
-                    return {"bias_analysis": p.text}
-    except Exception:
-        pass
+    Returns:
+        Dictionary containing bias analysis results with score and reasoning
+    """
+    return run_agent(
+        client,
+        "bias_meter",
+        contract_text,
+        _build_prompt,
+        "bias_analysis",
+        "Unable to analyze contract bias.",
+        schema=BiasAnalysis,
+    )
 
-    return {"error": "Unable to analyze contract bias."}
 
+async def analyze_bias_async(contract_text: str, client: genai.Client) -> dict:
+    return await arun_agent(
+        client,
+        "bias_meter",
+        contract_text,
+        _build_prompt,
+        "bias_analysis",
+        "Unable to analyze contract bias.",
+        schema=BiasAnalysis,
+    )
@@ -1,14 +1,10 @@
 #it sets up a prompt so that when the api calls clause extractor it acts as a paralegal and knows how gemini should answer the questions as
 from google import genai
-from google.genai.errors import ClientError
 
-def extract_clauses(contract_text: str, client: genai.Client) -> dict:
-    if not contract_text or len(contract_text.strip()) < 20:
-        return {
-            "error": "Please provide a valid contract text."
-        }
+from agents.runtime import arun_agent, run_agent
 
-    prompt = f"""
+def _build_prompt(contract_text: str) -> str:
+    return f"""
     You are a legal paralegal AI.
 
     Extract the following clauses from the contract.
@@ -25,26 +21,24 @@ def extract_clauses(contract_text: str, client: genai.Client) -> dict:
     {contract_text}
     """
 
-    try:
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",  # ✅ quota-safe
-            contents=prompt
-        )
-    except ClientError as e:
-        if "429" in str(e):
-            return {"error": "AI quota exceeded. Please try again later."}
-        return {"error": str(e)}
-
-    # Safe extraction
-    if getattr(response, "text", None):
-        return {"clauses": response.text}
-
-    try:
-        for c in response.candidates:
-            for p in c.content.parts:
-                if hasattr(p, "text"):
-                    return {"clauses": p.text}
-    except Exception:
-        pass
-
-    return {"error": "Unable to extract clauses."}
+
+def extract_clauses(contract_text: str, client: genai.Client) -> dict:
+    return run_agent(
+        client,
+        "clause_extractor",
+        contract_text,
+        _build_prompt,
+        "clauses",
+        "Unable to extract clauses.",
+    )
+
+
+async def extract_clauses_async(contract_text: str, client: genai.Client) -> dict:
+    return await arun_agent(
+        client,
+        "clause_extractor",
+        contract_text,
+        _build_prompt,
+        "clauses",
+        "Unable to extract clauses.",
+    )
@@ -8,24 +8,13 @@ unusual payment terms, identity/authority risks, or other fraud indicators.
 Does NOT provide legal advice; provides decision-support insights.
 """
 from google import genai
-from google.genai.errors import ClientError
 
+from agents.runtime import arun_agent, run_agent
+from agents.schemas import FraudIndicators
 
-def detect_fraud_indicators(contract_text: str, client: genai.Client) -> dict:
-    """
-    Scans contract text for fraud risk indicators.
-
-    Args:
-        contract_text: The contract text to analyze
-        client: The Gemini AI client instance
-
-    Returns:
-        Dictionary containing fraud_indicators text (or error key on failure)
-    """
-    if not contract_text or len(contract_text.strip()) < 20:
-        return {"error": "Please provide a valid contract text."}
 
-    prompt = f"""
+def _build_prompt(contract_text: str) -> str:
+    return f"""
 You are a contract fraud-risk analyst.
 
 Analyze the contract for fraud-related red flags, such as:
@@ -49,25 +38,36 @@ Contract:
 {contract_text}
 """
 
-    try:
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt,
-        )
-    except ClientError as e:
-        if "429" in str(e):
-            return {"error": "AI quota exceeded. Please try again later."}
-        return {"error": str(e)}
 
-    if getattr(response, "text", None):
-        return {"fraud_indicators": response.text}
+def detect_fraud_indicators(contract_text: str, client: genai.Client) -> dict:
+    """
+    Scans contract text for fraud risk indicators.
+
+    Args:
+        contract_text: The contract text to analyze
+        client: The Gemini AI client instance
+
+    Returns:
+        Dictionary containing fraud_indicators text (or error key on failure)
+    """
+    return run_agent(
+        client,
+        "fraud_detector",
+        contract_text,
+        _build_prompt,
+        "fraud_indicators",
+        "Unable to detect fraud indicators.",
+        schema=FraudIndicators,
+    )
 
-    try:
-        for c in response.candidates:
-            for p in c.content.parts:
-                if hasattr(p, "text"):
-                    return {"fraud_indicators": p.text}
-    except Exception:
-        pass
 
-    return {"error": "Unable to detect fraud indicators."}
+async def detect_fraud_indicators_async(contract_text: str, client: genai.Client) -> dict:
+    return await arun_agent(
+        client,
+        "fraud_detector",
+        contract_text,
+        _build_prompt,
+        "fraud_indicators",
+        "Unable to detect fraud indicators.",
+        schema=FraudIndicators,
+    )
@@ -0,0 +1,90 @@
+"""
+Incremental re-analysis of revised contract versions.
+
+When a new version of a contract is analyzed under the same document id, the
+chunk diff from rag_qa.plan_ingest says which clauses were added or removed.
+An agent only needs to run again if one of those clauses touches the clause
+families it reasons about, i.e. shares a term with its retrieval queries in
+prompt_compiler.AGENT_QUERIES. Terms go through the lexical index's
+tokenizer on both sides and match on a shared stem, so "pay" matches
+"payment". A changed sentence with a number or amount in it (a fee, a cap,
+a notice period) affects every agent: revisions mostly change values inside
+otherwise identical sentences, and any agent may depend on them. Every other
+agent's stored result from the previous version is reused.
+
+Chunk boundaries can shift after an insertion, so changed chunks are
+compared sentence by sentence: only sentences present in one version but
+not the other count as changed.
+"""
+import re
+
+from agents.prompt_compiler import AGENT_QUERIES
+from rag.lexical_index import tokenize
+
+# Query words that appear in every contract and say nothing about a clause family.
+_GENERIC_TERMS = set(tokenize(
+    "terms term obligations rights party parties each one other others "
+    "general provisions clause clauses contract agreement"
+))
+
+# Agent name -> index terms of its clause families.
+AGENT_TERMS = {
+    agent: set(tokenize(" ".join(queries))) - _GENERIC_TERMS
+    for agent, queries in AGENT_QUERIES.items()
+}
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+|\n+")
+_AMOUNT = re.compile(
+    r"\d|[$€£¥₹%]|\b(?:one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|"
+    r"fifteen|twenty|thirty|forty|fifty|sixty|ninety|hundred|thousand|million|billion|"
+    r"percent|half|double|twice)\b",
+    re.IGNORECASE,
+)
+# Shortest term that matches longer terms it is a prefix of ("pay" / "payment").
+_MIN_STEM_CHARS = 3
+
+
+def split_sentences(text: str) -> list:
+    """Sentences (and list items / lines) of `text`, whitespace-normalized."""
+    return [" ".join(sentence.split()) for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _sentences(texts) -> set:
+    return {sentence for text in texts for sentence in split_sentences(text)}
+
+
+def changed_sentences(added_texts, removed_texts) -> set:
+    """Sentences that appear in only one of the two versions' changed chunks."""
+    return _sentences(added_texts) ^ _sentences(removed_texts)
+
+
+def has_amount(sentence: str) -> bool:
+    """True when the sentence states a number, amount, percentage or period."""
+    return bool(_AMOUNT.search(sentence))
+
+
+def _same_stem(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    shorter, longer = sorted((a, b), key=len)
+    return len(shorter) >= _MIN_STEM_CHARS and longer.startswith(shorter)
+
+
+def affected_agents(agent_names, added_texts, removed_texts) -> set:
+    """
+    Returns the agents whose clause families appear in any changed sentence,
+    or every agent when a changed sentence states a number or amount.
+    Agents without known terms are always treated as affected.
+    """
+    changed = changed_sentences(added_texts, removed_texts)
+    if any(has_amount(sentence) for sentence in changed):
+        return set(agent_names)
+    changed_terms = set()
+    for sentence in changed:
+        changed_terms.update(tokenize(sentence))
+    return {
+        agent for agent in agent_names
+        if agent not in AGENT_TERMS
+        or any(_same_stem(term, agent_term) for term in changed_terms for agent_term in AGENT_TERMS[agent])
+    }
@@ -1,11 +1,10 @@
 from google import genai
-from google.genai.errors import ClientError
 
-def analyze_legal_intelligence(contract_text: str, client: genai.Client) -> dict:
-    if not contract_text or len(contract_text.strip()) < 20:
-        return {"error": "Please provide a valid contract text."}
+from agents.runtime import arun_agent, run_agent
+from agents.schemas import LegalIntelligence
 
-    prompt = f"""
+def _build_prompt(contract_text: str) -> str:
+    return f"""
     You are a legal intelligence assistant for a Contract Lifecycle Management (CLM) system.
 
     Perform the following:
@@ -35,29 +34,35 @@ def analyze_legal_intelligence(contract_text: str, client: genai.Client) -> dict
     {contract_text}
     """
 
-    try:
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt
-        )
-    except ClientError as e:
-        if "429" in str(e):
-            return {"error": "AI quota exceeded. Please try again later."}
-        return {"error": str(e)}
-
-    if getattr(response, "text", None):
-        cleaned = response.text.strip()
+
+def _clean(text: str) -> str:
+    cleaned = text.strip()
     if cleaned.startswith("```"):
         cleaned = cleaned.replace("```json", "").replace("```", "").strip()
-    return {"legal_intelligence": cleaned}
+    return cleaned
 
 
-    try:
-        for c in response.candidates:
-            for p in c.content.parts:
-                if hasattr(p, "text"):
-                    return {"legal_intelligence": p.text}
-    except Exception:
-        pass
+def analyze_legal_intelligence(contract_text: str, client: genai.Client) -> dict:
+    return run_agent(
+        client,
+        "legal_intelligence",
+        contract_text,
+        _build_prompt,
+        "legal_intelligence",
+        "Unable to analyze legal intelligence.",
+        clean=_clean,
+        schema=LegalIntelligence,
+    )
+
 
-    return {"error": "Unable to analyze legal intelligence."}
+async def analyze_legal_intelligence_async(contract_text: str, client: genai.Client) -> dict:
+    return await arun_agent(
+        client,
+        "legal_intelligence",
+        contract_text,
+        _build_prompt,
+        "legal_intelligence",
+        "Unable to analyze legal intelligence.",
+        clean=_clean,
+        schema=LegalIntelligence,
+    )
@@ -14,24 +14,13 @@ The agent analyzes:
 This is useful for proactive risk assessment and understanding contract resilience.
 """
 from google import genai
-from google.genai.errors import ClientError
 
+from agents.runtime import arun_agent, run_agent
+from agents.schemas import StressTest
 
-def stress_test_contract(contract_text: str, client: genai.Client) -> dict:
-    """
-    Simulates realistic breach scenarios to test contract resilience.
-
-    Args:
-        contract_text: The contract text to analyze
-        client: The Gemini AI client instance
-
-    Returns:
-        Dictionary containing stress test analysis results
-    """
-    if not contract_text or len(contract_text.strip()) < 20:
-        return {"error": "Please provide a valid contract text."}
 
-    prompt = f"""
+def _build_prompt(contract_text: str) -> str:
+    return f"""
 You are a legal risk simulation assistant.
 
 Simulate 2 realistic breach scenarios based on the contract:
@@ -48,26 +37,36 @@ Contract:
 {contract_text}
 """
 
-    try:
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt
-        )
-    except ClientError as e:
-        if "429" in str(e):
-            return {"error": "AI quota exceeded. Please try again later."}
-        return {"error": str(e)}
 
-    if getattr(response, "text", None):
-        return {"stress_test": response.text}
-
-    try:
-        for c in response.candidates:
-            for p in c.content.parts:
-                if hasattr(p, "text"):
-                    return {"stress_test": p.text}
-    except Exception:
-        pass
+def stress_test_contract(contract_text: str, client: genai.Client) -> dict:
+    """
+    Simulates realistic breach scenarios to test contract resilience.
 
-    return {"error": "Unable to perform stress test analysis."}
+    Args:
+        contract_text: The contract text to analyze
+        client: The Gemini AI client instance
 
+    Returns:
+        Dictionary containing stress test analysis results
+    """
+    return run_agent(
+        client,
+        "loophole_tester",
+        contract_text,
+        _build_prompt,
+        "stress_test",
+        "Unable to perform stress test analysis.",
+        schema=StressTest,
+    )
+
+
+async def stress_test_contract_async(contract_text: str, client: genai.Client) -> dict:
+    return await arun_agent(
+        client,
+        "loophole_tester",
+        contract_text,
+        _build_prompt,
+        "stress_test",
+        "Unable to perform stress test analysis.",
+        schema=StressTest,
+    )
@@ -0,0 +1,215 @@
+"""
+Map-Reduce Execution Mode
+
+Agents normally interpolate the whole contract into one prompt. Above
+MAP_REDUCE_THRESHOLD_TOKENS that prompt gets slow, and eventually exceeds the
+model's context window. In that case the contract is split into
+clause-aware sections, the agent's own prompt runs on every section in
+parallel (map), and the partial answers are merged into one answer in the
+agent's original output format (reduce). If the partials are themselves too
+large, they are reduced in parallel groups first.
+
+Latency then grows with the number of reduce levels rather than with
+document length.
+
+`agenerate_for_contract` is the async counterpart, running the map and
+reduce calls as coroutines.
+"""
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from google import genai
+
+from rag.text_splitter import estimate_tokens, iter_chunks
+from utils.llm_cache import agenerate_content, generate_content, response_text
+
+MAP_REDUCE_THRESHOLD_TOKENS = int(os.getenv("MAP_REDUCE_THRESHOLD_TOKENS", "30000"))
+MAP_SECTION_TOKENS = int(os.getenv("MAP_SECTION_TOKENS", "8000"))
+REDUCE_INPUT_TOKENS = int(os.getenv("REDUCE_INPUT_TOKENS", "16000"))
+MAP_REDUCE_MAX_WORKERS = int(os.getenv("MAP_REDUCE_MAX_WORKERS", "8"))
+
+
+def needs_map_reduce(contract_text: str) -> bool:
+    return estimate_tokens(contract_text) > MAP_REDUCE_THRESHOLD_TOKENS
+
+
+def _parallel(fn, items):
+    with ThreadPoolExecutor(max_workers=max(1, min(MAP_REDUCE_MAX_WORKERS, len(items)))) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+
+async def _gather(fn, items):
+    limit = asyncio.Semaphore(MAP_REDUCE_MAX_WORKERS)
+
+    async def run(item):
+        async with limit:
+            return await fn(item)
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+def _sections(contract_text: str) -> list:
+    return [
+        chunk.text
+        for chunk in iter_chunks(contract_text, max_tokens=MAP_SECTION_TOKENS, overlap_tokens=0)
+    ]
+
+
+def _reduce_groups(partials) -> list:
+    """Groups for the next reduce level, or None once one call can take them all."""
+    groups = _group_by_budget(partials, REDUCE_INPUT_TOKENS)
+    if len(groups) == 1:
+        return None
+    if len(groups) == len(partials):
+        # Every partial is over budget on its own; pair them up instead.
+        groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+    return groups
+
+
+def _reduce_prompt(build_prompt, partials) -> str:
+    joined = "\n\n".join(
+        f"PARTIAL ANALYSIS {i}:\n{partial}" for i, partial in enumerate(partials, start=1)
+    )
+    return f"""
+You are combining partial analyses of consecutive sections of ONE contract
+into a single analysis of the whole contract.
+
+Each partial analysis answered this task for one section:
+---
+{build_prompt("<one section of the contract>")}
+---
+
+Merge the partial analyses below into ONE answer for the whole contract.
+Follow the original task's instructions and output format exactly.
+Remove duplicates, keep the most specific finding when partials conflict,
+and do not mention sections or partial analyses.
+
+{joined}
+"""
+
+
+def _group_by_budget(partials, budget_tokens):
+    groups, current, used = [], [], 0
+    for partial in partials:
+        tokens = estimate_tokens(partial)
+        if current and used + tokens > budget_tokens:
+            groups.append(current)
+            current, used = [], 0
+        current.append(partial)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def map_reduce(
+    client: genai.Client,
+    agent: str,
+    contract_text: str,
+    build_prompt,
+    model: str,
+    generate=generate_content,
+    config: dict = None,
+):
+    """
+    Runs `build_prompt` over contract sections and merges the results.
+
+    Returns the response of the final reduce call, so callers extract its
+    text the same way as for a single generate_content call. API errors
+    propagate to the caller unchanged. `generate` makes each call (the
+    agent runtime passes its deadline-aware version) with `config`, so
+    partials already have the final response schema.
+    """
+    sections = _sections(contract_text)
+    total = len(sections)
+
+    def run_map(indexed_section):
+        index, section = indexed_section
+        prompt = build_prompt(f"[Section {index} of {total} of a longer contract]\n{section}")
+        return response_text(generate(client, f"{agent}:map", prompt, model=model, config=config))
+
+    partials = [p for p in _parallel(run_map, list(enumerate(sections, start=1))) if p]
+
+    def run_reduce(group):
+        return response_text(
+            generate(client, f"{agent}:reduce", _reduce_prompt(build_prompt, group), model=model, config=config)
+        )
+
+    # Collapse partials level by level until one reduce call can take them all.
+    while len(partials) > 1:
+        groups = _reduce_groups(partials)
+        if groups is None:
+            break
+        partials = [p for p in _parallel(run_reduce, groups) if p]
+
+    return generate(client, agent, _reduce_prompt(build_prompt, partials), model=model, config=config)
+
+
+def generate_for_contract(
+    client: genai.Client,
+    agent: str,
+    contract_text: str,
+    build_prompt,
+    model: str,
+    generate=generate_content,
+    config: dict = None,
+):
+    """
+    Runs an agent prompt on a contract: a single call for contracts within
+    MAP_REDUCE_THRESHOLD_TOKENS, map-reduce above it.
+    """
+    if needs_map_reduce(contract_text):
+        return map_reduce(client, agent, contract_text, build_prompt, model, generate, config)
+    return generate(client, agent, build_prompt(contract_text), model=model, config=config)
+
+
+async def amap_reduce(
+    client: genai.Client,
+    agent: str,
+    contract_text: str,
+    build_prompt,
+    model: str,
+    generate=agenerate_content,
+    config: dict = None,
+):
+    """map_reduce with coroutines; `generate` is awaited for each call."""
+    # Splitting a multi-megabyte contract is CPU work; keep it off the event loop.
+    sections = await asyncio.to_thread(_sections, contract_text)
+    total = len(sections)
+
+    async def run_map(indexed_section):
+        index, section = indexed_section
+        prompt = build_prompt(f"[Section {index} of {total} of a longer contract]\n{section}")
+        return response_text(await generate(client, f"{agent}:map", prompt, model=model, config=config))
+
+    partials = [p for p in await _gather(run_map, list(enumerate(sections, start=1))) if p]
+
+    async def run_reduce(group):
+        prompt = _reduce_prompt(build_prompt, group)
+        return response_text(await generate(client, f"{agent}:reduce", prompt, model=model, config=config))
+
+    while len(partials) > 1:
+        groups = _reduce_groups(partials)
+        if groups is None:
+            break
+        partials = [p for p in await _gather(run_reduce, groups) if p]
+
+    return await generate(client, agent, _reduce_prompt(build_prompt, partials), model=model, config=config)
+
+
+async def agenerate_for_contract(
+    client: genai.Client,
+    agent: str,
+    contract_text: str,
+    build_prompt,
+    model: str,
+    generate=agenerate_content,
+    config: dict = None,
+):
+    """Async generate_for_contract."""
+    if needs_map_reduce(contract_text):
+        return await amap_reduce(client, agent, contract_text, build_prompt, model, generate, config)
+    return await generate(client, agent, build_prompt(contract_text), model=model, config=config)
@@ -0,0 +1,566 @@
+"""
+Full Analysis Orchestrator
+
+This module fans the /full-analysis pipeline out across a thread pool.
+The five analysis agents (risk, legal intelligence, bias, stress test, fraud)
+only depend on the contract text, so they run concurrently together with RAG
+ingestion. The recommendation step starts as soon as the five agent results
+are in, without waiting for ingestion to finish.
+
+Wall-clock latency becomes roughly the slowest agent plus the recommendation
+call, instead of the sum of every round trip.
+
+With prompt compilation enabled, ingestion runs first and each agent gets
+only the sections of the contract relevant to it (see prompt_compiler.py).
+
+`iter_full_analysis` exposes the same pipeline as a stream of events, so
+callers can show each agent's result as soon as it completes.
+
+Given a document_id, a revised version of a contract is diffed against the
+previous one: only changed chunks are re-embedded, and only agents whose
+clause families changed are re-run (see agents/incremental.py).
+
+Before any agent runs, the contract is also looked up among previously
+analyzed contracts (rag/near_duplicates.py). For a near-duplicate, e.g. the
+same vendor template with other names and amounts, NEAR_DUPLICATE_MODE
+decides what happens: "narrow" (default) re-runs only the agents whose
+clause families appear in the changed passages, "reuse" returns the stored
+analysis as is. Either way the response lists the changed passages.
+
+Each agent runs under its own deadline (agents/runtime.py). An agent that
+fails or times out doesn't hold up the rest: the recommendation is made from
+the analyses that are available, the missing ones are marked NOT AVAILABLE
+in its prompt and listed under "missing_analyses" in its result. When the
+consumer stops early, agents still running are cancelled.
+
+The recommendation prompt carries a token-budgeted digest of each analysis'
+structured fields (agents/schemas.py) rather than the whole result.
+
+`arun_full_analysis` runs the same pipeline on the event loop for the async
+routes: agents and the recommendation are coroutines over `client.aio`, and
+the blocking steps (ingestion, prompt compilation, near-duplicate lookup,
+result stores) run on worker threads, so a waiting analysis holds no thread.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+
+from google import genai
+
+from agents.risk_analyzer import analyze_risks, analyze_risks_async
+from agents.legal_intelligence import analyze_legal_intelligence, analyze_legal_intelligence_async
+from agents.bias_meter import analyze_bias, analyze_bias_async
+from agents.loophole_tester import stress_test_contract, stress_test_contract_async
+from agents.fraud_detector import detect_fraud_indicators, detect_fraud_indicators_async
+from agents.recommendation_engine import (
+    NOT_AVAILABLE, generate_recommendation, generate_recommendation_async, stream_recommendation,
+)
+from agents.prompt_compiler import PROMPT_COMPILATION, compile_contract
+from agents.incremental import affected_agents, changed_sentences
+from agents.runtime import with_cancellation
+from agents.schemas import (
+    BiasAnalysis, FraudIndicators, LegalIntelligence, RiskAnalysis, StressTest, digest, from_dict,
+)
+from rag.contract_versions import get_version_store
+from rag.near_duplicates import (
+    NEAR_DUPLICATES, changed_passages, get_near_duplicate_index, material_changes,
+)
+from rag.rag_qa import apply_ingest, contract_id_for, ingest_contract_version, plan_ingest
+from utils.llm_cache import cache_bypassed
+from utils.metrics import stage
+
+# Maximum number of agent / ingestion calls in flight for one contract.
+MAX_WORKERS = int(os.getenv("FULL_ANALYSIS_MAX_WORKERS", "6"))
+# "narrow" re-runs agents touched by the changed passages, "reuse" re-runs none.
+NEAR_DUPLICATE_MODE = os.getenv("NEAR_DUPLICATE_MODE", "narrow")
+
+# Response key -> (agent name, agent function). Order is the order tasks are
+# submitted, which matters when the concurrency cap is lower than the number
+# of tasks.
+ANALYSIS_AGENTS = {
+    "risks": ("risk_analyzer", analyze_risks),
+    "legal_intelligence": ("legal_intelligence", analyze_legal_intelligence),
+    "bias_analysis": ("bias_meter", analyze_bias),
+    "stress_test": ("loophole_tester", stress_test_contract),
+    "fraud_indicators": ("fraud_detector", detect_fraud_indicators),
+}
+# Response key -> async agent function, for arun_full_analysis.
+ASYNC_AGENTS = {
+    "risks": analyze_risks_async,
+    "legal_intelligence": analyze_legal_intelligence_async,
+    "bias_analysis": analyze_bias_async,
+    "stress_test": stress_test_contract_async,
+    "fraud_indicators": detect_fraud_indicators_async,
+}
+# Response key -> result type of the agent's structured output.
+ANALYSIS_SCHEMAS = {
+    "risks": RiskAnalysis,
+    "legal_intelligence": LegalIntelligence,
+    "bias_analysis": BiasAnalysis,
+    "stress_test": StressTest,
+    "fraud_indicators": FraudIndicators,
+}
+
+
+def _submit(pool, cancel, fn, *args):
+    # Run each task in a copy of the caller's context so per-request state
+    # (e.g. the LLM cache scope) follows the call into the worker thread.
+    return pool.submit(contextvars.copy_context().run, with_cancellation, cancel, fn, *args)
+
+
+def _failed(result) -> bool:
+    return isinstance(result, dict) and "error" in result
+
+
+def _recommendation_input(key, result) -> str:
+    if _failed(result):
+        return f"{NOT_AVAILABLE} ({result['error']})"
+    if result.get("structured"):
+        return digest(from_dict(ANALYSIS_SCHEMAS[key], result["structured"]))
+    # Free text, e.g. a result stored before agents answered in JSON.
+    return digest(next((value for value in result.values() if isinstance(value, str)), ""))
+
+
+def _run_compiled(agent_name, agent, contract_text, client, contract_id):
+    compiled_text, stats = compile_contract(agent_name, contract_text, client, contract_id)
+    return agent(compiled_text, client), stats
+
+
+def _reuse_plan(document_id, contract_text, page_starts):
+    """(ingest plan, stored results that are still valid) for a revised version."""
+    plan = plan_ingest(contract_text, document_id, page_starts)
+    versions = get_version_store()
+    if plan is None or versions is None:
+        return plan, {}
+    # Only results computed for the version the diff is taken against: the
+    # document may have been re-ingested (/rag/ingest, or a cancelled run)
+    # since its results were stored, and that change isn't in the diff.
+    stored = {
+        key: result
+        for key, (version, result) in versions.results(document_id).items()
+        if version == plan.previous_version
+    }
+    return plan, _reusable(stored, plan.added_texts, plan.removed_texts)
+
+
+def _reusable(stored, added_texts, removed_texts):
+    """
+    Stored results whose agents' clause families the changed passages don't
+    touch. The recommendation weighs the whole contract, so it is only
+    reused when no sentence changed at all.
+    """
+    affected = affected_agents(
+        [name for name, _ in ANALYSIS_AGENTS.values()], added_texts, removed_texts
+    )
+    reused = {
+        key: stored[key]
+        for key, (name, _) in ANALYSIS_AGENTS.items()
+        if key in stored and name not in affected
+    }
+    unchanged = not changed_sentences(added_texts, removed_texts)
+    if unchanged and len(reused) == len(ANALYSIS_AGENTS) and "recommendation" in stored:
+        reused["recommendation"] = stored["recommendation"]
+    return reused
+
+
+def _near_duplicate(contract_text):
+    """(match report, reusable results) for the closest previously analyzed contract."""
+    index = get_near_duplicate_index()
+    if index is None:
+        return None, {}
+    with stage("near_duplicate_lookup"):
+        match = index.find(contract_text)
+    if match is None:
+        return None, {}
+    changes = changed_passages(match.text, contract_text)
+    material = material_changes(match.text, contract_text, changes)
+    if material:
+        # Different amounts or parties: the other contract's findings don't
+        # carry over, whatever the mode.
+        reused = {}
+    elif NEAR_DUPLICATE_MODE == "reuse":
+        reused = {key: match.results[key] for key in ANALYSIS_AGENTS if key in match.results}
+        if not changes and "recommendation" in match.results:
+            reused["recommendation"] = match.results["recommendation"]
+    else:
+        reused = _reusable(
+            match.results,
+            [change["after"] for change in changes],
+            [change["before"] for change in changes],
+        )
+    report = {
+        "contract_id": match.contract_id,
+        "similarity": match.similarity,
+        "mode": NEAR_DUPLICATE_MODE,
+        "changes": changes,
+        "material_changes": material,
+    }
+    return report, reused
+
+
+def _ingest(contract_text, client, document_id, page_starts, plan):
+    if plan is not None:
+        return apply_ingest(plan, client)
+    return ingest_contract_version(contract_text, client, document_id, page_starts)
+
+
+class _Run(NamedTuple):
+    plan: object      # ingest plan of a revised version, or None
+    reused: dict      # response key -> result carried over
+    carried: set      # keys of reused results not stored under this document
+    near: dict        # near-duplicate report, or None
+    stale: bool       # results are a near-duplicate's, not this text's
+    to_run: dict      # the ANALYSIS_AGENTS entries that still have to run
+
+
+def _plan_run(contract_text, document_id, page_starts, near_duplicates) -> _Run:
+    """Which results can be reused (previous version or near-duplicate) and which agents must run."""
+    plan, reused = _reuse_plan(document_id, contract_text, page_starts) if document_id else (None, {})
+    # Results not stored under this document: a near-duplicate's in "reuse"
+    # mode (not produced for this text). The previous version's reused
+    # results are stored again, re-stamped with the new version.
+    carried = set()
+    near = None
+    if near_duplicates and plan is None and not cache_bypassed():
+        near, reused = _near_duplicate(contract_text)
+        if near is not None and near["mode"] == "reuse":
+            carried = set(reused)
+    stale = bool(near) and near["mode"] == "reuse" and bool(reused)
+    to_run = {key: value for key, value in ANALYSIS_AGENTS.items() if key not in reused}
+
+    if near is not None:
+        near.update(
+            reused_agents=[key for key in ANALYSIS_AGENTS if key in reused],
+            rerun_agents=list(to_run),
+            recommendation_reused="recommendation" in reused,
+        )
+    return _Run(plan, reused, carried, near, stale, to_run)
+
+
+def _recommendation_args(contract_text, results, client):
+    """
+    (keyword arguments for the recommendation engine, keys of missing
+    analyses). Failed or timed-out agents are passed as NOT AVAILABLE
+    instead of their error.
+    """
+    missing = [key for key in ANALYSIS_AGENTS if _failed(results[key])]
+    digests = {key: _recommendation_input(key, results[key]) for key in ANALYSIS_AGENTS}
+    analyses = dict(
+        contract_text=contract_text,
+        risk_data=digests["risks"],
+        legal_data=digests["legal_intelligence"],
+        bias_data=digests["bias_analysis"],
+        stress_test_data=digests["stress_test"],
+        fraud_data=digests["fraud_indicators"],
+        client=client,
+    )
+    return analyses, missing
+
+
+def _store_results(run: _Run, contract_text, results, report, document_id, near_duplicates):
+    """
+    Saves the results to the near-duplicate index and the version store.
+    Returns the incremental report when a document_id was given.
+    """
+    failed = [key for key, result in results.items() if _failed(result)]
+    if near_duplicates and not failed and not run.stale:
+        index = get_near_duplicate_index()
+        if index is not None:
+            index.add(
+                report["contract_id"] if report else contract_id_for(contract_text),
+                contract_text,
+                results,
+            )
+
+    if not document_id:
+        return None
+    versions = get_version_store()
+    if versions is not None:
+        versions.save_results(
+            document_id,
+            report["version"],
+            {
+                key: result for key, result in results.items()
+                if key not in run.carried and key not in failed
+            },
+            failed,
+        )
+    return {
+        **report,
+        "reused_agents": [key for key in ANALYSIS_AGENTS if key in run.reused],
+        "rerun_agents": list(run.to_run),
+        "recommendation_reused": "recommendation" in run.reused,
+    }
+
+
+def iter_full_analysis(
+    contract_text: str,
+    client: genai.Client,
+    max_workers: int = None,
+    ingest: bool = True,
+    page_starts=None,
+    compile_prompts: bool = None,
+    stream_recommendation_text: bool = False,
+    document_id: str = None,
+    near_duplicates: bool = None,
+):
+    """
+    Runs the full-analysis pipeline, yielding (event, data) pairs as results
+    become available:
+
+    - ("near_duplicate", report) first, when a previously analyzed
+      near-duplicate was found
+    - ("contract_id", id) as soon as the contract is ingested
+    - (response key, result) for each agent, in completion order (reused
+      results of a previous version or near-duplicate first)
+    - ("prompt_compilation", stats) once all agents finished, when compiling
+    - ("recommendation_delta", text) while the recommendation streams, when
+      stream_recommendation_text is set
+    - ("recommendation", result) once the recommendation is complete
+    - ("incremental", report) at the end, when a document_id is given
+
+    Arguments are the same as for run_full_analysis.
+    """
+    workers = max(1, max_workers or MAX_WORKERS)
+    compile_prompts = PROMPT_COMPILATION if compile_prompts is None else compile_prompts
+    near_duplicates = NEAR_DUPLICATES if near_duplicates is None else near_duplicates
+    ingest = ingest or bool(document_id)
+
+    run = _plan_run(contract_text, document_id, page_starts, near_duplicates)
+    plan, reused, to_run = run.plan, run.reused, run.to_run
+    if run.near is not None:
+        yield "near_duplicate", run.near
+
+    cancel = threading.Event()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        ingestion = None
+        report = None
+        futures = {}
+        try:
+            if compile_prompts:
+                # Agents retrieve from the index, so it has to be built first.
+                report = _ingest(contract_text, client, document_id, page_starts, plan)
+                contract_id = report["contract_id"]
+                yield "contract_id", contract_id
+                futures = {
+                    _submit(pool, cancel, _run_compiled, name, agent, contract_text, client, contract_id): key
+                    for key, (name, agent) in to_run.items()
+                }
+            else:
+                futures = {
+                    _submit(pool, cancel, agent, contract_text, client): key
+                    for key, (_, agent) in to_run.items()
+                }
+                # Submitted last so agents get the pool first when the cap is tight.
+                if ingest:
+                    ingestion = _submit(pool, cancel, _ingest, contract_text, client, document_id, page_starts, plan)
+
+            results = {}
+            compilation = {}
+            for key in ANALYSIS_AGENTS:
+                if key in reused:
+                    results[key] = reused[key]
+                    yield key, reused[key]
+            for future in as_completed(futures):
+                key = futures[future]
+                result = future.result()
+                if compile_prompts:
+                    result, compilation[key] = result
+                results[key] = result
+                yield key, result
+
+            if compile_prompts:
+                yield "prompt_compilation", {key: compilation.get(key) for key in ANALYSIS_AGENTS}
+
+            # The recommendation runs on the calling thread so it never queues
+            # behind ingestion, which may still be embedding chunks.
+            analyses, missing = _recommendation_args(contract_text, results, client)
+            if "recommendation" in reused:
+                recommendation = reused["recommendation"]
+            elif stream_recommendation_text:
+                pieces = stream_recommendation(**analyses)
+                while True:
+                    try:
+                        piece = next(pieces)
+                    except StopIteration as done:
+                        recommendation = done.value
+                        break
+                    yield "recommendation_delta", piece
+            else:
+                recommendation = generate_recommendation(**analyses)
+            if missing and not _failed(recommendation):
+                recommendation = {**recommendation, "missing_analyses": missing}
+            results["recommendation"] = recommendation
+            yield "recommendation", recommendation
+
+            if ingestion is not None:
+                # Surface ingestion failures the same way the sequential path did.
+                report = ingestion.result()
+                yield "contract_id", report["contract_id"]
+
+            incremental = _store_results(run, contract_text, results, report, document_id, near_duplicates)
+            if incremental is not None:
+                yield "incremental", incremental
+        finally:
+            # If the consumer stops early (e.g. a cancelled job), don't start
+            # tasks that are still queued behind the concurrency cap, and stop
+            # agents that are waiting on the model.
+            cancel.set()
+            for future in [*futures, ingestion]:
+                if future is not None:
+                    future.cancel()
+
+
+def run_full_analysis(
+    contract_text: str,
+    client: genai.Client,
+    max_workers: int = None,
+    ingest: bool = True,
+    page_starts=None,
+    compile_prompts: bool = None,
+    on_event=None,
+    document_id: str = None,
+    near_duplicates: bool = None,
+) -> dict:
+    """
+    Runs every analysis agent, the recommendation engine and (optionally)
+    RAG ingestion for a contract.
+
+    Args:
+        contract_text: The contract text to analyze
+        client: The Gemini AI client instance
+        max_workers: Concurrency cap for this call (defaults to FULL_ANALYSIS_MAX_WORKERS)
+        ingest: Whether to index the contract for follow-up Q&A
+        page_starts: Offsets where each PDF page begins, recorded on RAG chunks
+        compile_prompts: Give each agent only its relevant sections (defaults
+            to PROMPT_COMPILATION); implies ingestion
+        on_event: Optional callback(event, data) for progress reporting, called
+            with each event of iter_full_analysis; an exception it raises
+            aborts the analysis
+        document_id: Stable id across versions of the same contract; when
+            given, the contract is ingested under it and unchanged results
+            of the previous version are reused
+        near_duplicates: Look up previously analyzed near-duplicates first
+            (defaults to NEAR_DUPLICATES)
+
+    Returns:
+        Dictionary with the same keys /full-analysis has always returned,
+        plus "contract_id" for follow-up Q&A when the contract was ingested,
+        and "prompt_compilation" token stats per agent when compiling, and
+        an "incremental" report of reused chunks and agents with a document_id,
+        and a "near_duplicate" report (match, similarity, changed passages)
+    """
+    events = {}
+    for event, data in iter_full_analysis(
+        contract_text, client, max_workers, ingest, page_starts, compile_prompts,
+        document_id=document_id, near_duplicates=near_duplicates,
+    ):
+        events[event] = data
+        if on_event is not None:
+            on_event(event, data)
+    # Agent results arrive in completion order; keep the documented key order.
+    results = {key: events.pop(key) for key in ANALYSIS_AGENTS}
+    for key in ("prompt_compilation", "recommendation", "contract_id", "incremental", "near_duplicate"):
+        if key in events:
+            results[key] = events.pop(key)
+    return results
+
+
+async def _run_compiled_async(agent_name, agent, contract_text, client, contract_id):
+    compiled_text, stats = await asyncio.to_thread(
+        compile_contract, agent_name, contract_text, client, contract_id
+    )
+    return await agent(compiled_text, client), stats
+
+
+async def arun_full_analysis(
+    contract_text: str,
+    client: genai.Client,
+    max_workers: int = None,
+    ingest: bool = True,
+    page_starts=None,
+    compile_prompts: bool = None,
+    document_id: str = None,
+    near_duplicates: bool = None,
+) -> dict:
+    """
+    Async run_full_analysis: same arguments (without on_event) and result.
+    Cancelling the calling task cancels the agents still running.
+    """
+    workers = max(1, max_workers or MAX_WORKERS)
+    compile_prompts = PROMPT_COMPILATION if compile_prompts is None else compile_prompts
+    near_duplicates = NEAR_DUPLICATES if near_duplicates is None else near_duplicates
+    ingest = ingest or bool(document_id)
+
+    run = await asyncio.to_thread(_plan_run, contract_text, document_id, page_starts, near_duplicates)
+    limit = asyncio.Semaphore(workers)
+
+    async def capped(coroutine):
+        async with limit:
+            return await coroutine
+
+    report = None
+    ingestion = None
+    tasks = {}
+    try:
+        if compile_prompts:
+            # Agents retrieve from the index, so it has to be built first.
+            report = await asyncio.to_thread(_ingest, contract_text, client, document_id, page_starts, run.plan)
+            tasks = {
+                key: asyncio.create_task(capped(_run_compiled_async(
+                    name, ASYNC_AGENTS[key], contract_text, client, report["contract_id"]
+                )))
+                for key, (name, _) in run.to_run.items()
+            }
+        else:
+            tasks = {
+                key: asyncio.create_task(capped(ASYNC_AGENTS[key](contract_text, client)))
+                for key in run.to_run
+            }
+            if ingest:
+                ingestion = asyncio.create_task(asyncio.to_thread(
+                    _ingest, contract_text, client, document_id, page_starts, run.plan
+                ))
+
+        results = dict(run.reused)
+        compilation = {}
+        for key, task in tasks.items():
+            results[key] = await task
+            if compile_prompts:
+                results[key], compilation[key] = results[key]
+
+        analyses, missing = _recommendation_args(contract_text, results, client)
+        if "recommendation" in run.reused:
+            recommendation = run.reused["recommendation"]
+        else:
+            recommendation = await generate_recommendation_async(**analyses)
+        if missing and not _failed(recommendation):
+            recommendation = {**recommendation, "missing_analyses": missing}
+        results["recommendation"] = recommendation
+
+        if ingestion is not None:
+            report = await ingestion
+        incremental = await asyncio.to_thread(
+            _store_results, run, contract_text, results, report, document_id, near_duplicates
+        )
+    finally:
+        # Agent tasks stop at once; an ingestion thread can't be interrupted
+        # and finishes in the background.
+        for task in [*tasks.values(), ingestion]:
+            if task is not None:
+                task.cancel()
+
+    output = {key: results[key] for key in ANALYSIS_AGENTS}
+    if compile_prompts:
+        output["prompt_compilation"] = {key: compilation.get(key) for key in ANALYSIS_AGENTS}
+    output["recommendation"] = recommendation
+    if report is not None:
+        output["contract_id"] = report["contract_id"]
+    if incremental is not None:
+        output["incremental"] = incremental
+    if run.near is not None:
+        output["near_duplicate"] = run.near
+    return output
@@ -0,0 +1,163 @@
+"""
+Prompt Compiler
+
+Most agents only care about a few clause families: the fraud detector about
+payment terms and party identity, the statute mapper about governing law
+and compliance, and so on. Instead of interpolating the whole contract into
+every prompt, this optional stage uses the RAG index to assemble only the
+sections relevant to each agent:
+
+1. Each agent has a handful of query templates describing its clause families
+2. Every query retrieves its top chunks of the (already ingested) contract
+3. Hits are taken round-robin across queries until the token budget is used,
+   then put back in document order
+
+The agent then runs its unchanged prompt on the compiled text, so its
+response keys stay the same. Contracts already within the budget pass
+through untouched.
+"""
+import os
+
+from google import genai
+
+from rag.embeddings import embed_texts
+from rag.text_splitter import estimate_tokens
+from rag.vector_store import query_chunks
+
+PROMPT_COMPILATION = os.getenv("PROMPT_COMPILATION", "0") == "1"
+COMPILED_PROMPT_TOKENS = int(os.getenv("COMPILED_PROMPT_TOKENS", "4000"))
+COMPILE_TOP_K = int(os.getenv("COMPILE_TOP_K", "8"))
+
+_HEADER = "[Excerpts relevant to this analysis; other sections omitted]\n\n"
+_SEPARATOR = "\n\n[...]\n\n"
+
+# Agent name -> retrieval queries for the clause families it reasons about.
+AGENT_QUERIES = {
+    "risk_analyzer": [
+        "limitation of liability, unlimited liability and indemnification",
+        "termination rights, notice periods and termination for convenience",
+        "penalties, liquidated damages, late fees and interest",
+        "warranties, disclaimers and remedies",
+        "one-sided obligations and sole discretion of one party",
+    ],
+    "legal_intelligence": [
+        "governing law and jurisdiction",
+        "dispute resolution, arbitration and venue",
+        "compliance with laws, regulations and licenses",
+        "data protection, privacy and confidentiality obligations",
+        "definitions and vague or undefined terms",
+    ],
+    "bias_meter": [
+        "termination rights of each party",
+        "liability caps and indemnities owed by each party",
+        "payment obligations, fees and price changes",
+        "unilateral amendment, assignment or sole discretion",
+        "intellectual property ownership and licenses",
+    ],
+    "loophole_tester": [
+        "breach of contract, default and remedies",
+        "termination for cause and cure periods",
+        "limitation of liability and exclusions",
+        "indemnification obligations",
+        "dispute resolution and governing law",
+    ],
+    "fraud_detector": [
+        "payment terms, advance payment, deposits and wire transfers",
+        "identity of the parties, signatories and authority to sign",
+        "representations, warranties and disclosures",
+        "dispute resolution, recourse and refunds",
+        "deadlines, urgency and automatic renewal",
+    ],
+    "statute_mapper": [
+        "governing law and jurisdiction",
+        "statutory and regulatory compliance obligations",
+        "employment, consumer protection or data protection terms",
+        "limitation of liability and exclusions of implied terms",
+        "intellectual property and confidentiality",
+    ],
+    "clause_extractor": [
+        "payment terms",
+        "termination",
+        "liability",
+        "confidentiality",
+        "jurisdiction and governing law",
+    ],
+    "summarizer": [
+        "term, duration and renewal",
+        "payment terms",
+        "termination conditions",
+        "parties and scope of services",
+    ],
+}
+
+
+def compile_contract(
+    agent: str,
+    contract_text: str,
+    client: genai.Client,
+    contract_id: str,
+    budget_tokens: int = None,
+):
+    """
+    Builds the agent-specific view of an ingested contract.
+
+    Args:
+        agent: Agent name (a key of AGENT_QUERIES)
+        contract_text: The full contract text
+        client: The Gemini AI client instance (for query embeddings)
+        contract_id: ID the contract was ingested under
+        budget_tokens: Token cap for the compiled text (defaults to COMPILED_PROMPT_TOKENS)
+
+    Returns:
+        (text, stats) where stats reports full_tokens, compiled_tokens,
+        saved_tokens and the number of sections kept
+    """
+    budget = budget_tokens or COMPILED_PROMPT_TOKENS
+    full_tokens = estimate_tokens(contract_text)
+    queries = AGENT_QUERIES.get(agent)
+
+    if not queries or full_tokens <= budget:
+        return contract_text, {
+            "full_tokens": full_tokens,
+            "compiled_tokens": full_tokens,
+            "saved_tokens": 0,
+            "sections": None,
+        }
+
+    query_embeddings = embed_texts(client, queries)
+    ranked = [
+        query_chunks(embedding, top_k=COMPILE_TOP_K, contract_id=contract_id)
+        for embedding in query_embeddings
+    ]
+
+    # Round-robin by rank so every clause family gets its best hits first.
+    selected = {}
+    used = estimate_tokens(_HEADER)
+    for rank in range(COMPILE_TOP_K):
+        for hits in ranked:
+            if rank >= len(hits) or hits[rank]["id"] in selected:
+                continue
+            tokens = estimate_tokens(hits[rank]["document"] + _SEPARATOR)
+            if used + tokens > budget:
+                continue
+            selected[hits[rank]["id"]] = hits[rank]
+            used += tokens
+
+    if not selected:
+        # Nothing retrievable (e.g. not ingested); fall back to the full text.
+        return contract_text, {
+            "full_tokens": full_tokens,
+            "compiled_tokens": full_tokens,
+            "saved_tokens": 0,
+            "sections": 0,
+        }
+
+    sections = sorted(selected.values(), key=lambda hit: hit["metadata"].get("start", 0))
+    text = _HEADER + _SEPARATOR.join(hit["document"] for hit in sections)
+    compiled_tokens = estimate_tokens(text)
+    return text, {
+        "full_tokens": full_tokens,
+        "compiled_tokens": compiled_tokens,
+        "saved_tokens": full_tokens - compiled_tokens,
+        "sections": len(sections),
+    }
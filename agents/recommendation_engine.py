@@ -9,34 +9,30 @@ recommendation (Accept / Review Before Signing / Reject) with reasoning and next
 Does NOT provide legal advice; provides structured decision-support insights.
 """
 from google import genai
-from google.genai.errors import ClientError
 
+from agents.runtime import arun_prompt, run_prompt, stream_prompt
 
-def generate_recommendation(
-    contract_text: str,
+# Prefix of an analysis that failed or timed out (see orchestrator.py).
+NOT_AVAILABLE = "NOT AVAILABLE"
+
+
+def _build_prompt(
     risk_data: str,
     legal_data: str,
     bias_data: str,
     stress_test_data: str,
     fraud_data: str,
-    client: genai.Client,
-) -> dict:
-    """
-    Synthesizes all analysis outputs into a single recommendation.
-
-    Uses the Gemini client to run a structured prompt that considers:
-    - Risk analysis
-    - Legal intelligence
-    - Bias/fairness
-    - Stress test results
-    - Fraud indicators
-
-    Returns a dict with key "final_recommendation" containing the model's
-    structured text (risk level, fairness, stability, recommendation, reasoning, next steps).
-    """
+) -> str:
     # Build a single prompt that injects all prior analyses so the model can
     # produce one coherent recommendation (risk level, fairness, stability, accept/review/reject).
-    prompt = f"""
+    analyses = (risk_data, legal_data, bias_data, stress_test_data, fraud_data)
+    missing = ""
+    if any(data.startswith(NOT_AVAILABLE) for data in analyses):
+        missing = (
+            "\nSome analyses are marked NOT AVAILABLE. Base the recommendation on the "
+            "others, say which are missing, and lower your confidence accordingly.\n"
+        )
+    return f"""
 You are a senior legal decision-support AI.
 
 Based on the following analyses:
@@ -70,31 +66,83 @@ Now provide:
 
 Keep the explanation professional and structured.
 Do NOT provide legal advice. Provide decision-support insights.
-"""
+{missing}"""
 
-    # Call Gemini with the combined prompt; handle quota/API errors like other agents.
-    try:
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt,
-        )
-    except ClientError as e:
-        if "429" in str(e):
-            return {"error": "AI quota exceeded. Please try again later."}
-        return {"error": str(e)}
-
-    # Extract text from response: prefer response.text, then fall back to
-    # iterating candidates/parts (same pattern as other agents).
-    text = getattr(response, "text", None)
-    if text:
-        return {"final_recommendation": text}
-
-    try:
-        for c in response.candidates:
-            for p in c.content.parts:
-                if hasattr(p, "text"):
-                    return {"final_recommendation": p.text}
-    except Exception:
-        pass
-
-    return {"error": "Unable to generate recommendation."}
+
+def generate_recommendation(
+    contract_text: str,
+    risk_data: str,
+    legal_data: str,
+    bias_data: str,
+    stress_test_data: str,
+    fraud_data: str,
+    client: genai.Client,
+) -> dict:
+    """
+    Synthesizes all analysis outputs into a single recommendation.
+
+    Uses the Gemini client to run a structured prompt that considers:
+    - Risk analysis
+    - Legal intelligence
+    - Bias/fairness
+    - Stress test results
+    - Fraud indicators
+
+    Returns a dict with key "final_recommendation" containing the model's
+    structured text (risk level, fairness, stability, recommendation, reasoning, next steps).
+    """
+    prompt = _build_prompt(risk_data, legal_data, bias_data, stress_test_data, fraud_data)
+
+    return run_prompt(
+        client,
+        "recommendation_engine",
+        prompt,
+        "final_recommendation",
+        "Unable to generate recommendation.",
+    )
+
+
+async def generate_recommendation_async(
+    contract_text: str,
+    risk_data: str,
+    legal_data: str,
+    bias_data: str,
+    stress_test_data: str,
+    fraud_data: str,
+    client: genai.Client,
+) -> dict:
+    """Async generate_recommendation, over `client.aio`."""
+    prompt = _build_prompt(risk_data, legal_data, bias_data, stress_test_data, fraud_data)
+    return await arun_prompt(
+        client,
+        "recommendation_engine",
+        prompt,
+        "final_recommendation",
+        "Unable to generate recommendation.",
+    )
+
+
+def stream_recommendation(
+    contract_text: str,
+    risk_data: str,
+    legal_data: str,
+    bias_data: str,
+    stress_test_data: str,
+    fraud_data: str,
+    client: genai.Client,
+):
+    """
+    Streaming variant of generate_recommendation.
+
+    A generator that yields the recommendation text piece by piece as Gemini
+    produces it. Its return value (the StopIteration value, or the result of
+    `yield from`) is the same dict generate_recommendation returns.
+    """
+    prompt = _build_prompt(risk_data, legal_data, bias_data, stress_test_data, fraud_data)
+    return (yield from stream_prompt(
+        client,
+        "recommendation_engine",
+        prompt,
+        "final_recommendation",
+        "Unable to generate recommendation.",
+    ))
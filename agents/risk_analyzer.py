@@ -1,12 +1,11 @@
 #responsible for analyzing the risks in the contract and if there are any one sided clauses or something that can harm the clinet
 from google import genai
-from google.genai.errors import ClientError
 
-def analyze_risks(contract_text: str, client: genai.Client) -> dict:
-    if not contract_text or len(contract_text.strip()) < 20:
-        return {"error": "Please provide a valid contract text."}
+from agents.runtime import arun_agent, run_agent
+from agents.schemas import RiskAnalysis
 
-    prompt = f"""
+def _build_prompt(contract_text: str) -> str:
+    return f"""
     You are a senior legal risk analyst.
 
     Analyze the following contract and identify risks.
@@ -26,23 +25,26 @@ def analyze_risks(contract_text: str, client: genai.Client) -> dict:
     {contract_text}
     """
 
-    try:
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt
-        )
-    except ClientError:
-        return {"error": "AI quota exceeded. Try again later."}
-
-    if getattr(response, "text", None):
-        return {"risk_analysis": response.text}
-
-    try:
-        for c in response.candidates:
-            for p in c.content.parts:
-                if hasattr(p, "text"):
-                    return {"risk_analysis": p.text}
-    except Exception:
-        pass
-
-    return {"error": "Unable to analyze risks."}
+
+def analyze_risks(contract_text: str, client: genai.Client) -> dict:
+    return run_agent(
+        client,
+        "risk_analyzer",
+        contract_text,
+        _build_prompt,
+        "risk_analysis",
+        "Unable to analyze risks.",
+        schema=RiskAnalysis,
+    )
+
+
+async def analyze_risks_async(contract_text: str, client: genai.Client) -> dict:
+    return await arun_agent(
+        client,
+        "risk_analyzer",
+        contract_text,
+        _build_prompt,
+        "risk_analysis",
+        "Unable to analyze risks.",
+        schema=RiskAnalysis,
+    )
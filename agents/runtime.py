@@ -0,0 +1,469 @@
+"""
+Agent Runtime
+
+Every agent runs the same steps: check the contract text, build its prompt,
+call Gemini (map-reduce for long contracts), extract the response text and
+turn API errors into an {"error": ...} result. `run_agent` does this for all
+of them (asking for schema-constrained JSON when the agent has a result type
+in agents/schemas.py), and adds three controls so one slow model response can't set the
+latency of a whole request:
+
+- Deadlines: each agent gets AGENT_TIMEOUT_SECONDS (or its entry in
+  AGENT_TIMEOUTS, e.g. "loophole_tester=45,legal_intelligence=45") for all of
+  its calls, map and reduce included. Past the deadline the agent returns
+  {"error": ..., "timed_out": True} instead of waiting; the abandoned call
+  finishes in the background and still fills the response cache.
+- Hedged requests: with AGENT_HEDGE_PERCENTILE set (e.g. 95), a call still
+  running after that percentile of the agent's recent latencies gets a
+  duplicate request, and whichever answers first wins.
+- Cooperative cancellation: calls started under a cancellation event (see
+  `with_cancellation`) stop before their next model call once it is set,
+  e.g. when a job is cancelled or a streaming client disconnects.
+
+`stream_prompt` is run_prompt for a streamed response: deadline and
+cancellation are checked between chunks, and an error mid-stream ends it
+with the same {"error": ...} result instead of raising into the consumer.
+
+`arun_agent` and `arun_prompt` do the same on the async request path, over
+`client.aio`. There a timed-out, cancelled or out-raced call is a task that
+is cancelled outright, which also closes its HTTP request.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from google import genai
+from google.genai.errors import ClientError
+
+from agents.map_reduce import agenerate_for_contract, generate_for_contract
+from agents.schemas import parse, response_schema, to_dict
+from utils.llm_cache import (
+    CachedResponse, agenerate_content, generate_content, generate_content_stream, response_text,
+)
+from utils.metrics import inc
+
+DEFAULT_MODEL = "models/gemini-2.5-flash"
+
+
+def _parse_timeouts(value: str) -> dict:
+    timeouts = {}
+    for item in value.split(","):
+        if "=" in item:
+            agent, seconds = item.split("=", 1)
+            timeouts[agent.strip()] = float(seconds)
+    return timeouts
+
+
+# Seconds an agent may take end to end (0 disables the deadline).
+AGENT_TIMEOUT_SECONDS = float(os.getenv("AGENT_TIMEOUT_SECONDS", "180"))
+AGENT_TIMEOUTS = _parse_timeouts(os.getenv("AGENT_TIMEOUTS", ""))
+# Latency percentile after which a call is hedged (0 disables hedging).
+AGENT_HEDGE_PERCENTILE = float(os.getenv("AGENT_HEDGE_PERCENTILE", "0"))
+AGENT_HEDGE_MIN_SAMPLES = int(os.getenv("AGENT_HEDGE_MIN_SAMPLES", "20"))
+AGENT_CALL_WORKERS = int(os.getenv("AGENT_CALL_WORKERS", "64"))
+
+# How often a waiting call checks for cancellation.
+_POLL_SECONDS = 0.25
+
+
+class AgentTimeout(Exception):
+    """The agent's deadline passed before its model calls finished."""
+
+
+class AgentCancelled(Exception):
+    """The caller cancelled the work this agent was doing."""
+
+
+# Monotonic deadline of the running agent, and the caller's cancellation event.
+_deadline = contextvars.ContextVar("agent_deadline", default=None)
+_cancel = contextvars.ContextVar("agent_cancel", default=None)
+
+
+def agent_timeout(agent: str) -> float:
+    return AGENT_TIMEOUTS.get(agent.split(":")[0], AGENT_TIMEOUT_SECONDS)
+
+
+def _bounded_deadline(seconds: float):
+    """Monotonic deadline `seconds` from now, capped by the current one."""
+    current = _deadline.get()
+    deadline = time.monotonic() + seconds if seconds and seconds > 0 else None
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    return deadline
+
+
+@contextmanager
+def agent_deadline(seconds: float):
+    """Bounds the model calls made inside the block (never extends an outer deadline)."""
+    token = _deadline.set(_bounded_deadline(seconds))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def with_cancellation(event: threading.Event, fn, *args):
+    """
+    Calls fn(*args) with agent calls cancellable through `event`. Run it in
+    a copied context (e.g. contextvars.copy_context().run) on a worker thread.
+    """
+    _cancel.set(event)
+    return fn(*args)
+
+
+def check_cancelled(deadline: float = None) -> None:
+    """
+    Raises AgentCancelled or AgentTimeout if the current agent should stop.
+    `deadline` (monotonic) replaces the one set by agent_deadline.
+    """
+    cancel = _cancel.get()
+    if cancel is not None and cancel.is_set():
+        raise AgentCancelled()
+    if deadline is None:
+        deadline = _deadline.get()
+    if deadline is not None and time.monotonic() >= deadline:
+        raise AgentTimeout()
+
+
+class LatencyTracker:
+    """Recent live-call latencies per agent, for picking hedge delays."""
+
+    def __init__(self, window: int = 200):
+        self._window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, agent: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(agent, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, agent: str, q: float):
+        """The q-th percentile, or None until AGENT_HEDGE_MIN_SAMPLES calls were seen."""
+        with self._lock:
+            samples = sorted(self._samples.get(agent, ()))
+        if not samples or len(samples) < AGENT_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+
+latencies = LatencyTracker()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=AGENT_CALL_WORKERS, thread_name_prefix="agent-call")
+    return _pool
+
+
+def generate(client, agent: str, prompt: str, model: str = DEFAULT_MODEL, config: dict = None):
+    """
+    Deadline-, hedging- and cancellation-aware `llm_cache.generate_content`.
+
+    The call runs on the runtime's pool while this thread waits for it, the
+    hedge (if any), the deadline or cancellation, whichever comes first.
+    """
+    check_cancelled()
+    cancel = _cancel.get()
+    deadline = _deadline.get()
+
+    def call():
+        # A duplicate or a queued call may start after the caller gave up.
+        if cancel is not None and cancel.is_set():
+            raise AgentCancelled()
+        started = time.monotonic()
+        response = generate_content(client, agent, prompt, model=model, config=config)
+        if not isinstance(response, CachedResponse):
+            latencies.record(agent, time.monotonic() - started)
+        return response
+
+    def submit():
+        return _get_pool().submit(contextvars.copy_context().run, call)
+
+    hedge_after = latencies.percentile(agent, AGENT_HEDGE_PERCENTILE) if AGENT_HEDGE_PERCENTILE > 0 else None
+    hedge_at = time.monotonic() + hedge_after if hedge_after is not None else None
+    primary = submit()
+    pending = {primary}
+    error = None
+    while pending:
+        now = time.monotonic()
+        wake = min(t for t in (deadline, hedge_at, now + _POLL_SECONDS) if t is not None)
+        done, pending = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                if future is not primary:
+                    inc("clm_agent_hedge_wins_total", agent=agent)
+                return future.result()
+            error = future.exception()
+
+        now = time.monotonic()
+        if pending and cancel is not None and cancel.is_set():
+            for future in pending:
+                future.cancel()
+            raise AgentCancelled()
+        if pending and deadline is not None and now >= deadline:
+            for future in pending:
+                future.cancel()
+            raise AgentTimeout()
+        if pending and hedge_at is not None and now >= hedge_at:
+            hedge_at = None
+            pending.add(submit())
+            inc("clm_agent_hedges_total", agent=agent)
+    raise error
+
+
+def structured_config(schema) -> dict:
+    """Generation config asking for JSON that matches a result dataclass."""
+    return {"response_mime_type": "application/json", "response_schema": response_schema(schema)}
+
+
+def call_agent(
+    client, agent: str, contract_text: str, build_prompt, model: str = DEFAULT_MODEL, schema=None
+):
+    """
+    Text of the agent's answer for a contract (map-reduce for long ones), or
+    None if the response had none. API errors, AgentTimeout and
+    AgentCancelled propagate.
+    """
+    config = structured_config(schema) if schema is not None else None
+    with agent_deadline(agent_timeout(agent)):
+        response = generate_for_contract(
+            client, agent, contract_text, build_prompt, model, generate=generate, config=config
+        )
+    return response_text(response)
+
+
+def _failure(agent: str, error: Exception) -> dict:
+    """
+    The error result of an agent that raised. Any Exception becomes one (a
+    network error or a bad response fails this agent, not the whole analysis);
+    a cancelled run reports "Cancelled." whatever the call raised.
+    """
+    cancel = _cancel.get()
+    if isinstance(error, AgentCancelled) or (cancel is not None and cancel.is_set()):
+        return {"error": "Cancelled.", "cancelled": True}
+    if isinstance(error, AgentTimeout):
+        inc("clm_agent_timeouts_total", agent=agent)
+        return {"error": f"Timed out after {agent_timeout(agent):g}s.", "timed_out": True}
+    inc("clm_agent_errors_total", agent=agent, error=type(error).__name__)
+    # Only a 429 is a quota problem; report other API errors as they are.
+    if isinstance(error, ClientError) and error.code == 429:
+        return {"error": "AI quota exceeded. Please try again later."}
+    return {"error": str(error)}
+
+
+def _result(agent: str, result_key: str, failure_message: str, run, clean=None, schema=None) -> dict:
+    try:
+        text = run()
+    except Exception as e:
+        return _failure(agent, e)
+    return _success(text, result_key, failure_message, clean, schema)
+
+
+def _success(text, result_key: str, failure_message: str, clean=None, schema=None) -> dict:
+    if not text:
+        return {"error": failure_message}
+    result = {result_key: clean(text) if clean else text}
+    if schema is not None:
+        parsed = parse(schema, text)
+        result["structured"] = to_dict(parsed) if parsed is not None else None
+    return result
+
+
+def run_agent(
+    client: genai.Client,
+    agent: str,
+    contract_text: str,
+    build_prompt,
+    result_key: str,
+    failure_message: str,
+    clean=None,
+    model: str = DEFAULT_MODEL,
+    schema=None,
+) -> dict:
+    """
+    Runs an agent on a contract.
+
+    Args:
+        client: The Gemini AI client instance
+        agent: Agent name (response cache key, metrics label, timeout entry)
+        contract_text: The contract text to analyze
+        build_prompt: Function of the contract text returning the prompt
+        result_key: Key of the answer text in the returned dict
+        failure_message: Error returned when the response has no text
+        clean: Optional function applied to the answer text
+        model: Gemini model name
+        schema: Optional result dataclass from agents/schemas.py; the model
+            then answers in JSON matching it
+
+    Returns:
+        {result_key: text}, plus "structured" (the parsed fields, or None if
+        the answer wasn't valid JSON) with a schema; or {"error": message}
+        (plus "timed_out" or "cancelled" when the agent was stopped)
+    """
+    if not contract_text or len(contract_text.strip()) < 20:
+        return {"error": "Please provide a valid contract text."}
+    return _result(
+        agent,
+        result_key,
+        failure_message,
+        lambda: call_agent(client, agent, contract_text, build_prompt, model, schema),
+        clean,
+        schema,
+    )
+
+
+def run_prompt(
+    client: genai.Client,
+    agent: str,
+    prompt: str,
+    result_key: str,
+    failure_message: str,
+    model: str = DEFAULT_MODEL,
+) -> dict:
+    """Like run_agent, for a prompt that is already built (one model call)."""
+
+    def run():
+        with agent_deadline(agent_timeout(agent)):
+            return response_text(generate(client, agent, prompt, model=model))
+
+    return _result(agent, result_key, failure_message, run)
+
+
+def stream_prompt(
+    client: genai.Client,
+    agent: str,
+    prompt: str,
+    result_key: str,
+    failure_message: str,
+    model: str = DEFAULT_MODEL,
+):
+    """
+    Streaming run_prompt: a generator yielding the response text piece by
+    piece, whose return value is the dict run_prompt would return.
+    """
+    # Held locally: a contextvar set inside a generator would leak into the
+    # consumer's code between pieces.
+    deadline = _bounded_deadline(agent_timeout(agent))
+    pieces = []
+    try:
+        check_cancelled(deadline)
+        for piece in generate_content_stream(client, agent, prompt, model=model):
+            pieces.append(piece)
+            yield piece
+            check_cancelled(deadline)
+    except Exception as e:
+        # Network errors included: raising here would cut the consumer's
+        # stream off instead of ending it with an error result.
+        return _failure(agent, e)
+    if pieces:
+        return {result_key: "".join(pieces)}
+    return {"error": failure_message}
+
+
+async def agenerate(client, agent: str, prompt: str, model: str = DEFAULT_MODEL, config: dict = None):
+    """
+    Async `generate`: the call is a task raced against the hedge and the
+    deadline. Cancelling the caller cancels the call (and any hedge).
+    """
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() >= deadline:
+        raise AgentTimeout()
+
+    async def call():
+        started = time.monotonic()
+        response = await agenerate_content(client, agent, prompt, model=model, config=config)
+        if not isinstance(response, CachedResponse):
+            latencies.record(agent, time.monotonic() - started)
+        return response
+
+    hedge_after = latencies.percentile(agent, AGENT_HEDGE_PERCENTILE) if AGENT_HEDGE_PERCENTILE > 0 else None
+    hedge_at = time.monotonic() + hedge_after if hedge_after is not None else None
+    primary = asyncio.create_task(call())
+    pending = {primary}
+    error = None
+    try:
+        while pending:
+            now = time.monotonic()
+            wake = min((t for t in (deadline, hedge_at) if t is not None), default=None)
+            timeout = None if wake is None else max(0.0, wake - now)
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        inc("clm_agent_hedge_wins_total", agent=agent)
+                    return task.result()
+                error = task.exception()
+
+            now = time.monotonic()
+            if pending and deadline is not None and now >= deadline:
+                raise AgentTimeout()
+            if pending and hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                pending.add(asyncio.create_task(call()))
+                inc("clm_agent_hedges_total", agent=agent)
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def acall_agent(
+    client, agent: str, contract_text: str, build_prompt, model: str = DEFAULT_MODEL, schema=None
+):
+    """Async call_agent."""
+    config = structured_config(schema) if schema is not None else None
+    with agent_deadline(agent_timeout(agent)):
+        response = await agenerate_for_contract(
+            client, agent, contract_text, build_prompt, model, generate=agenerate, config=config
+        )
+    return response_text(response)
+
+
+async def arun_agent(
+    client: genai.Client,
+    agent: str,
+    contract_text: str,
+    build_prompt,
+    result_key: str,
+    failure_message: str,
+    clean=None,
+    model: str = DEFAULT_MODEL,
+    schema=None,
+) -> dict:
+    """Async run_agent, over `client.aio`; same arguments and result."""
+    if not contract_text or len(contract_text.strip()) < 20:
+        return {"error": "Please provide a valid contract text."}
+    try:
+        text = await acall_agent(client, agent, contract_text, build_prompt, model, schema)
+    except Exception as e:
+        return _failure(agent, e)
+    return _success(text, result_key, failure_message, clean, schema)
+
+
+async def arun_prompt(
+    client: genai.Client,
+    agent: str,
+    prompt: str,
+    result_key: str,
+    failure_message: str,
+    model: str = DEFAULT_MODEL,
+) -> dict:
+    """Async run_prompt."""
+    try:
+        with agent_deadline(agent_timeout(agent)):
+            text = response_text(await agenerate(client, agent, prompt, model=model))
+    except Exception as e:
+        return _failure(agent, e)
+    return _success(text, result_key, failure_message)
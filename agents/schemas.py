@@ -0,0 +1,212 @@
+"""
+Structured Agent Outputs
+
+The five full-analysis agents ask Gemini for JSON constrained to a response
+schema, so the API returns typed fields instead of free text that may or may
+not be (markdown-fenced) JSON. Each agent's result type is a slotted
+dataclass here; `response_schema` derives the Gemini schema from it, and
+`parse` turns the response text into an instance once, coercing missing or
+mistyped fields instead of failing.
+
+Agents return the parsed fields under "structured" next to the raw text
+(see agents/runtime.py). The recommendation engine gets `digest(...)` of
+each analysis, a few capped lines of its key fields, instead of the whole
+result dict.
+"""
+import dataclasses
+import json
+import os
+import typing
+from dataclasses import dataclass, field
+
+from rag.text_splitter import CHARS_PER_TOKEN, estimate_tokens
+
+# Token budget of one analysis' digest in the recommendation prompt.
+DIGEST_TOKENS = int(os.getenv("RECOMMENDATION_DIGEST_TOKENS", "350"))
+# Longest single item (risk, reason, suggestion...) kept in a digest.
+DIGEST_ITEM_CHARS = 300
+
+_LEVELS = ["Low", "Medium", "High"]
+
+
+def _enum(values):
+    return field(default="", metadata={"enum": values})
+
+
+@dataclass(slots=True)
+class RiskAnalysis:
+    risk_level: str = _enum(_LEVELS)
+    risks: list[str] = field(default_factory=list)
+    suggestions: list[str] = field(default_factory=list)
+
+    def lines(self):
+        yield f"Risk level: {self.risk_level}"
+        yield from (f"Risk: {risk}" for risk in self.risks)
+        yield from (f"Suggestion: {suggestion}" for suggestion in self.suggestions)
+
+
+@dataclass(slots=True)
+class LegalIntelligence:
+    applicable_laws: list[str] = field(default_factory=list)
+    law_explanations: list[str] = field(default_factory=list)
+    compliance_gaps: list[str] = field(default_factory=list)
+    ambiguous_clauses: list[str] = field(default_factory=list)
+    why_ambiguous: list[str] = field(default_factory=list)
+    safe_suggestions: list[str] = field(default_factory=list)
+    review_recommendation: str = ""
+
+    def lines(self):
+        yield f"Review: {self.review_recommendation}"
+        yield from (f"Compliance gap: {gap}" for gap in self.compliance_gaps)
+        yield from (f"Ambiguous: {clause}" for clause in self.ambiguous_clauses)
+        if self.applicable_laws:
+            yield "Applicable laws: " + "; ".join(self.applicable_laws)
+
+
+@dataclass(slots=True)
+class BiasAnalysis:
+    favored_party: str = _enum(["Client", "Vendor", "Neutral"])
+    bias_score: int = 0
+    reasons: list[str] = field(default_factory=list)
+
+    def lines(self):
+        yield f"Favored party: {self.favored_party} (bias score {self.bias_score}, -5 client to +5 vendor)"
+        yield from (f"Reason: {reason}" for reason in self.reasons)
+
+
+@dataclass(slots=True)
+class BreachScenario:
+    scenario: str = ""
+    at_fault: str = ""
+    protected_party: str = ""
+    likely_winner: str = ""
+    reasoning: str = ""
+
+
+@dataclass(slots=True)
+class StressTest:
+    scenarios: list[BreachScenario] = field(default_factory=list)
+
+    def lines(self):
+        for s in self.scenarios:
+            yield (
+                f"{s.scenario}: at fault {s.at_fault}; protected {s.protected_party}; "
+                f"likely winner {s.likely_winner}. {s.reasoning}"
+            )
+
+
+@dataclass(slots=True)
+class FraudIndicator:
+    indicator: str = ""
+    reasoning: str = ""
+
+
+@dataclass(slots=True)
+class FraudIndicators:
+    fraud_risk_level: str = _enum(_LEVELS)
+    indicators: list[FraudIndicator] = field(default_factory=list)
+    next_steps: list[str] = field(default_factory=list)
+
+    def lines(self):
+        yield f"Fraud risk level: {self.fraud_risk_level}"
+        yield from (f"Indicator: {i.indicator} ({i.reasoning})" for i in self.indicators)
+        yield from (f"Next step: {step}" for step in self.next_steps)
+
+
+_TYPES = {str: "STRING", int: "INTEGER", float: "NUMBER", bool: "BOOLEAN"}
+
+
+def _schema(tp, metadata=None) -> dict:
+    if typing.get_origin(tp) is list:
+        return {"type": "ARRAY", "items": _schema(typing.get_args(tp)[0])}
+    if dataclasses.is_dataclass(tp):
+        hints = typing.get_type_hints(tp)
+        fields = dataclasses.fields(tp)
+        return {
+            "type": "OBJECT",
+            "properties": {f.name: _schema(hints[f.name], f.metadata) for f in fields},
+            "required": [f.name for f in fields],
+            "property_ordering": [f.name for f in fields],
+        }
+    schema = {"type": _TYPES[tp]}
+    if metadata and "enum" in metadata:
+        schema["enum"] = list(metadata["enum"])
+    return schema
+
+
+def response_schema(cls) -> dict:
+    """Gemini response schema (OpenAPI subset) for a result dataclass."""
+    return _schema(cls)
+
+
+def _coerce(tp, value):
+    if typing.get_origin(tp) is list:
+        if value is None:
+            return []
+        items = value if isinstance(value, list) else [value]
+        return [_coerce(typing.get_args(tp)[0], item) for item in items]
+    if dataclasses.is_dataclass(tp):
+        return from_dict(tp, value if isinstance(value, dict) else {})
+    if tp is int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return 0
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def from_dict(cls, data: dict):
+    """An instance of `cls` from a dict, ignoring unknown keys and coercing types."""
+    hints = typing.get_type_hints(cls)
+    return cls(**{
+        f.name: _coerce(hints[f.name], data[f.name])
+        for f in dataclasses.fields(cls)
+        if f.name in data
+    })
+
+
+def parse(cls, text: str):
+    """The JSON object in `text` (fences allowed) as a `cls`, or None if it isn't one."""
+    cleaned = (text or "").strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.replace("```json", "").replace("```", "").strip()
+    try:
+        data = json.loads(cleaned)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return from_dict(cls, data)
+
+
+def to_dict(result) -> dict:
+    return dataclasses.asdict(result)
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def digest(result, budget_tokens: int = None) -> str:
+    """
+    Key fields of a parsed result (or plain text) within `budget_tokens`:
+    the headline line first, then items in the order the model ranked them.
+    """
+    budget = DIGEST_TOKENS if budget_tokens is None else budget_tokens
+    if isinstance(result, str):
+        return _clip(result, budget * CHARS_PER_TOKEN)
+    kept = []
+    used = 0
+    for line in result.lines():
+        line = _clip(line, DIGEST_ITEM_CHARS)
+        cost = estimate_tokens(line) + 1
+        if kept and used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(f"- {line}" for line in kept) or "- No findings reported."
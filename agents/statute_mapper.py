@@ -15,24 +15,12 @@ This is useful for compliance checking and understanding the legal framework
 that governs the contract.
 """
 from google import genai
-from google.genai.errors import ClientError
 
+from agents.runtime import arun_agent, run_agent
 
-def map_statutes(contract_text: str, client: genai.Client) -> dict:
-    """
-    Maps contract clauses to applicable legal statutes and regulations.
-
-    Args:
-        contract_text: The contract text to analyze
-        client: The Gemini AI client instance
-
-    Returns:
-        Dictionary containing statute mapping analysis results
-    """
-    if not contract_text or len(contract_text.strip()) < 20:
-        return {"error": "Please provide a valid contract text."}
 
-    prompt = f"""
+def _build_prompt(contract_text: str) -> str:
+    return f"""
 You are a legal statute mapping assistant.
 
 For the contract:
@@ -47,26 +35,34 @@ Contract:
 {contract_text}
 """
 
-    try:
-        response = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=prompt
-        )
-    except ClientError as e:
-        if "429" in str(e):
-            return {"error": "AI quota exceeded. Please try again later."}
-        return {"error": str(e)}
 
-    if getattr(response, "text", None):
-        return {"statute_mapping": response.text}
-
-    try:
-        for c in response.candidates:
-            for p in c.content.parts:
-                if hasattr(p, "text"):
-                    return {"statute_mapping": p.text}
-    except Exception:
-        pass
+def map_statutes(contract_text: str, client: genai.Client) -> dict:
+    """
+    Maps contract clauses to applicable legal statutes and regulations.
 
-    return {"error": "Unable to map statutes."}
+    Args:
+        contract_text: The contract text to analyze
+        client: The Gemini AI client instance
 
+    Returns:
+        Dictionary containing statute mapping analysis results
+    """
+    return run_agent(
+        client,
+        "statute_mapper",
+        contract_text,
+        _build_prompt,
+        "statute_mapping",
+        "Unable to map statutes.",
+    )
+
+
+async def map_statutes_async(contract_text: str, client: genai.Client) -> dict:
+    return await arun_agent(
+        client,
+        "statute_mapper",
+        contract_text,
+        _build_prompt,
+        "statute_mapping",
+        "Unable to map statutes.",
+    )
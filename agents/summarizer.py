@@ -2,11 +2,10 @@
 
 from google import genai
 
-def summarize_contract(contract_text: str, client: genai.Client) -> str:
-    if not contract_text or len(contract_text.strip()) < 20:
-        return "Please provide a valid contract text (at least a few sentences)."
+from agents.runtime import AgentCancelled, AgentTimeout, acall_agent, call_agent
 
-    prompt = f"""
+def _build_prompt(contract_text: str) -> str:
+    return f"""
     You are a legal paralegal.
 
     Summarize the following contract in simple English.
@@ -19,20 +18,28 @@ def summarize_contract(contract_text: str, client: genai.Client) -> str:
     {contract_text}
     """
 
-    response = client.models.generate_content(
-        model="models/gemini-2.5-flash",  # ✅ FREE TIER SAFE
-        contents=prompt
-    )
 
-    if getattr(response, "text", None):
-        return response.text
+def summarize_contract(contract_text: str, client: genai.Client) -> str:
+    if not contract_text or len(contract_text.strip()) < 20:
+        return "Please provide a valid contract text (at least a few sentences)."
+
+    try:
+        text = call_agent(client, "summarizer", contract_text, _build_prompt)
+    except AgentTimeout:
+        return "Summary timed out. Please try again later."
+    except AgentCancelled:
+        return "Summary cancelled."
+    return text or "Unable to generate summary."
+
+
+async def summarize_contract_async(contract_text: str, client: genai.Client) -> str:
+    if not contract_text or len(contract_text.strip()) < 20:
+        return "Please provide a valid contract text (at least a few sentences)."
 
     try:
-        for c in response.candidates:
-            for p in c.content.parts:
-                if hasattr(p, "text"):
-                    return p.text
-    except Exception:
-        pass
-
-    return "Unable to generate summary."
+        text = await acall_agent(client, "summarizer", contract_text, _build_prompt)
+    except AgentTimeout:
+        return "Summary timed out. Please try again later."
+    except AgentCancelled:
+        return "Summary cancelled."
+    return text or "Unable to generate summary."
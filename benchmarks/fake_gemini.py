@@ -0,0 +1,215 @@
+"""
+Fake Gemini client for offline benchmarks.
+
+Mimics the small part of `genai.Client` the agents and RAG layer use
+(`client.models.generate_content`, `generate_content_stream` and
+`embed_content`) and
+sleeps for a configurable latency (plus random jitter) on every call, so
+pipeline changes can be measured without a network connection or API quota.
+It can also reject a share of calls with 429 errors (optionally carrying a
+retry hint) to exercise the rate limiter in utils/gemini_client.py, and pad
+responses to a given size. Calls with a response schema get JSON matching
+it. Responses (and the last chunk of a stream) finish with reason STOP, so
+they are cacheable like real ones. `client.aio.models` offers the same calls as coroutines for the async
+request path, sleeping on the event loop and sharing the sync side's
+counters.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from google.genai.errors import ClientError
+
+
+_STOPPED = [SimpleNamespace(finish_reason="STOP")]
+
+
+def _stop_if(last: bool) -> list:
+    return _STOPPED if last else []
+
+
+class FakeModels:
+    def __init__(
+        self,
+        latency: float,
+        embed_latency: float,
+        embedding_dim: int,
+        error_rate: float = 0.0,
+        retry_after: float = None,
+        seed: int = 0,
+        jitter: float = 0.0,
+        response_chars: int = None,
+    ):
+        self.latency = latency
+        self.embed_latency = embed_latency
+        self.embedding_dim = embedding_dim
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.jitter = jitter
+        self.response_chars = response_chars
+        self.generate_calls = 0
+        self.embed_calls = 0
+        self.rate_limited_calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self, latency: float) -> float:
+        """`latency` plus up to +/- `jitter` seconds, never negative."""
+        if not self.jitter:
+            return latency
+        with self._lock:
+            return max(0.0, latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _maybe_rate_limit(self):
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return
+            self.rate_limited_calls += 1
+        error = {"code": 429, "message": "Resource has been exhausted.", "status": "RESOURCE_EXHAUSTED"}
+        if self.retry_after is not None:
+            error["details"] = [{
+                "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                "retryDelay": f"{self.retry_after}s",
+            }]
+        raise ClientError(429, {"error": error})
+
+    def generate_content(self, model: str, contents, config=None):
+        with self._lock:
+            self.generate_calls += 1
+        self._maybe_rate_limit()
+        time.sleep(self._delay(self.latency))
+        return self._response(contents, config)
+
+    def _response(self, contents, config):
+        schema = (config or {}).get("response_schema") if isinstance(config, dict) else None
+        if schema:
+            return SimpleNamespace(text=json.dumps(self._structured(schema, self._text(contents))), candidates=_STOPPED)
+        return SimpleNamespace(text=self._text(contents), candidates=_STOPPED)
+
+    def generate_content_stream(self, model: str, contents, config=None):
+        # Half the latency before the first chunk, the rest spread over the
+        # remaining chunks, like a real streamed response.
+        with self._lock:
+            self.generate_calls += 1
+        self._maybe_rate_limit()
+        words = self._text(contents).split(" ")
+        latency = self._delay(self.latency)
+        time.sleep(latency / 2)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(latency / 2 / (len(words) - 1))
+            yield SimpleNamespace(text=word if i == 0 else " " + word, candidates=_stop_if(i == len(words) - 1))
+
+    def embed_content(self, model: str, contents, config=None):
+        with self._lock:
+            self.embed_calls += 1
+        self._maybe_rate_limit()
+        time.sleep(self._delay(self.embed_latency))
+        return self._embeddings(contents)
+
+    def _embeddings(self, contents):
+        texts = contents if isinstance(contents, list) else [contents]
+        return SimpleNamespace(
+            embeddings=[SimpleNamespace(values=self._vector(t)) for t in texts]
+        )
+
+    def _text(self, contents) -> str:
+        prompt = str(contents)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        text = f"Fake analysis {digest} for a {len(prompt)}-char prompt."
+        if self.response_chars and len(text) < self.response_chars:
+            filler = " The clause was reviewed and no further issues were found."
+            text += (filler * (self.response_chars // len(filler) + 1))[:self.response_chars - len(text)]
+        return text
+
+    def _structured(self, schema: dict, text: str):
+        """A value matching a Gemini response schema, filled from `text`."""
+        kind = schema.get("type")
+        if kind == "OBJECT":
+            return {name: self._structured(sub, text) for name, sub in schema.get("properties", {}).items()}
+        if kind == "ARRAY":
+            return [self._structured(schema["items"], text) for _ in range(3)]
+        if kind in ("INTEGER", "NUMBER"):
+            return len(text) % 5
+        if kind == "BOOLEAN":
+            return False
+        return schema["enum"][len(text) % len(schema["enum"])] if schema.get("enum") else text
+
+    def _vector(self, text: str) -> list:
+        # Deterministic pseudo-embedding so retrieval results are stable.
+        seed = hashlib.sha256(str(text).encode("utf-8")).digest()
+        return [
+            (seed[i % len(seed)] - 128) / 128.0
+            for i in range(self.embedding_dim)
+        ]
+
+
+class FakeAsyncModels:
+    """`client.aio.models` of the fake: the same calls, awaiting instead of blocking."""
+
+    def __init__(self, models: FakeModels):
+        self._models = models
+
+    async def generate_content(self, model: str, contents, config=None):
+        models = self._models
+        with models._lock:
+            models.generate_calls += 1
+        models._maybe_rate_limit()
+        await asyncio.sleep(models._delay(models.latency))
+        return models._response(contents, config)
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        models = self._models
+        with models._lock:
+            models.generate_calls += 1
+        models._maybe_rate_limit()
+        words = models._text(contents).split(" ")
+        latency = models._delay(models.latency)
+
+        async def stream():
+            await asyncio.sleep(latency / 2)
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(latency / 2 / (len(words) - 1))
+                yield SimpleNamespace(text=word if i == 0 else " " + word, candidates=_stop_if(i == len(words) - 1))
+
+        return stream()
+
+    async def embed_content(self, model: str, contents, config=None):
+        models = self._models
+        with models._lock:
+            models.embed_calls += 1
+        models._maybe_rate_limit()
+        await asyncio.sleep(models._delay(models.embed_latency))
+        return models._embeddings(contents)
+
+
+class FakeGeminiClient:
+    """
+    Stand-in for `genai.Client` with per-call latency (in seconds).
+
+    `error_rate` is the share of calls rejected with a 429; `retry_after`
+    adds a RetryInfo hint of that many seconds to those errors. `jitter`
+    varies each call's latency by up to that many seconds either way, and
+    `response_chars` pads generated text to about that length.
+    """
+
+    def __init__(
+        self,
+        latency: float = 1.0,
+        embed_latency: float = 0.05,
+        embedding_dim: int = 64,
+        error_rate: float = 0.0,
+        retry_after: float = None,
+        seed: int = 0,
+        jitter: float = 0.0,
+        response_chars: int = None,
+    ):
+        self.models = FakeModels(
+            latency, embed_latency, embedding_dim, error_rate, retry_after, seed, jitter, response_chars
+        )
+        self.aio = SimpleNamespace(models=FakeAsyncModels(self.models))
@@ -0,0 +1,337 @@
+"""
+Offline load benchmark of the HTTP API.
+
+Loads the FastAPI app from `Main` with a FakeGeminiClient in place of
+`genai.Client` and drives it in process through httpx's ASGI transport, so
+the whole request path (validation, routing, thread pool, pipeline) is
+measured without a network connection or API quota.
+
+Scenarios:
+- full-analysis       POST /full-analysis with a synthetic contract
+- full-analysis-pdf   POST /full-analysis-pdf with the same contract as a PDF
+- rag-ingest          POST /rag/ingest
+- rag-ask             POST /rag/ask-with-memory against one ingested contract
+
+Every (scenario, size, concurrency) combination sends --requests requests
+with that many in flight and reports p50 / p95 / p99 latency, throughput and
+the peak RSS of the process. Each request gets a different synthetic
+contract, and the LLM cache, embedding cache and near-duplicate lookup are
+off unless --caches is given, so every request does the full work.
+
+Results are written to a JSON file; --compare checks them against an
+earlier run and exits with status 1 if any metric regressed by more than
+--tolerance.
+
+Usage:
+    python -m benchmarks.load --scenarios full-analysis,rag-ask --sizes 5KB,500KB \\
+        --concurrency 1,8 --requests 16 --latency 0.5 --jitter 0.2 --error-rate 0.02
+    python -m benchmarks.load ... --compare .cache/benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from importlib.machinery import SourceFileLoader
+from unittest import mock
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_gemini import FakeGeminiClient  # noqa: E402
+from benchmarks.synthetic import contract_pdf, synthetic_contract  # noqa: E402
+
+SCENARIOS = ("full-analysis", "full-analysis-pdf", "rag-ingest", "rag-ask")
+QUESTIONS = [
+    "When are invoices due?",
+    "What is the liability cap?",
+    "How much notice is needed to terminate for convenience?",
+    "Which law governs this agreement?",
+    "How long does confidentiality last after termination?",
+]
+# metric -> True when a higher value is worse
+COMPARED_METRICS = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "p99_ms": True,
+    "throughput_rps": False,
+    "peak_rss_mb": True,
+}
+
+
+def percentile(values, q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100) of a non-empty list."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # No procfs (e.g. macOS): fall back to the process-wide peak.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    """Samples the process RSS on a background thread and keeps the peak."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+
+def load_app(fake_kwargs: dict, caches: bool):
+    """Imports Main with a fake Gemini client; returns (app, fake client)."""
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    if not caches:
+        os.environ["LLM_CACHE"] = "0"
+        os.environ["EMBEDDING_CACHE"] = "0"
+        os.environ["NEAR_DUPLICATES"] = "0"
+    fake = FakeGeminiClient(**fake_kwargs)
+    with mock.patch("google.genai.Client", lambda *args, **kwargs: fake):
+        main = SourceFileLoader("clm_main", os.path.join(REPO_ROOT, "Main")).load_module()
+    return main.app, fake
+
+
+async def _payload(scenario: str, size: str, seed: int):
+    """Request arguments for one request (built off the event loop)."""
+    if scenario == "full-analysis-pdf":
+        pdf = await asyncio.to_thread(lambda: contract_pdf(synthetic_contract(size, seed)))
+        return {"files": {"file": ("contract.pdf", pdf, "application/pdf")}}
+    text = await asyncio.to_thread(synthetic_contract, size, seed)
+    if scenario == "rag-ingest":
+        return {"json": {"contract_text": text, "contract_id": f"bench-{size}-{seed}"}}
+    return {"json": {"contract_text": text}}
+
+
+async def run_scenario(http, fake, scenario: str, size: str, concurrency: int, requests: int, seed: int) -> dict:
+    path = {
+        "full-analysis": "/full-analysis",
+        "full-analysis-pdf": "/full-analysis-pdf",
+        "rag-ingest": "/rag/ingest",
+        "rag-ask": "/rag/ask-with-memory",
+    }[scenario]
+
+    contract_id = None
+    if scenario == "rag-ask":
+        contract_id = f"bench-ask-{size}-{seed}"
+        response = await http.post("/rag/ingest", json={
+            "contract_text": synthetic_contract(size, seed), "contract_id": contract_id,
+        })
+        response.raise_for_status()
+
+    latencies = []
+    statuses = {}
+    next_index = iter(range(requests))
+    calls_before = (fake.models.generate_calls, fake.models.embed_calls, fake.models.rate_limited_calls)
+
+    async def worker(worker_id: int):
+        for i in next_index:
+            if scenario == "rag-ask":
+                kwargs = {"json": {
+                    "session_id": f"bench-{worker_id}",
+                    "question": QUESTIONS[i % len(QUESTIONS)],
+                    "contract_id": contract_id,
+                }}
+            else:
+                kwargs = await _payload(scenario, size, seed + i)
+            start = time.perf_counter()
+            try:
+                response = await http.post(path, **kwargs)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    ok = statuses.get("200", 0)
+    return {
+        "scenario": scenario,
+        "size": size,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": requests - ok,
+        "statuses": statuses,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+        "throughput_rps": round(ok / wall, 3),
+        "wall_seconds": round(wall, 2),
+        "peak_rss_mb": round(rss.peak / 1024 ** 2, 1),
+        "gemini_calls": {
+            "generate": fake.models.generate_calls - calls_before[0],
+            "embed": fake.models.embed_calls - calls_before[1],
+            "rate_limited": fake.models.rate_limited_calls - calls_before[2],
+        },
+    }
+
+
+def _run_key(run: dict) -> tuple:
+    return run["scenario"], run["size"], run["concurrency"]
+
+
+def compare(runs, baseline_runs, tolerance: float) -> list:
+    """Prints per-metric changes against a baseline; returns the regressions."""
+    baseline = {_run_key(run): run for run in baseline_runs}
+    regressions = []
+    for run in runs:
+        before = baseline.get(_run_key(run))
+        if before is None:
+            continue
+        changes = []
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            old, new = before.get(metric), run.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            changes.append(f"{metric} {change:+.0%}")
+            if (change if higher_is_worse else -change) > tolerance:
+                regressions.append({"run": _run_key(run), "metric": metric, "before": old, "after": new})
+        print(f"  {'/'.join(map(str, _run_key(run)))}: " + ", ".join(changes))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_all(args, app, fake) -> list:
+    runs = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as http:
+        for scenario in args.scenarios:
+            for size in args.sizes:
+                for concurrency in args.concurrency:
+                    run = await run_scenario(
+                        http, fake, scenario, size, concurrency, args.requests,
+                        seed=args.seed + 1000 * len(runs),
+                    )
+                    runs.append(run)
+                    print(
+                        f"{scenario:>18} {size:>6} x{concurrency:<3} "
+                        f"p50 {run['p50_ms']:>8.1f}ms  p95 {run['p95_ms']:>8.1f}ms  "
+                        f"p99 {run['p99_ms']:>8.1f}ms  {run['throughput_rps']:>7.2f} req/s  "
+                        f"rss {run['peak_rss_mb']:>7.1f}MB  errors {run['errors']}"
+                    )
+    return runs
+
+
+def _csv(value: str, cast=str) -> list:
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load benchmark of the CLM API.")
+    parser.add_argument("--scenarios", type=_csv, default=list(SCENARIOS), help=",".join(SCENARIOS))
+    parser.add_argument("--sizes", type=_csv, default=["5KB", "50KB"], help="contract sizes, e.g. 5KB,500KB,5MB")
+    parser.add_argument("--concurrency", type=lambda v: _csv(v, int), default=[1, 4], help="requests in flight")
+    parser.add_argument("--requests", type=int, default=8, help="requests per scenario / size / concurrency")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per generate call")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="seconds per embed call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds added to each call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls rejected with 429")
+    parser.add_argument("--retry-after", type=float, default=None, help="retry hint on 429s, in seconds")
+    parser.add_argument("--response-chars", type=int, default=None, help="approximate generated text size")
+    parser.add_argument("--caches", action="store_true", help="keep LLM / embedding caches and near-duplicates on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default .cache/benchmarks/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    started = datetime.now(timezone.utc)
+    output = os.path.abspath(args.output or os.path.join(
+        ".cache", "benchmarks", started.strftime("%Y%m%dT%H%M%SZ") + ".json"
+    ))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    # Every store the app opens lives under .cache/ in the working directory;
+    # run in a scratch directory so earlier runs can't warm them up.
+    workdir = tempfile.mkdtemp(prefix="clm-benchmark-")
+    os.chdir(workdir)
+    fake_kwargs = dict(
+        latency=args.latency,
+        embed_latency=args.embed_latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        response_chars=args.response_chars,
+        seed=args.seed,
+    )
+    app, fake = load_app(fake_kwargs, args.caches)
+    runs = asyncio.run(run_all(args, app, fake))
+
+    results = {
+        "started": started.isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "settings": {**fake_kwargs, "caches": args.caches, "requests": args.requests},
+        "runs": runs,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline is not None:
+        print(f"Compared with {args.compare} (commit {baseline.get('commit')}):")
+        regressions = compare(runs, baseline["runs"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {'/'.join(map(str, regression['run']))} {regression['metric']}: "
+                  f"{regression['before']} -> {regression['after']}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
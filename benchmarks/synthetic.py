@@ -0,0 +1,194 @@
+"""
+Synthetic contracts for offline benchmarks.
+
+`synthetic_contract` builds a plausible services agreement of a requested
+size (e.g. "5KB" up to "5MB") from numbered articles of templated clauses:
+payment terms, termination, indemnity, liability caps, confidentiality and
+so on, with randomized parties, amounts and notice periods. The same seed
+always gives the same text, and different seeds give different contracts,
+so repeated requests don't just hit the caches.
+
+`contract_pdf` lays the text out as a plain multi-page PDF, written
+directly so no PDF library is needed. pdfplumber reads it back as text.
+
+Usage:
+    python -m benchmarks.synthetic 500KB --pdf contract.pdf
+"""
+import argparse
+import random
+import re
+import textwrap
+import zlib
+
+PARTIES = [
+    "Acme Logistics Ltd.", "Birchwood Analytics LLC", "Cobalt Health Systems Inc.",
+    "Dunmore Retail Group", "Everline Software GmbH", "Fairhaven Capital Partners",
+    "Greystone Manufacturing Co.", "Harbor Point Energy", "Ironclad Security Services",
+    "Juniper Media Holdings",
+]
+JURISDICTIONS = ["New York", "Delaware", "California", "England and Wales", "Singapore", "Ontario"]
+ARTICLES = [
+    "Definitions", "Services", "Fees and Payment", "Term and Termination",
+    "Confidentiality", "Intellectual Property", "Warranties", "Indemnification",
+    "Limitation of Liability", "Data Protection", "Insurance", "Governing Law",
+    "Dispute Resolution", "Force Majeure", "Assignment", "Notices", "General Provisions",
+]
+CLAUSES = [
+    "The {vendor} shall provide the Services described in Schedule {schedule} in a professional "
+    "and workmanlike manner and in accordance with the service levels set out therein.",
+    "The {client} shall pay each undisputed invoice within {days} days of receipt. Late payments "
+    "accrue interest at {rate}% per month until paid in full.",
+    "The total fees payable under this Agreement shall not exceed ${amount:,} in any contract year "
+    "without the prior written approval of the {client}.",
+    "Either party may terminate this Agreement for convenience upon {notice} days' written notice "
+    "to the other party.",
+    "Either party may terminate this Agreement immediately if the other party commits a material "
+    "breach that remains uncured {cure} days after written notice of the breach.",
+    "The {vendor} shall indemnify, defend and hold harmless the {client} from and against any "
+    "third-party claims arising out of the {vendor}'s negligence or wilful misconduct.",
+    "Except for breaches of confidentiality, neither party's aggregate liability shall exceed "
+    "{multiple} times the fees paid in the {months} months preceding the claim.",
+    "Each party shall keep the other party's Confidential Information strictly confidential and "
+    "shall not disclose it to any third party for {years} years after termination.",
+    "All intellectual property created by the {vendor} in performing the Services shall vest in "
+    "the {client} upon full payment of the applicable fees.",
+    "The {vendor} shall maintain professional liability insurance of not less than ${insurance:,} "
+    "per claim throughout the term and for {years} years thereafter.",
+    "This Agreement is governed by the laws of {jurisdiction}, and the courts of {jurisdiction} "
+    "have exclusive jurisdiction over any dispute arising from it.",
+    "Neither party shall be liable for any delay caused by events beyond its reasonable control, "
+    "provided it notifies the other party within {days} days of the event.",
+    "The {vendor} may not assign or subcontract any of its obligations without the prior written "
+    "consent of the {client}, which shall not be unreasonably withheld.",
+    "The {vendor} shall process personal data only on documented instructions from the {client} "
+    "and shall notify the {client} of any personal data breach within {hours} hours.",
+    "This Agreement renews automatically for successive {renewal}-month terms unless either party "
+    "gives notice of non-renewal at least {notice} days before the end of the current term.",
+]
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(size) -> int:
+    """Bytes for a size such as 5000, "5KB" or "2.5MB"."""
+    if isinstance(size, int):
+        return size
+    match = _SIZE.match(str(size))
+    if not match:
+        raise ValueError(f"Invalid size: {size!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2).upper()])
+
+
+def _clause(rng: random.Random, template: str, parties: dict) -> str:
+    return template.format(
+        **parties,
+        schedule=rng.choice("ABCDE"),
+        days=rng.choice([15, 30, 45, 60, 90]),
+        rate=rng.choice([1, 1.5, 2]),
+        amount=rng.randrange(50, 5000) * 1000,
+        notice=rng.choice([30, 60, 90]),
+        cure=rng.choice([10, 15, 30]),
+        multiple=rng.choice([1, 2, 3]),
+        months=rng.choice([6, 12, 24]),
+        years=rng.choice([2, 3, 5]),
+        insurance=rng.randrange(1, 20) * 1_000_000,
+        jurisdiction=rng.choice(JURISDICTIONS),
+        hours=rng.choice([24, 48, 72]),
+        renewal=rng.choice([12, 24, 36]),
+    )
+
+
+def synthetic_contract(size="5KB", seed: int = 0) -> str:
+    """A contract of roughly `size` bytes (ASCII, so bytes == characters)."""
+    target = parse_size(size)
+    rng = random.Random(seed)
+    vendor, client = rng.sample(PARTIES, 2)
+    parties = {"vendor": "Vendor", "client": "Client"}
+
+    parts = [
+        f"MASTER SERVICES AGREEMENT\n\nThis Master Services Agreement is entered into between "
+        f"{client} (the \"Client\") and {vendor} (the \"Vendor\").\n"
+    ]
+    length = len(parts[0])
+    article = 0
+    while length < target:
+        article += 1
+        heading = f"\nARTICLE {article}. {ARTICLES[(article - 1) % len(ARTICLES)].upper()}\n"
+        parts.append(heading)
+        length += len(heading)
+        for section in range(1, rng.randint(3, 8) + 1):
+            paragraph = f"{article}.{section} " + " ".join(
+                _clause(rng, template, parties) for template in rng.sample(CLAUSES, rng.randint(1, 3))
+            ) + "\n"
+            parts.append(paragraph)
+            length += len(paragraph)
+            if length >= target:
+                break
+    return "".join(parts)[:target]
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def contract_pdf(text: str, lines_per_page: int = 64, width: int = 95) -> bytes:
+    """Lays `text` out on Letter-size pages of Helvetica and returns the PDF bytes."""
+    lines = []
+    for paragraph in text.split("\n"):
+        lines.extend(textwrap.wrap(paragraph, width) or [""])
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page.
+    objects = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_lines in pages:
+        stream = "BT /F1 9 Tf 11 TL 50 750 Td " + " ".join(
+            f"({_pdf_escape(line)}) Tj T*" for line in page_lines
+        ) + " ET"
+        data = zlib.compress(stream.encode("latin-1", "replace"))
+        page_number = len(objects) + 1
+        kids.append(f"{page_number} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_number + 1} 0 R >>".encode("ascii")
+        )
+        objects.append(
+            f"<< /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode("ascii") + data + b"\nendstream"
+        )
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode("ascii")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("ascii")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    return bytes(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes a synthetic contract as text or PDF.")
+    parser.add_argument("size", help="target size, e.g. 5KB or 5MB")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pdf", help="write a PDF to this path")
+    parser.add_argument("--text", help="write the text to this path (default: stdout)")
+    args = parser.parse_args()
+
+    text = synthetic_contract(args.size, args.seed)
+    if args.pdf:
+        with open(args.pdf, "wb") as f:
+            f.write(contract_pdf(text))
+    if args.text:
+        with open(args.text, "w", encoding="utf-8") as f:
+            f.write(text)
+    elif not args.pdf:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Job handlers for contract analysis.
+
+`full_analysis` jobs run the same pipeline as /full-analysis (and, when the
+job has an uploaded PDF, the same extraction as /full-analysis-pdf) on a
+job-queue worker. Progress records the current stage and the agents that
+have finished, and cancellation is checked after every pipeline event.
+`portfolio` jobs run jobs/portfolio.py over a directory or uploaded zip
+archive; a job interrupted by a restart resumes from its output file.
+
+Job calls run at bulk priority, so interactive requests are served first
+when the Gemini quota is tight.
+"""
+import os
+
+from google import genai
+
+from agents.orchestrator import ANALYSIS_AGENTS, run_full_analysis
+from jobs.job_queue import Job, JobCancelled, JobQueue
+from jobs.portfolio import PORTFOLIO_OUTPUT_DIR, resolve_portfolio_source, run_portfolio
+from utils.gemini_client import BULK, request_priority
+from utils.llm_cache import cache_scope
+from utils.pdf_reader import extract_pdf
+
+FULL_ANALYSIS = "full_analysis"
+PORTFOLIO = "portfolio"
+
+
+def full_analysis_job(job: Job, client: genai.Client) -> dict:
+    page_starts = None
+    if job.input_path:
+        job.report(stage="extracting")
+        pdf = extract_pdf(job.input_path)
+        if len(pdf.text.strip()) < 100:
+            raise ValueError("PDF content is too short or unreadable")
+        contract_text, page_starts = pdf.text, pdf.page_starts
+    else:
+        contract_text = job.params["contract_text"]
+
+    job.check_cancelled()
+    job.report(stage="analyzing", completed=[])
+    completed = []
+
+    def on_event(event, data):
+        if event in ANALYSIS_AGENTS:
+            completed.append(event)
+            job.report(completed=completed)
+            if len(completed) == len(ANALYSIS_AGENTS):
+                job.report(stage="recommending")
+        elif event == "recommendation":
+            job.report(stage="finishing")
+        job.check_cancelled()
+
+    with request_priority(BULK), cache_scope(bypass=job.params.get("no_cache", False)) as cache_status:
+        result = run_full_analysis(
+            contract_text,
+            client,
+            page_starts=page_starts,
+            compile_prompts=job.params.get("compile_prompts"),
+            on_event=on_event,
+            document_id=job.params.get("document_id"),
+        )
+    job.report(stage="done")
+    return {**result, "cache": cache_status}
+
+
+def portfolio_job(job: Job, client: genai.Client) -> dict:
+    # Checked again here: queued jobs outlive the request (and config changes).
+    source = job.input_path or resolve_portfolio_source(job.params["source"])
+    output_path = os.path.join(PORTFOLIO_OUTPUT_DIR, f"{job.id}.jsonl")
+    job.report(output=output_path)
+
+    def should_stop():
+        try:
+            job.check_cancelled()
+        except JobCancelled:
+            return True
+        return False
+
+    stats = run_portfolio(
+        source,
+        output_path,
+        client,
+        concurrency=job.params.get("concurrency"),
+        compile_prompts=job.params.get("compile_prompts"),
+        on_progress=lambda progress: job.report(**progress),
+        should_stop=should_stop,
+    )
+    # Contracts already written stay in the output; only new work stops.
+    job.check_cancelled()
+    return {**stats, "output": output_path}
+
+
+def register_analysis_jobs(queue: JobQueue, client: genai.Client) -> None:
+    queue.register(FULL_ANALYSIS, lambda job: full_analysis_job(job, client))
+    queue.register(PORTFOLIO, lambda job: portfolio_job(job, client))
@@ -0,0 +1,279 @@
+"""
+Background job queue for long-running contract analysis.
+
+Submitting a job stores it in a local SQLite database and returns its id at
+once; a fixed pool of JOB_WORKERS threads picks queued jobs up in submission
+order. Handlers report progress while they run, and the final result (or
+error) is written back to the same store, so clients poll for status instead
+of holding an HTTP request open for the whole analysis.
+
+The store survives restarts: jobs that were running when the process stopped
+are queued again on startup (up to JOB_MAX_ATTEMPTS times), and finished jobs
+stay queryable until they are older than JOB_RETENTION_SECONDS.
+
+Cancellation is cooperative: a queued job is cancelled immediately, a
+running job stops at its handler's next `job.check_cancelled()`.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(".cache", "jobs.sqlite3"))
+# Uploaded files are kept here until their job finishes.
+JOBS_UPLOAD_DIR = os.getenv("JOBS_UPLOAD_DIR", os.path.join(".cache", "job_uploads"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised by `Job.check_cancelled()` to unwind a cancelled handler."""
+
+
+class Job:
+    """What a handler sees of its job: parameters, input file and progress hooks."""
+
+    def __init__(self, queue, job_id: str, kind: str, params: dict, input_path: str):
+        self.queue = queue
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.input_path = input_path
+
+    def report(self, **progress) -> None:
+        """Merges `progress` into the job's stored progress."""
+        self.queue._update_progress(self.id, progress)
+
+    def check_cancelled(self) -> None:
+        if self.queue._cancel_requested(self.id):
+            raise JobCancelled(self.id)
+
+
+class JobQueue:
+    """SQLite-backed job store served by a bounded pool of worker threads."""
+
+    def __init__(self, path: str, upload_dir: str, workers: int):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        os.makedirs(upload_dir, exist_ok=True)
+        self.upload_dir = upload_dir
+        self.workers = max(1, workers)
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL,"
+            " params TEXT NOT NULL, input_path TEXT, progress TEXT NOT NULL,"
+            " result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL, started REAL, finished REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs(status, created)")
+        self._db.commit()
+        self._recover()
+
+    def _recover(self) -> None:
+        """Requeues jobs interrupted by a restart and drops expired ones."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ?"
+                " WHERE status = ? AND attempts >= ?",
+                (FAILED, now, "Interrupted too many times", RUNNING, JOB_MAX_ATTEMPTS),
+            )
+            self._db.execute(
+                "UPDATE jobs SET status = ?, started = NULL WHERE status = ?", (QUEUED, RUNNING)
+            )
+            expired = self._db.execute(
+                "SELECT id, input_path FROM jobs WHERE finished < ?",
+                (now - JOB_RETENTION_SECONDS,),
+            ).fetchall()
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id, _ in expired])
+            self._db.commit()
+        for _, input_path in expired:
+            self._remove_input(input_path)
+
+    def register(self, kind: str, handler) -> None:
+        """Registers `handler(job) -> dict` for jobs of the given kind."""
+        self._handlers[kind] = handler
+
+    def start(self) -> None:
+        """Starts the worker threads (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def upload_path(self, suffix: str = "") -> str:
+        """A new path in the upload directory for a job's input file."""
+        return os.path.join(self.upload_dir, f"{uuid.uuid4().hex}{suffix}")
+
+    def submit(self, kind: str, params: dict = None, input_path: str = None) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        job_id = uuid.uuid4().hex
+        with self._wakeup:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, status, params, input_path, progress, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params or {}), input_path, "{}", time.time()),
+            )
+            self._db.commit()
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str):
+        """Returns the job's status record (without its result), or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, status, progress, error, attempts, created, started, finished"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, status, progress, error, attempts, created, started, finished = row
+        record = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "progress": json.loads(progress),
+            "error": error,
+            "attempts": attempts,
+            "created": created,
+            "started": started,
+            "finished": finished,
+        }
+        if status == QUEUED:
+            record["queue_position"] = self._queue_position(created)
+        return record
+
+    def result(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def cancel(self, job_id: str):
+        """Cancels a queued job, or asks a running one to stop. Returns its new status."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT status, input_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            status, input_path = row
+            if status == QUEUED:
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, finished = ? WHERE id = ?", (CANCELLED, now, job_id)
+                )
+                status = CANCELLED
+            elif status == RUNNING:
+                self._db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            self._db.commit()
+        if status == CANCELLED:
+            self._remove_input(input_path)
+        return status
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return {"workers": self.workers, **{status: counts.get(status, 0) for status in (QUEUED, RUNNING, *FINISHED)}}
+
+    def _queue_position(self, created: float) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created < ?", (QUEUED, created)
+            ).fetchone()[0]
+
+    def _claim(self):
+        """Marks the oldest queued job running and returns it (call with the lock held)."""
+        row = self._db.execute(
+            "SELECT id, kind, params, input_path FROM jobs WHERE status = ? ORDER BY created LIMIT 1",
+            (QUEUED,),
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, params, input_path = row
+        self._db.execute(
+            "UPDATE jobs SET status = ?, started = ?, attempts = attempts + 1 WHERE id = ?",
+            (RUNNING, time.time(), job_id),
+        )
+        self._db.commit()
+        return Job(self, job_id, kind, json.loads(params), input_path)
+
+    def _work(self) -> None:
+        while True:
+            with self._wakeup:
+                job = self._claim()
+                while job is None:
+                    self._wakeup.wait()
+                    job = self._claim()
+            self._run(job)
+
+    def _run(self, job: Job) -> None:
+        status, result, error = DONE, None, None
+        try:
+            job.check_cancelled()
+            result = self._handlers[job.kind](job)
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            print(f"🔥 ERROR IN job {job.id} ({job.kind}):", repr(e))
+            status, error = FAILED, str(e)
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job.id),
+            )
+            self._db.commit()
+        self._remove_input(job.input_path)
+
+    def _update_progress(self, job_id: str, progress: dict) -> None:
+        with self._lock:
+            row = self._db.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            merged = {**json.loads(row[0]), **progress} if row else progress
+            self._db.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(merged), job_id))
+            self._db.commit()
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _remove_input(self, input_path: str) -> None:
+        if not input_path:
+            return
+        if os.path.isdir(input_path):
+            shutil.rmtree(input_path, ignore_errors=True)
+        elif os.path.exists(input_path):
+            os.remove(input_path)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Returns the process-wide job queue (workers start on first `start()`)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(JOBS_DB_PATH, JOBS_UPLOAD_DIR, JOB_WORKERS)
+    return _queue
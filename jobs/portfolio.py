@@ -0,0 +1,275 @@
+"""
+Portfolio bulk analysis.
+
+Runs the full-analysis pipeline (extraction, agents, recommendation and RAG
+ingestion) over every PDF / text contract in a directory or zip archive:
+
+- Files are streamed: at most `concurrency` contracts are analyzed at once
+  and only a few more are queued, so a 5,000-file portfolio never sits in
+  memory as a whole
+- Each finished contract is appended to a JSON Lines file right away
+- The output file is the checkpoint: on a re-run, files already analyzed
+  successfully are skipped (failed ones are retried and their new line
+  supersedes the old one), so an interrupted run resumes where it stopped
+- Progress reports include throughput in contracts per minute
+
+Usage:
+    python -m jobs.portfolio CONTRACTS_DIR_OR_ZIP --output results.jsonl
+
+Over HTTP (POST /jobs/portfolio) the source must lie under PORTFOLIO_ROOT and
+results always go to PORTFOLIO_OUTPUT_DIR/<job id>.jsonl; only the CLI
+takes arbitrary paths.
+"""
+import argparse
+import contextvars
+import json
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from agents.orchestrator import run_full_analysis
+from utils.gemini_client import BULK, request_priority
+from utils.llm_cache import cache_scope
+from utils.pdf_reader import extract_pdf
+
+PORTFOLIO_CONCURRENCY = int(os.getenv("PORTFOLIO_CONCURRENCY", "4"))
+PORTFOLIO_OUTPUT_DIR = os.getenv("PORTFOLIO_OUTPUT_DIR", os.path.join(".cache", "portfolio"))
+# Directory that server-side portfolio jobs may read from; unset disables them.
+PORTFOLIO_ROOT = os.getenv("PORTFOLIO_ROOT")
+
+CONTRACT_EXTENSIONS = (".pdf", ".txt", ".md")
+
+
+def resolve_portfolio_source(source: str) -> str:
+    """
+    Resolves a server-side portfolio path (relative to PORTFOLIO_ROOT, or
+    absolute) and returns it. Raises PermissionError when it lies outside
+    PORTFOLIO_ROOT or no root is configured, FileNotFoundError when missing.
+    """
+    if not PORTFOLIO_ROOT:
+        raise PermissionError("Server-side portfolios are disabled (PORTFOLIO_ROOT is not set)")
+    root = os.path.realpath(PORTFOLIO_ROOT)
+    # realpath resolves ".." and symlinks, so the prefix check sees the real target.
+    path = os.path.realpath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root:
+        raise PermissionError("Source must be inside the portfolio root")
+    if not os.path.exists(path):
+        raise FileNotFoundError("Source directory or archive not found")
+    return path
+
+
+def _is_contract(name: str) -> bool:
+    base = os.path.basename(name)
+    return name.lower().endswith(CONTRACT_EXTENSIONS) and not base.startswith(".") and "__MACOSX" not in name
+
+
+def iter_contract_files(source: str):
+    """Yields the relative names of contract files in a directory or zip archive, sorted."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        yield from sorted(name for name in names if _is_contract(name))
+        return
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.relpath(os.path.join(root, name), source)
+            if _is_contract(path):
+                yield path
+
+
+def _load_path(path: str):
+    if path.lower().endswith(".pdf"):
+        pdf = extract_pdf(path)
+        return pdf.text, pdf.page_starts
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read(), None
+
+
+def load_contract(source: str, name: str):
+    """Returns (text, page_starts) for one file of the portfolio."""
+    if not zipfile.is_zipfile(source):
+        return _load_path(os.path.join(source, name))
+    with zipfile.ZipFile(source) as archive:
+        data = archive.read(name)
+    if not name.lower().endswith(".pdf"):
+        return data.decode("utf-8", errors="replace"), None
+    # pdfplumber (and the extraction process pool) need a real file.
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+        temp_file.write(data)
+        temp_path = temp_file.name
+    try:
+        return _load_path(temp_path)
+    finally:
+        os.unlink(temp_path)
+
+
+def _completed_files(output_path: str) -> set:
+    """Files analyzed successfully in the output; drops a partial last line left by a crash."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    valid_bytes = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record["status"] == "ok":
+                    done.add(record["file"])
+            except (ValueError, KeyError):
+                break
+            valid_bytes += len(line)
+    if valid_bytes < os.path.getsize(output_path):
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done
+
+
+def _analyze_file(source: str, name: str, client, compile_prompts) -> dict:
+    started = time.perf_counter()
+    record = {"file": name}
+    try:
+        text, page_starts = load_contract(source, name)
+        if len(text.strip()) < 100:
+            raise ValueError("Content is too short or unreadable")
+        with cache_scope() as cache_status:
+            result = run_full_analysis(
+                text, client, page_starts=page_starts, compile_prompts=compile_prompts
+            )
+        record.update(status="ok", contract_id=result.get("contract_id"), result=result, cache=cache_status)
+    except Exception as e:
+        print(f"🔥 ERROR IN portfolio file {name}:", repr(e))
+        record.update(status="error", error=str(e))
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def run_portfolio(
+    source: str,
+    output_path: str,
+    client,
+    concurrency: int = None,
+    compile_prompts: bool = None,
+    on_progress=None,
+    should_stop=None,
+) -> dict:
+    """
+    Analyzes every contract in `source` and appends one JSON line per file
+    to `output_path`, skipping files a previous run already analyzed.
+
+    Args:
+        source: Directory or zip archive of .pdf / .txt / .md contracts
+        output_path: JSON Lines file for results (and resume checkpoint)
+        client: The Gemini AI client instance
+        concurrency: Contracts analyzed at once (defaults to PORTFOLIO_CONCURRENCY)
+        compile_prompts: Passed through to run_full_analysis
+        on_progress: Optional callback(stats) after every finished contract
+        should_stop: Optional callable; when it returns True no new contracts
+            are started and the run returns after the in-flight ones finish
+
+    Returns:
+        Stats with total, skipped, processed, failed, elapsed_seconds and
+        contracts_per_minute (for this run)
+    """
+    concurrency = max(1, concurrency or PORTFOLIO_CONCURRENCY)
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    done = _completed_files(output_path)
+    names = list(iter_contract_files(source))
+    todo = [name for name in names if name not in done]
+    pending = iter(todo)
+    stats = {
+        "total": len(names),
+        "skipped": len(names) - len(todo),
+        "processed": 0,
+        "failed": 0,
+        "elapsed_seconds": 0.0,
+        "contracts_per_minute": 0.0,
+        "stopped": False,
+    }
+    started = time.perf_counter()
+
+    with request_priority(BULK), open(output_path, "a", encoding="utf-8") as output, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = set()
+
+        def fill():
+            # Keep a small queue ahead of the workers rather than submitting
+            # the whole portfolio at once.
+            while len(in_flight) < concurrency * 2:
+                if should_stop is not None and should_stop():
+                    stats["stopped"] = True
+                    return
+                name = next(pending, None)
+                if name is None:
+                    return
+                in_flight.add(pool.submit(
+                    contextvars.copy_context().run, _analyze_file, source, name, client, compile_prompts
+                ))
+
+        fill()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                in_flight.discard(future)
+                record = future.result()
+                # One writer thread, one line per contract, flushed at once so
+                # a crash loses at most the contracts still in flight.
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                stats["processed"] += 1
+                stats["failed"] += record["status"] != "ok"
+                elapsed = time.perf_counter() - started
+                stats["elapsed_seconds"] = round(elapsed, 3)
+                stats["contracts_per_minute"] = round(stats["processed"] * 60 / elapsed, 2)
+                if on_progress is not None:
+                    on_progress(dict(stats))
+            if not stats["stopped"]:
+                fill()
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run full analysis over a portfolio of contracts.")
+    parser.add_argument("source", help="Directory or zip archive of PDF / text contracts")
+    parser.add_argument("--output", required=True, help="JSON Lines results file (re-runs resume from it)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Contracts analyzed at once")
+    parser.add_argument("--compile-prompts", action="store_true", help="Use RAG-compiled prompts")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from google import genai
+
+    from utils.gemini_client import RateLimitedClient
+
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise SystemExit("GEMINI_API_KEY not found in .env")
+    client = RateLimitedClient(genai.Client(api_key=api_key))
+
+    def report(stats):
+        print(
+            f"{stats['processed'] + stats['skipped']}/{stats['total']} done"
+            f" ({stats['failed']} failed), {stats['contracts_per_minute']} contracts/min",
+            flush=True,
+        )
+
+    stats = run_portfolio(
+        args.source,
+        args.output,
+        client,
+        concurrency=args.concurrency,
+        compile_prompts=args.compile_prompts or None,
+        on_progress=report,
+    )
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,272 @@
-from typing import Dict, List
+"""
+Bounded conversation memory for /rag/ask-with-memory.
 
-# In-memory session store
-SESSION_MEMORY: Dict[str, Dict] = {}
+Sessions live in a store with LRU and TTL eviction: the in-process store
+(default) evicts least recently used sessions once their estimated size
+passes SESSION_MEMORY_MAX_MB, and the optional SQLite store
+(SESSION_BACKEND=sqlite) keeps sessions on disk across restarts with the
+same limits.
 
+Each session is compact: a profile dict, the recent turns as
+(role, text) tuples, and a rolling summary. Once the recent turns exceed
+MEMORY_RECENT_TOKENS, the oldest turns are condensed into one-line extracts
+in the summary, and the summary itself is capped at MEMORY_SUMMARY_TOKENS by
+dropping its oldest lines. A session, and the memory context built from it,
+therefore never grows past a fixed size however long the conversation runs.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
 
-def init_session(session_id: str):
-    if session_id not in SESSION_MEMORY:
-        SESSION_MEMORY[session_id] = {
-            "user_profile": {},
-            "conversation": [],
+from rag.text_splitter import CHARS_PER_TOKEN, estimate_tokens
+from utils.metrics import stage
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(".cache", "sessions.sqlite3"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_MEMORY_MAX_MB = float(os.getenv("SESSION_MEMORY_MAX_MB", "64"))
+MEMORY_RECENT_TOKENS = int(os.getenv("MEMORY_RECENT_TOKENS", "600"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+# Each condensed turn keeps roughly its first sentence, up to this many tokens.
+MEMORY_EXTRACT_TOKENS = 40
+
+# Rough per-session bookkeeping cost on top of the text itself.
+_SESSION_OVERHEAD_BYTES = 512
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+class Session:
+    __slots__ = ("profile", "turns", "summary")
+
+    def __init__(self, profile=None, turns=None, summary=None):
+        self.profile: Dict[str, str] = profile or {}
+        self.turns: List[Tuple[str, str]] = turns or []
+        self.summary: List[str] = summary or []
+
+    def size(self) -> int:
+        return _SESSION_OVERHEAD_BYTES + sum(
+            len(text) for text in (
+                *self.profile.keys(), *self.profile.values(),
+                *(text for _, text in self.turns), *self.summary,
+            )
+        )
+
+    def to_json(self) -> str:
+        return json.dumps({"p": self.profile, "t": self.turns, "s": self.summary})
+
+    @classmethod
+    def from_json(cls, data: str) -> "Session":
+        fields = json.loads(data)
+        return cls(fields["p"], [tuple(turn) for turn in fields["t"]], fields["s"])
+
+
+def _extract(role: str, text: str) -> str:
+    """One-line extract of a turn: its first sentence, trimmed to budget."""
+    text = " ".join(text.split())
+    first = _SENTENCE_END.split(text, maxsplit=1)[0]
+    limit = MEMORY_EXTRACT_TOKENS * CHARS_PER_TOKEN
+    if len(first) > limit:
+        first = first[:limit].rsplit(" ", 1)[0] + "..."
+    return f"{role}: {first}"
+
+
+def _compact(session: Session) -> None:
+    """Rolls the oldest turns into the summary until the recent ones fit the budget."""
+    recent_tokens = sum(estimate_tokens(text) for _, text in session.turns)
+    # Always keep the latest turn verbatim, even if it alone is over budget.
+    while len(session.turns) > 1 and recent_tokens > MEMORY_RECENT_TOKENS:
+        role, text = session.turns.pop(0)
+        recent_tokens -= estimate_tokens(text)
+        session.summary.append(_extract(role, text))
+
+    summary_tokens = sum(estimate_tokens(line) + 1 for line in session.summary)
+    while session.summary and summary_tokens > MEMORY_SUMMARY_TOKENS:
+        summary_tokens -= estimate_tokens(session.summary.pop(0)) + 1
+
+
+class MemorySessionStore:
+    """In-process LRU of sessions, bounded by total estimated size and idle TTL."""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()  # id -> (session, size, last_used)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def update(self, session_id: str, fn):
+        """Applies fn(session) atomically, creating the session if needed."""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None and now - entry[2] <= self.ttl_seconds:
+                session = entry[0]
+            else:
+                session = Session()
+            if entry is not None:
+                self._bytes -= entry[1]
+            result = fn(session)
+            size = session.size()
+            self._sessions[session_id] = (session, size, now)
+            self._bytes += size
+            self._evict(now)
+            return result
+
+    def _evict(self, now: float) -> None:
+        # Oldest entries come first; expired or over-budget ones are dropped,
+        # but never the session that was just used.
+        while len(self._sessions) > 1:
+            session_id, (_, size, last_used) = next(iter(self._sessions.items()))
+            if self._bytes <= self.max_bytes and now - last_used <= self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+class SQLiteSessionStore:
+    """Sessions persisted in SQLite, with the same TTL and size-based LRU eviction."""
+
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: float):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, data TEXT NOT NULL, size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_lru ON sessions(last_used)")
+        self._db.commit()
+        self.evictions = 0
+
+    def update(self, session_id: str, fn):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, last_used FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is not None and now - row[1] <= self.ttl_seconds:
+                session = Session.from_json(row[0])
+            else:
+                session = Session()
+            result = fn(session)
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, size, last_used) VALUES (?, ?, ?, ?)",
+                (session_id, session.to_json(), session.size(), now),
+            )
+            self._evict(now)
+            self._db.commit()
+            return result
+
+    def _evict(self, now: float) -> None:
+        expired = self._db.execute(
+            "DELETE FROM sessions WHERE last_used < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self.evictions += max(0, expired)
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM sessions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale = []
+        for session_id, size in self._db.execute(
+            "SELECT id, size FROM sessions WHERE last_used < ? ORDER BY last_used", (now,)
+        ):
+            stale.append((session_id,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM sessions WHERE id = ?", stale)
+        self.evictions += len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
         }
 
 
+def _create_store():
+    max_bytes = int(SESSION_MEMORY_MAX_MB * 1024 * 1024)
+    if SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(SESSION_DB_PATH, max_bytes, SESSION_TTL_SECONDS)
+    if SESSION_BACKEND != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND!r}")
+    return MemorySessionStore(max_bytes, SESSION_TTL_SECONDS)
+
+
+store = _create_store()
+
+
+def _update(session_id: str, fn):
+    with stage("session_memory", backend=SESSION_BACKEND):
+        return store.update(session_id, fn)
+
+
+def init_session(session_id: str):
+    # Creates the session if it doesn't exist (or has expired).
+    _update(session_id, lambda session: None)
+
+
 def set_user_profile(session_id: str, key: str, value: str):
-    SESSION_MEMORY[session_id]["user_profile"][key] = value
+    def update(session):
+        session.profile[key] = value
+
+    _update(session_id, update)
 
 
 def add_message(session_id: str, role: str, content: str):
-    SESSION_MEMORY[session_id]["conversation"].append(
-        {
-            "role": role,
-            "content": content,
-        }
-    )
+    def update(session):
+        session.turns.append((role, content))
+        _compact(session)
+
+    _update(session_id, update)
 
 
 def get_memory_context(session_id: str) -> str:
-    profile = SESSION_MEMORY[session_id]["user_profile"]
-    convo: List[Dict] = SESSION_MEMORY[session_id]["conversation"][-6:]  # last 6 messages
+    def render(session):
+        profile_text = "\n".join([f"{k}: {v}" for k, v in session.profile.items()])
+        summary_text = "\n".join(session.summary)
+        convo_text = "\n".join([f"{role}: {content}" for role, content in session.turns])
+        return profile_text, summary_text, convo_text
 
-    profile_text = "\n".join([f"{k}: {v}" for k, v in profile.items()])
-    convo_text = "\n".join([f"{m['role']}: {m['content']}" for m in convo])
+    profile_text, summary_text, convo_text = _update(session_id, render)
+    summary_block = f"""
+Earlier Conversation (condensed):
+{summary_text}
+""" if summary_text else ""
 
     return f"""
 User Profile:
 {profile_text}
-
+{summary_block}
 Recent Conversation:
 {convo_text}
 """
-
-
@@ -0,0 +1,153 @@
+"""
+Version records for incrementally re-ingested contracts.
+
+For every ingested contract id this store keeps the chunk list of the
+latest version (content hash, offsets, page and text) and the latest
+analysis result per agent. When a revised version is ingested under the
+same id, rag_qa diffs the new chunks against these rows so only changed
+chunks are embedded, and the orchestrator re-runs only the agents whose
+clauses changed (see agents/incremental.py).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CONTRACT_VERSIONS = os.getenv("CONTRACT_VERSIONS", "1") != "0"
+CONTRACT_VERSIONS_PATH = os.getenv(
+    "CONTRACT_VERSIONS_PATH", os.path.join(".cache", "contract_versions.sqlite3")
+)
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class VersionStore:
+    """SQLite tables of per-contract chunk rows and agent results."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS versions ("
+            " contract_id TEXT PRIMARY KEY, version INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " contract_id TEXT NOT NULL, chunk_index INTEGER NOT NULL, hash TEXT NOT NULL,"
+            " start INTEGER NOT NULL, end INTEGER NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL,"
+            " PRIMARY KEY (contract_id, chunk_index)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " contract_id TEXT NOT NULL, agent TEXT NOT NULL, version INTEGER NOT NULL,"
+            " result TEXT NOT NULL, PRIMARY KEY (contract_id, agent)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def version(self, contract_id: str) -> int:
+        """Latest version number (0 when the contract was never ingested)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version FROM versions WHERE contract_id = ?", (contract_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def chunk_rows(self, contract_id: str) -> list:
+        """(hash, start, end, page) per stored chunk, in chunk order."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT hash, start, end, page FROM chunks WHERE contract_id = ? ORDER BY chunk_index",
+                (contract_id,),
+            ).fetchall()
+
+    def chunk_texts(self, contract_id: str, indexes) -> list:
+        indexes = list(indexes)
+        texts = []
+        with self._lock:
+            for start in range(0, len(indexes), 500):
+                batch = indexes[start:start + 500]
+                texts.extend(text for (text,) in self._db.execute(
+                    f"SELECT text FROM chunks WHERE contract_id = ?"
+                    f" AND chunk_index IN ({','.join('?' * len(batch))})",
+                    (contract_id, *batch),
+                ))
+        return texts
+
+    def write_chunks(self, contract_id: str, rows) -> None:
+        """Stores (chunk_index, hash, start, end, page, text) rows, replacing those indexes."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (contract_id, chunk_index, hash, start, end, page, text)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(contract_id, *row) for row in rows],
+            )
+            self._db.commit()
+
+    def finish_version(self, contract_id: str, chunk_count: int, changed: bool = True) -> int:
+        """
+        Drops chunk rows past `chunk_count` and, when the chunks `changed`,
+        bumps the version; returns it.
+        """
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM chunks WHERE contract_id = ? AND chunk_index >= ?", (contract_id, chunk_count)
+            )
+            self._db.execute(
+                "INSERT INTO versions (contract_id, version, updated) VALUES (?, 1, ?)"
+                " ON CONFLICT(contract_id) DO UPDATE SET"
+                " version = version + ?, updated = excluded.updated",
+                (contract_id, time.time(), int(changed)),
+            )
+            self._db.commit()
+            return self._db.execute(
+                "SELECT version FROM versions WHERE contract_id = ?", (contract_id,)
+            ).fetchone()[0]
+
+    def results(self, contract_id: str) -> dict:
+        """Latest stored (version, result) per agent key; the version is the one it was computed for."""
+        with self._lock:
+            return {
+                agent: (version, json.loads(result))
+                for agent, version, result in self._db.execute(
+                    "SELECT agent, version, result FROM results WHERE contract_id = ?", (contract_id,)
+                )
+            }
+
+    def save_results(self, contract_id: str, version: int, results: dict, failed=()) -> None:
+        """
+        Stores results as valid for `version` (fresh ones, and reused ones
+        re-stamped); `failed` agents lose their stale result so they re-run
+        next time.
+        """
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO results (contract_id, agent, version, result) VALUES (?, ?, ?, ?)",
+                [(contract_id, agent, version, json.dumps(result)) for agent, result in results.items()],
+            )
+            self._db.executemany(
+                "DELETE FROM results WHERE contract_id = ? AND agent = ?",
+                [(contract_id, agent) for agent in failed],
+            )
+            self._db.commit()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_version_store():
+    """Returns the process-wide version store, or None when CONTRACT_VERSIONS=0."""
+    global _store
+    if not CONTRACT_VERSIONS:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = VersionStore(CONTRACT_VERSIONS_PATH)
+    return _store
@@ -0,0 +1,177 @@
+"""
+Persistent, content-addressed cache for chunk embeddings.
+
+Vectors are keyed by a hash of (model name, normalized chunk text), so the
+same clause embedded for two different contracts is only paid for once.
+
+On disk the cache is two files:
+- vectors.f32: a flat float32 matrix, one fixed-size row per cached vector
+- index.sqlite3: key -> row slot, plus a last-used timestamp for LRU eviction
+
+The cache is bounded by EMBEDDING_CACHE_MAX_MB. Once full, new vectors
+overwrite the rows of the least recently used entries.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") != "0"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(".cache", "embeddings"))
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+_FLOAT_SIZE = array("f").itemsize
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes unicode and collapses whitespace so trivially different
+    copies of the same clause share one cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Disk-backed LRU cache mapping cache keys to float32 vectors."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(
+            os.path.join(directory, "index.sqlite3"), check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+
+        vectors_path = os.path.join(directory, "vectors.f32")
+        if not os.path.exists(vectors_path):
+            open(vectors_path, "wb").close()
+        self._vectors = open(vectors_path, "r+b")
+
+    @property
+    def max_entries(self) -> int:
+        if not self.dim:
+            return 0
+        return max(1, int(self.max_bytes // (self.dim * _FLOAT_SIZE)))
+
+    def _read_row(self, slot: int) -> list:
+        self._vectors.seek(slot * self.dim * _FLOAT_SIZE)
+        row = array("f")
+        row.frombytes(self._vectors.read(self.dim * _FLOAT_SIZE))
+        return row.tolist()
+
+    def _write_row(self, slot: int, vector) -> None:
+        self._vectors.seek(slot * self.dim * _FLOAT_SIZE)
+        self._vectors.write(array("f", vector).tobytes())
+
+    def get_many(self, keys) -> dict:
+        """Returns {key: vector} for the keys present in the cache."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            if self.dim:
+                for start in range(0, len(keys), 500):
+                    batch = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, slot in rows:
+                        found[key] = self._read_row(slot)
+
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._db.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: dict) -> None:
+        """Stores {key: vector}, evicting least recently used entries when full."""
+        if not items:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(next(iter(items.values())))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (str(self.dim),)
+                )
+
+            # Vectors of a different size (e.g. a new model) can't share rows.
+            items = {k: v for k, v in items.items() if len(v) == self.dim}
+
+            now = time.time()
+            count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            for key, vector in items.items():
+                if self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+                    continue
+
+                if count < self.max_entries:
+                    slot = count
+                    count += 1
+                else:
+                    # Reuse the row of the least recently used entry.
+                    old_key, slot = self._db.execute(
+                        "SELECT key, slot FROM entries ORDER BY last_used LIMIT 1"
+                    ).fetchone()
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+
+                self._write_row(slot, vector)
+                self._db.execute(
+                    "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    (key, slot, now),
+                )
+
+            self._vectors.flush()
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "dim": self.dim,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Returns the process-wide cache, or None when EMBEDDING_CACHE=0."""
+    global _cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(
+                EMBEDDING_CACHE_DIR, int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+            )
+    return _cache
@@ -1,22 +1,227 @@
 """
 Utility to embed texts into a vector space using Gemini embeddings.
+
+Texts are sent in multi-text batches, with a bounded number of batches in
+flight at once. Results are reassembled in input order, and a batch that
+fails is retried on its own without re-sending the others.
+
+Vectors are looked up in the persistent embedding cache first (see
+rag/embedding_cache.py), so only texts never seen before hit the API.
+
+`aembed_texts` does the same over the async client, for the async request
+path.
 """
+import asyncio
+import contextvars
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.genai.errors import ClientError, ServerError
+
+from rag.embedding_cache import cache_key, get_embedding_cache
+from utils.metrics import inc, stage
+
+# Use the current Gemini embedding model.
+# NOTE: older models like `models/embedding-gecko-001` are deprecated.
+EMBEDDING_MODEL = "gemini-embedding-001"
 
+# The batch embed endpoint accepts at most 100 texts per request.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
 
-def embed_texts(client, texts):
-    embeddings = []
 
-    for text in texts:
-        # Use the current Gemini embedding model.
-        # NOTE: older models like `models/embedding-gecko-001` are deprecated.
-        response = client.models.embed_content(
-            model="gemini-embedding-001",
-            contents=text,
+def _embeddings(response, batch):
+    # `EmbedContentResponse` exposes one embedding per input text,
+    # in the same order as `contents`.
+    embeddings = [e.values for e in response.embeddings]
+    if len(embeddings) != len(batch):
+        raise ValueError(
+            f"Expected {len(batch)} embeddings, got {len(embeddings)}"
         )
+    return embeddings
+
+
+def _retry_delay(attempt: int) -> float:
+    # Exponential backoff with jitter before retrying a batch.
+    return min(2 ** attempt, 30) * (0.5 + random.random() / 2)
+
+
+def _embed_batch(client, batch, max_retries):
+    attempt = 0
+    while True:
+        try:
+            response = client.models.embed_content(
+                model=EMBEDDING_MODEL,
+                contents=batch,
+            )
+            return _embeddings(response, batch)
+        except (ClientError, ServerError):
+            # API errors are retried (429s and 5xx with backoff) by the shared
+            # rate-limited client; retrying here would multiply the attempts.
+            raise
+        except Exception:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+        # Retry this batch only.
+        time.sleep(_retry_delay(attempt))
 
-        # `EmbedContentResponse` exposes embeddings on `response.embeddings`.
-        # We request a single text at a time, so take the first embedding.
-        embedding_vector = response.embeddings[0].values
-        embeddings.append(embedding_vector)
+
+def _embed_uncached(client, texts, batch_size, max_in_flight, max_retries):
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    # A single batch (e.g. a RAG query) doesn't need a thread pool.
+    if len(batches) == 1:
+        return _embed_batch(client, batches[0], max_retries)
+
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, len(batches))) as pool:
+        # `map` yields results in submission order, which keeps the output
+        # aligned with `texts` regardless of which batch finishes first.
+        # Batches run in a copy of the caller's context so its request
+        # priority (see utils/gemini_client.py) applies to them too.
+        context = contextvars.copy_context()
+        results = pool.map(
+            lambda batch: context.copy().run(_embed_batch, client, batch, max_retries), batches
+        )
+        embeddings = []
+        for batch_embeddings in results:
+            embeddings.extend(batch_embeddings)
 
     return embeddings
+
+
+def embed_texts(
+    client,
+    texts,
+    batch_size: int = None,
+    max_in_flight: int = None,
+    max_retries: int = None,
+):
+    """
+    Embeds texts with batched, parallel `embed_content` requests.
+
+    Args:
+        client: The Gemini AI client instance
+        texts: List of strings to embed
+        batch_size: Texts per request (defaults to EMBED_BATCH_SIZE)
+        max_in_flight: Batches sent concurrently (defaults to EMBED_MAX_IN_FLIGHT)
+        max_retries: Retries per failed batch (defaults to EMBED_MAX_RETRIES)
+
+    Returns:
+        List of embedding vectors, one per input text, in input order
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+
+    batch_size = max(1, batch_size or EMBED_BATCH_SIZE)
+    max_in_flight = max(1, max_in_flight or EMBED_MAX_IN_FLIGHT)
+    max_retries = EMBED_MAX_RETRIES if max_retries is None else max_retries
+
+    with stage("embedding") as span:
+        span["texts"] = len(texts)
+        return _embed_with_cache(client, texts, batch_size, max_in_flight, max_retries)
+
+
+def _embed_with_cache(client, texts, batch_size, max_in_flight, max_retries):
+    cache = get_embedding_cache()
+    if cache is None:
+        inc("clm_embedding_texts_total", len(texts), cache="disabled")
+        return _embed_uncached(client, texts, batch_size, max_in_flight, max_retries)
+
+    keys = [cache_key(EMBEDDING_MODEL, text) for text in texts]
+    vectors = cache.get_many(keys)
+
+    # Embed each missing text once, even if it repeats within the input.
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors and key not in missing:
+            missing[key] = text
+
+    inc("clm_embedding_texts_total", len(texts) - len(missing), cache="hit")
+    inc("clm_embedding_texts_total", len(missing), cache="miss")
+    if missing:
+        fresh = _embed_uncached(
+            client, list(missing.values()), batch_size, max_in_flight, max_retries
+        )
+        fresh = dict(zip(missing.keys(), fresh))
+        cache.put_many(fresh)
+        vectors.update(fresh)
+
+    return [vectors[key] for key in keys]
+
+
+async def _aembed_batch(client, batch, max_retries):
+    attempt = 0
+    while True:
+        try:
+            response = await client.aio.models.embed_content(
+                model=EMBEDDING_MODEL,
+                contents=batch,
+            )
+            return _embeddings(response, batch)
+        except (ClientError, ServerError):
+            raise
+        except Exception:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+        await asyncio.sleep(_retry_delay(attempt))
+
+
+async def _aembed_uncached(client, texts, batch_size, max_in_flight, max_retries):
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    limit = asyncio.Semaphore(max_in_flight)
+
+    async def run(batch):
+        async with limit:
+            return await _aembed_batch(client, batch, max_retries)
+
+    # gather keeps results in batch order.
+    return [vector for vectors in await asyncio.gather(*(run(b) for b in batches)) for vector in vectors]
+
+
+async def aembed_texts(
+    client,
+    texts,
+    batch_size: int = None,
+    max_in_flight: int = None,
+    max_retries: int = None,
+):
+    """Async embed_texts; cache reads and writes run on a worker thread."""
+    texts = list(texts)
+    if not texts:
+        return []
+
+    batch_size = max(1, batch_size or EMBED_BATCH_SIZE)
+    max_in_flight = max(1, max_in_flight or EMBED_MAX_IN_FLIGHT)
+    max_retries = EMBED_MAX_RETRIES if max_retries is None else max_retries
+
+    with stage("embedding") as span:
+        span["texts"] = len(texts)
+        cache = get_embedding_cache()
+        if cache is None:
+            inc("clm_embedding_texts_total", len(texts), cache="disabled")
+            return await _aembed_uncached(client, texts, batch_size, max_in_flight, max_retries)
+
+        keys = [cache_key(EMBEDDING_MODEL, text) for text in texts]
+        vectors = await asyncio.to_thread(cache.get_many, keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        inc("clm_embedding_texts_total", len(texts) - len(missing), cache="hit")
+        inc("clm_embedding_texts_total", len(missing), cache="miss")
+        if missing:
+            fresh = await _aembed_uncached(
+                client, list(missing.values()), batch_size, max_in_flight, max_retries
+            )
+            fresh = dict(zip(missing.keys(), fresh))
+            await asyncio.to_thread(cache.put_many, fresh)
+            vectors.update(fresh)
+
+        return [vectors[key] for key in keys]
@@ -0,0 +1,106 @@
+"""
+Hybrid retrieval: BM25 (rag/lexical_index.py) plus vector similarity.
+
+Both retrievers return HYBRID_CANDIDATES hits, and the two rankings are
+merged with reciprocal-rank fusion (each hit scores the sum of 1 / (RRF_K +
+rank) over the lists it appears in), so a chunk that ranks well in either
+list surfaces without having to calibrate BM25 scores against distances.
+
+Lexical fast path: when the question names exact terms (numbers such as
+"14.2" or "45", or a quoted phrase) and the best BM25 hit contains all of
+them and most of the question's other terms, the lexical ranking is used
+directly and the query embedding call is skipped.
+"""
+import asyncio
+import os
+import re
+
+from rag.embeddings import aembed_texts, embed_texts
+from rag.lexical_index import STOPWORDS, get_lexical_index, tokenize
+from rag.vector_store import query_chunks
+from utils.metrics import stage
+
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+LEXICAL_FAST_PATH = os.getenv("LEXICAL_FAST_PATH", "1") != "0"
+# Share of the question's terms the top lexical hit must contain.
+LEXICAL_FAST_PATH_COVERAGE = float(os.getenv("LEXICAL_FAST_PATH_COVERAGE", "0.75"))
+
+_QUOTED = re.compile(r"[\"“]([^\"”]+)[\"”]")
+
+
+def reciprocal_rank_fusion(rankings, top_k: int, k: int = RRF_K) -> list:
+    """Merges hit lists (best first) by RRF; each hit's score becomes its fused score."""
+    fused = {}
+    for hits in rankings:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(hit["id"], {**hit, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:top_k]
+
+
+def _exact_terms(question: str):
+    """(quoted phrases, numeric terms) the question asks for literally."""
+    phrases = [p.strip().lower() for p in _QUOTED.findall(question) if p.strip()]
+    numbers = [term for term in tokenize(question) if any(c.isdigit() for c in term)]
+    return phrases, numbers
+
+
+def _is_strong(question: str, hit: dict) -> bool:
+    phrases, numbers = _exact_terms(question)
+    if not phrases and not numbers:
+        return False
+    document = hit["document"].lower()
+    if any(phrase not in document for phrase in phrases):
+        return False
+    document_terms = set(tokenize(document))
+    if any(number not in document_terms for number in numbers):
+        return False
+    terms = set(tokenize(question)) - STOPWORDS
+    covered = sum(term in document_terms for term in terms)
+    return covered >= LEXICAL_FAST_PATH_COVERAGE * len(terms)
+
+
+def hybrid_search(question: str, client, top_k: int = 3, contract_id: str = None):
+    """
+    Retrieves the top_k chunks for a question.
+
+    Returns:
+        (hits, mode) where hits are dicts with id, document, metadata and
+        score, and mode is "lexical" (fast path, no embedding call),
+        "hybrid" (RRF of both lists) or "vector" (no lexical index)
+    """
+    lexical = get_lexical_index()
+    lexical_hits = []
+    if lexical is not None:
+        with stage("lexical_query"):
+            lexical_hits = lexical.search(question, HYBRID_CANDIDATES, contract_id)
+
+    if LEXICAL_FAST_PATH and lexical_hits and _is_strong(question, lexical_hits[0]):
+        return lexical_hits[:top_k], "lexical"
+
+    query_embedding = embed_texts(client, [question])[0]
+    vector_hits = query_chunks(query_embedding, top_k=HYBRID_CANDIDATES, contract_id=contract_id)
+    if lexical is None:
+        return vector_hits[:top_k], "vector"
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], top_k), "hybrid"
+
+
+async def ahybrid_search(question: str, client, top_k: int = 3, contract_id: str = None):
+    """Async hybrid_search; index lookups run on a worker thread."""
+    lexical = get_lexical_index()
+    lexical_hits = []
+    if lexical is not None:
+        with stage("lexical_query"):
+            lexical_hits = await asyncio.to_thread(lexical.search, question, HYBRID_CANDIDATES, contract_id)
+
+    if LEXICAL_FAST_PATH and lexical_hits and _is_strong(question, lexical_hits[0]):
+        return lexical_hits[:top_k], "lexical"
+
+    query_embedding = (await aembed_texts(client, [question]))[0]
+    vector_hits = await asyncio.to_thread(
+        query_chunks, query_embedding, top_k=HYBRID_CANDIDATES, contract_id=contract_id
+    )
+    if lexical is None:
+        return vector_hits[:top_k], "vector"
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], top_k), "hybrid"
@@ -0,0 +1,182 @@
+"""
+Local BM25 inverted index over contract chunks.
+
+Embeddings are good at paraphrase but weak at exact references such as
+"Section 14.2", "Net 45" or a defined term. This index is built next to the
+vector store during ingestion (same chunk ids, documents and metadata) and
+scores chunks with Okapi BM25, so those references are matched literally.
+
+Postings live in SQLite keyed on (term, contract_id, chunk_id), so
+per-contract lookups read only the postings of the query's terms. The
+database is at LEXICAL_INDEX_PATH, or in memory when the vector store is
+(in-memory Chroma): a BM25 hit whose chunk lost its vector in a restart
+would point at nothing.
+
+Terms are lowercased words and numbers; section references such as "14.2"
+stay one term, and long words are truncated to a common prefix so
+"indemnify", "indemnity" and "indemnification" match each other.
+"""
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+LEXICAL_INDEX = os.getenv("LEXICAL_INDEX", "1") != "0"
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(".cache", "lexical_index.sqlite3"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Words longer than this are cut to it: a crude stemmer that is cheap and
+# works well for legal vocabulary.
+_PREFIX_CHARS = 7
+_TOKEN = re.compile(r"\d+(?:\.\d+)+|[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its "
+    "me my of on or our shall should that the their there this to under us was "
+    "we what when where which who will with would you your".split()
+)
+
+
+def _stem(token: str) -> str:
+    if token.isalpha() and len(token) > _PREFIX_CHARS:
+        return token[:_PREFIX_CHARS]
+    return token
+
+
+def tokenize(text: str) -> list:
+    """Index terms of `text`, in order, without stopwords."""
+    return [_stem(t) for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """SQLite-backed BM25 index; its hits have the same shape as vector store hits."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " chunk_id TEXT PRIMARY KEY, contract_id TEXT NOT NULL, chunk_index INTEGER NOT NULL,"
+            " length INTEGER NOT NULL, document TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS docs_contract ON docs(contract_id, chunk_index)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL, contract_id TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, contract_id, chunk_id)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS postings_chunk ON postings(chunk_id)")
+        self._db.commit()
+
+    def upsert(self, ids, documents, metadatas):
+        """Indexes chunks; metadatas must carry contract_id and chunk_index."""
+        with self._lock:
+            for chunk_id, document, meta in zip(ids, documents, metadatas):
+                terms = Counter(tokenize(document))
+                self._db.execute("DELETE FROM postings WHERE chunk_id = ?", (chunk_id,))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO docs"
+                    " (chunk_id, contract_id, chunk_index, length, document, metadata)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (chunk_id, meta["contract_id"], meta["chunk_index"], sum(terms.values()),
+                     document, json.dumps(meta)),
+                )
+                self._db.executemany(
+                    "INSERT INTO postings (term, contract_id, chunk_id, tf) VALUES (?, ?, ?, ?)",
+                    [(term, meta["contract_id"], chunk_id, tf) for term, tf in terms.items()],
+                )
+            self._db.commit()
+
+    def prune(self, contract_id: str, keep: int):
+        """Deletes a contract's chunks with index >= keep."""
+        with self._lock:
+            stale = self._db.execute(
+                "SELECT chunk_id FROM docs WHERE contract_id = ? AND chunk_index >= ?",
+                (contract_id, keep),
+            ).fetchall()
+            self._db.executemany("DELETE FROM postings WHERE chunk_id = ?", stale)
+            self._db.executemany("DELETE FROM docs WHERE chunk_id = ?", stale)
+            self._db.commit()
+
+    def search(self, query: str, top_k: int = 3, contract_id: str = None) -> list:
+        """Returns up to top_k BM25 hits as dicts with id, document, metadata and score."""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        scope = " AND contract_id = ?" if contract_id else ""
+        scope_args = (contract_id,) if contract_id else ()
+        marks = ",".join("?" * len(terms))
+
+        with self._lock:
+            total, avg_length = self._db.execute(
+                f"SELECT COUNT(*), AVG(length) FROM docs WHERE 1 = 1{scope}", scope_args
+            ).fetchone()
+            if not total:
+                return []
+            postings = self._db.execute(
+                f"SELECT term, chunk_id, tf FROM postings WHERE term IN ({marks}){scope}",
+                (*terms, *scope_args),
+            ).fetchall()
+            if not postings:
+                return []
+            chunk_ids = list({chunk_id for _, chunk_id, _ in postings})
+            lengths = {}
+            for start in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[start:start + 500]
+                lengths.update(self._db.execute(
+                    f"SELECT chunk_id, length FROM docs WHERE chunk_id IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall())
+
+        df = Counter(term for term, _, _ in postings)
+        avg_length = avg_length or 1.0
+        scores = Counter()
+        for term, chunk_id, tf in postings:
+            idf = math.log(1 + (total - df[term] + 0.5) / (df[term] + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[chunk_id] / avg_length)
+            scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = scores.most_common(top_k)
+        with self._lock:
+            rows = {
+                row[0]: row[1:]
+                for row in self._db.execute(
+                    f"SELECT chunk_id, document, metadata FROM docs"
+                    f" WHERE chunk_id IN ({','.join('?' * len(best))})",
+                    [chunk_id for chunk_id, _ in best],
+                )
+            }
+        return [
+            {"id": chunk_id, "document": rows[chunk_id][0], "metadata": json.loads(rows[chunk_id][1]), "score": score}
+            for chunk_id, score in best
+            if chunk_id in rows
+        ]
+
+
+_index = None
+_index_lock = threading.Lock()
+_index_path = LEXICAL_INDEX_PATH
+
+
+def keep_in_memory() -> None:
+    """Holds the index in memory instead of at LEXICAL_INDEX_PATH; call before first use."""
+    global _index_path
+    with _index_lock:
+        _index_path = ":memory:"
+
+
+def get_lexical_index():
+    """Returns the process-wide lexical index, or None when LEXICAL_INDEX=0."""
+    global _index
+    if not LEXICAL_INDEX:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = LexicalIndex(_index_path)
+    return _index
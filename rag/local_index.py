@@ -0,0 +1,350 @@
+"""
+Memory-mapped local vector index.
+
+A persistent alternative to ChromaDB for the RAG layer (VECTOR_BACKEND=local).
+Everything lives in one directory:
+- vectors.f32: float32 matrix of L2-normalized embeddings, memory-mapped, so
+  the OS pages rows in on demand instead of loading the corpus into the heap
+- alive.u8: one byte per row, 0 once a row has been deleted; new chunks
+  fill freed rows before the matrix grows, so re-ingesting revised contracts
+  does not grow it forever
+- meta.sqlite3: sidecar table mapping row -> chunk id, document, metadata,
+  contract id and (when trained) coarse cluster
+- index.lock: writers hold it (flock, where available) and re-read the row
+  count and capacity under it, so several server processes can share the
+  directory
+
+Opening an existing index only maps the files and connects to SQLite, so the
+index is ready immediately after a restart.
+
+Top-k is a vectorized NumPy dot product (cosine similarity, since rows are
+normalized). Queries filtered to one contract only touch that contract's
+rows. Unfiltered queries scan the matrix in blocks, or, once `build_ivf()` has
+trained coarse clusters, only the rows in the `nprobe` closest clusters.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process may write to an index directory
+    fcntl = None
+
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+
+# Rows scored per block during a full scan; bounds temporary memory.
+_SCAN_BLOCK_ROWS = 65536
+_INITIAL_CAPACITY = 1024
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    if len(scores) <= k:
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+class LocalVectorIndex:
+    """Persistent vector index backed by a memory-mapped float32 matrix."""
+
+    def __init__(self, directory: str, nprobe: int = LOCAL_INDEX_NPROBE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+
+        self._db = sqlite3.connect(
+            os.path.join(directory, "meta.sqlite3"), check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, contract_id TEXT,"
+            " document TEXT, metadata TEXT, list_id INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_contract ON chunks(contract_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_list ON chunks(list_id)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+        self.dim = None
+        self.capacity = 0
+        self.count = 0
+        self._vectors = None
+        self._alive = None
+        self._refresh()
+
+        centroids_path = os.path.join(directory, "centroids.npy")
+        self.centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+
+    # -------------------------
+    # STORAGE
+    # -------------------------
+
+    def _map_files(self):
+        vectors_path = os.path.join(self.directory, "vectors.f32")
+        alive_path = os.path.join(self.directory, "alive.u8")
+        for path, size in ((vectors_path, self.capacity * self.dim * 4), (alive_path, self.capacity)):
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        self._alive = np.memmap(alive_path, dtype=np.uint8, mode="r+", shape=(self.capacity,))
+
+    def _refresh(self):
+        """Re-reads dim, capacity and row count, which another process may have changed."""
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        self.count = int(meta.get("count", 0))
+        dim = int(meta["dim"]) if "dim" in meta else None
+        capacity = int(meta.get("capacity", 0))
+        if dim and (self._vectors is None or dim != self.dim or capacity != self.capacity):
+            self.dim, self.capacity = dim, capacity
+            self._vectors = self._alive = None
+            self._map_files()
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            if fcntl is None:
+                self._refresh()
+                yield
+                return
+            with open(os.path.join(self.directory, "index.lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _ensure_capacity(self, rows_needed: int):
+        if rows_needed <= self.capacity:
+            return
+        new_capacity = max(_INITIAL_CAPACITY, self.capacity)
+        while new_capacity < rows_needed:
+            new_capacity *= 2
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._alive.flush()
+            self._vectors = self._alive = None
+        self.capacity = new_capacity
+        self._map_files()
+        self._set_meta("capacity", self.capacity)
+
+    def _set_meta(self, name: str, value):
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, str(value))
+        )
+
+    def _assign_lists(self, vectors: np.ndarray):
+        if self.centroids is None:
+            return [None] * len(vectors)
+        return np.argmax(vectors @ self.centroids.T, axis=1).tolist()
+
+    # -------------------------
+    # WRITES
+    # -------------------------
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._write_lock():
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set_meta("dim", self.dim)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dim embeddings, got {vectors.shape[1]}")
+
+            existing = dict(self._db.execute(
+                f"SELECT id, row FROM chunks WHERE id IN ({','.join('?' * len(ids))})", list(ids)
+            ).fetchall())
+            # Rows freed by deletes first, then new rows at the end.
+            free = iter(np.flatnonzero(self._alive[:self.count] == 0).tolist() if self.count else ())
+            rows = []
+            for chunk_id in ids:
+                if chunk_id in existing:
+                    rows.append(existing[chunk_id])
+                else:
+                    row = next(free, None)
+                    if row is None:
+                        row = self.count
+                        self.count += 1
+                    rows.append(row)
+            self._ensure_capacity(self.count)
+
+            rows_arr = np.asarray(rows)
+            self._vectors[rows_arr] = vectors
+            self._alive[rows_arr] = 1
+            lists = self._assign_lists(vectors)
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (row, id, contract_id, document, metadata, list_id)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (row, chunk_id, meta.get("contract_id"), doc, json.dumps(meta), list_id)
+                    for row, chunk_id, doc, meta, list_id in zip(rows, ids, documents, metadatas, lists)
+                ],
+            )
+            self._set_meta("count", self.count)
+            self._vectors.flush()
+            self._alive.flush()
+            self._db.commit()
+
+    def delete(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        with self._write_lock():
+            placeholders = ",".join("?" * len(ids))
+            rows = [r for (r,) in self._db.execute(
+                f"SELECT row FROM chunks WHERE id IN ({placeholders})", ids
+            ).fetchall()]
+            if not rows:
+                return
+            # Freed rows are masked out until an upsert reuses them; trailing
+            # ones are dropped from the count so scans stop short of them.
+            self._alive[np.asarray(rows)] = 0
+            self._alive.flush()
+            alive_rows = np.flatnonzero(self._alive[:self.count])
+            self.count = int(alive_rows[-1]) + 1 if len(alive_rows) else 0
+            self._set_meta("count", self.count)
+            self._db.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", ids)
+            self._db.commit()
+
+    # -------------------------
+    # READS
+    # -------------------------
+
+    def contract_chunks(self, contract_id: str) -> dict:
+        """Returns {chunk id: metadata} for every chunk of a contract."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, metadata FROM chunks WHERE contract_id = ?", (contract_id,)
+            ).fetchall()
+        return {chunk_id: json.loads(meta) for chunk_id, meta in rows}
+
+    def _candidate_rows(self, query: np.ndarray, contract_id: str):
+        """Rows worth scoring, or None to scan the whole matrix."""
+        if contract_id is not None:
+            return [r for (r,) in self._db.execute(
+                "SELECT row FROM chunks WHERE contract_id = ?", (contract_id,)
+            ).fetchall()]
+        if self.centroids is not None:
+            probe = _top_k(self.centroids @ query, self.nprobe).tolist()
+            placeholders = ",".join("?" * len(probe))
+            return [r for (r,) in self._db.execute(
+                f"SELECT row FROM chunks WHERE list_id IN ({placeholders})", probe
+            ).fetchall()]
+        return None
+
+    def query(self, embedding, top_k: int = 3, contract_id: str = None) -> list:
+        """
+        Returns up to top_k hits, best first, as dicts with
+        id, document, metadata and score (cosine similarity).
+        """
+        with self._lock:
+            self._refresh()
+            if not self.count:
+                return []
+            query = _normalize(np.asarray(embedding, dtype=np.float32))
+            candidates = self._candidate_rows(query, contract_id)
+
+            if candidates is not None:
+                if not candidates:
+                    return []
+                rows = np.asarray(sorted(candidates))
+                scores = self._vectors[rows] @ query
+                best = [(int(rows[i]), float(scores[i])) for i in _top_k(scores, top_k)]
+            else:
+                best = []
+                for start in range(0, self.count, _SCAN_BLOCK_ROWS):
+                    end = min(start + _SCAN_BLOCK_ROWS, self.count)
+                    scores = self._vectors[start:end] @ query
+                    scores[self._alive[start:end] == 0] = -np.inf
+                    best.extend((start + int(i), float(scores[i])) for i in _top_k(scores, top_k))
+                best = [b for b in sorted(best, key=lambda b: -b[1])[:top_k] if b[1] != -np.inf]
+
+            if not best:
+                return []
+            placeholders = ",".join("?" * len(best))
+            info = {
+                row: (chunk_id, doc, meta)
+                for row, chunk_id, doc, meta in self._db.execute(
+                    f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({placeholders})",
+                    [row for row, _ in best],
+                ).fetchall()
+            }
+
+        return [
+            {"id": info[row][0], "document": info[row][1], "metadata": json.loads(info[row][2]), "score": score}
+            for row, score in best
+            if row in info
+        ]
+
+    # -------------------------
+    # COARSE CLUSTERS (IVF)
+    # -------------------------
+
+    def build_ivf(self, n_lists: int = None, iterations: int = 10, sample_size: int = 100_000):
+        """
+        Trains `n_lists` coarse clusters with spherical k-means on a sample of
+        the stored vectors and assigns every row to its nearest cluster.
+        Afterwards unfiltered queries only score rows in the `nprobe` nearest
+        clusters.
+        """
+        with self._write_lock():
+            alive_rows = np.flatnonzero(self._alive[:self.count])
+            if not len(alive_rows):
+                return
+            n_lists = n_lists or max(1, int(np.sqrt(len(alive_rows))))
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(alive_rows, min(sample_size, len(alive_rows)), replace=False))
+            sample = np.asarray(self._vectors[sample_rows])
+            n_lists = min(n_lists, len(sample))
+
+            centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                for k in range(n_lists):
+                    members = sample[assignment == k]
+                    if len(members):
+                        centroids[k] = members.mean(axis=0)
+                centroids = _normalize(centroids)
+
+            self.centroids = centroids.astype(np.float32)
+            np.save(os.path.join(self.directory, "centroids.npy"), self.centroids)
+
+            for start in range(0, self.count, _SCAN_BLOCK_ROWS):
+                end = min(start + _SCAN_BLOCK_ROWS, self.count)
+                lists = self._assign_lists(np.asarray(self._vectors[start:end]))
+                self._db.executemany(
+                    "UPDATE chunks SET list_id = ? WHERE row = ?",
+                    [(list_id, start + i) for i, list_id in enumerate(lists)],
+                )
+            self._db.commit()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain a local vector index.")
+    parser.add_argument("directory", help="index directory (LOCAL_INDEX_DIR)")
+    parser.add_argument("--build-ivf", type=int, metavar="LISTS", nargs="?", const=0,
+                        help="train coarse clusters (default: sqrt of the row count)")
+    args = parser.parse_args()
+
+    index = LocalVectorIndex(args.directory)
+    if args.build_ivf is not None:
+        index.build_ivf(args.build_ivf or None)
+    print(f"{index.count} rows, dim={index.dim}, "
+          f"{0 if index.centroids is None else len(index.centroids)} clusters")
@@ -0,0 +1,227 @@
+"""
+Near-duplicate detection of previously analyzed contracts.
+
+Most inbound contracts are the same template with names and amounts
+changed. Each analyzed contract is fingerprinted with a MinHash signature of
+its word shingles (lowercased, numbers masked), and the signatures are
+indexed with locality-sensitive hashing: the signature is cut into bands, and
+two contracts become candidates when any band matches exactly. A lookup
+therefore reads a handful of index rows instead of comparing against every
+stored contract, and only candidates are scored.
+
+A match carries the stored analysis and a sentence-level diff of the
+passages that changed, which the orchestrator uses to reuse results (see
+agents/orchestrator.py). Since shingles mask numbers, a match can differ in
+exactly the values that matter; `material_changes` flags diffs whose
+numbers or names differ, and those never reuse another contract's results.
+"""
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import NamedTuple
+
+import numpy as np
+
+from agents.incremental import split_sentences
+from rag.embedding_cache import normalize_text
+
+NEAR_DUPLICATES = os.getenv("NEAR_DUPLICATES", "1") != "0"
+NEAR_DUPLICATES_PATH = os.getenv(
+    "NEAR_DUPLICATES_PATH", os.path.join(".cache", "near_duplicates.sqlite3")
+)
+# Minimum estimated Jaccard similarity of the shingle sets for a match.
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+SHINGLE_WORDS = 5
+# 16 bands of 8 rows: pairs at the default threshold become candidates
+# about 95% of the time, pairs below 0.5 almost never.
+NUM_BANDS = 16
+BAND_ROWS = 8
+NUM_PERM = NUM_BANDS * BAND_ROWS
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MASK32 = np.uint64(0xFFFFFFFF)
+# Fixed seed: signatures are persisted, so the permutations must not change.
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_DIGITS = re.compile(r"\d+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+_CAPITALIZED = re.compile(r"[A-Z][A-Za-z0-9&'-]+")
+
+
+def shingles(text: str) -> set:
+    """32-bit hashes of the word shingles of `text`, numbers masked."""
+    words = _WORD.findall(_DIGITS.sub("0", normalize_text(text).lower()))
+    if len(words) < SHINGLE_WORDS:
+        words = words + [""] * (SHINGLE_WORDS - len(words))
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of the text's shingles."""
+    hashes = np.fromiter(shingles(text), dtype=np.uint64)
+    # a, b and the hashes are below 2**32, so a * h + b cannot overflow.
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _PRIME & _MASK32
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def _band_keys(signature: np.ndarray) -> list:
+    """(band, bucket) pairs; the bucket is a 64-bit hash of the band's rows."""
+    keys = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * BAND_ROWS:(band + 1) * BAND_ROWS].tobytes()
+        digest = hashlib.blake2b(rows, digest_size=8).digest()
+        keys.append((band, int.from_bytes(digest, "little", signed=True)))
+    return keys
+
+
+def changed_passages(old_text: str, new_text: str) -> list:
+    """Sentence-level diff: one {op, before, after} entry per changed run."""
+    old = split_sentences(old_text)
+    new = split_sentences(new_text)
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    return [
+        {"op": op, "before": " ".join(old[i1:i2]), "after": " ".join(new[j1:j2])}
+        for op, i1, i2, j1, j2 in matcher.get_opcodes()
+        if op != "equal"
+    ]
+
+
+def _names(text: str) -> set:
+    """Capitalized words that don't start a sentence: party and product names, defined terms."""
+    return {
+        word
+        for sentence in split_sentences(text)
+        for word in _CAPITALIZED.findall(sentence.split(" ", 1)[1] if " " in sentence else "")
+    }
+
+
+def material_changes(old_text: str, new_text: str, changes: list) -> bool:
+    """
+    True when the changed passages state different numbers (amounts, days,
+    percentages) or name parties / terms the other contract doesn't mention.
+    """
+    before = Counter(n for change in changes for n in _NUMBER.findall(change["before"]))
+    after = Counter(n for change in changes for n in _NUMBER.findall(change["after"]))
+    if before != after:
+        return True
+    added = set().union(*(_names(change["after"]) for change in changes)) - _names(old_text)
+    removed = set().union(*(_names(change["before"]) for change in changes)) - _names(new_text)
+    return bool(added or removed)
+
+
+class NearDuplicate(NamedTuple):
+    contract_id: str
+    similarity: float
+    text: str
+    results: dict
+
+
+class NearDuplicateIndex:
+    """SQLite store of signatures, LSH band buckets and stored analyses."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS contracts ("
+            " contract_id TEXT PRIMARY KEY, signature BLOB NOT NULL, text BLOB NOT NULL,"
+            " results TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS bands ("
+            " band INTEGER NOT NULL, bucket INTEGER NOT NULL, contract_id TEXT NOT NULL,"
+            " PRIMARY KEY (band, bucket, contract_id)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS bands_contract ON bands(contract_id)")
+        self._db.commit()
+
+    def add(self, contract_id: str, contract_text: str, results: dict) -> None:
+        """Stores (or replaces) a contract's signature and analysis."""
+        signature = minhash(contract_text)
+        with self._lock:
+            self._db.execute("DELETE FROM bands WHERE contract_id = ?", (contract_id,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO contracts (contract_id, signature, text, results, created)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (contract_id, signature.tobytes(), zlib.compress(contract_text.encode("utf-8")),
+                 json.dumps(results), time.time()),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO bands (band, bucket, contract_id) VALUES (?, ?, ?)",
+                [(band, bucket, contract_id) for band, bucket in _band_keys(signature)],
+            )
+            self._db.commit()
+
+    def find(self, contract_text: str, threshold: float = None):
+        """Returns the most similar stored contract as a NearDuplicate, or None."""
+        threshold = NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+        signature = minhash(contract_text)
+        keys = _band_keys(signature)
+        with self._lock:
+            candidates = [
+                contract_id for (contract_id,) in self._db.execute(
+                    f"SELECT DISTINCT contract_id FROM bands WHERE (band, bucket) IN"
+                    f" (VALUES {', '.join(['(?, ?)'] * len(keys))})",
+                    [value for key in keys for value in key],
+                )
+            ]
+            if not candidates:
+                return None
+            signatures = self._db.execute(
+                f"SELECT contract_id, signature FROM contracts"
+                f" WHERE contract_id IN ({','.join('?' * len(candidates))})",
+                candidates,
+            ).fetchall()
+
+        best_id, best_similarity = None, threshold
+        for contract_id, stored in signatures:
+            similarity = float(np.mean(np.frombuffer(stored, dtype=np.uint32) == signature))
+            if similarity >= best_similarity:
+                best_id, best_similarity = contract_id, similarity
+        if best_id is None:
+            return None
+
+        with self._lock:
+            text, results = self._db.execute(
+                "SELECT text, results FROM contracts WHERE contract_id = ?", (best_id,)
+            ).fetchone()
+        return NearDuplicate(
+            best_id, round(best_similarity, 4), zlib.decompress(text).decode("utf-8"), json.loads(results)
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            (contracts,) = self._db.execute("SELECT COUNT(*) FROM contracts").fetchone()
+        return {"contracts": contracts, "threshold": NEAR_DUPLICATE_THRESHOLD}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index():
+    """Returns the process-wide near-duplicate index, or None when NEAR_DUPLICATES=0."""
+    global _index
+    if not NEAR_DUPLICATES:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex(NEAR_DUPLICATES_PATH)
+    return _index
@@ -1,7 +1,16 @@
 #converts text into chunks, embeds them, and stores them in ChromaDB and then asks Gemini a question about the contract
-from rag.text_splitter import split_text
-from rag.embeddings import embed_texts
-from rag.vector_store import store_chunks, retrieve_chunks
+import asyncio
+import hashlib
+from itertools import islice
+from typing import List, NamedTuple
+
+from rag.text_splitter import iter_chunks
+from rag.embeddings import embed_texts, EMBED_BATCH_SIZE, EMBED_MAX_IN_FLIGHT
+from rag.vector_store import upsert_chunks, prune_chunks, stored_chunk_count
+from rag.hybrid_search import ahybrid_search, hybrid_search
+from rag.contract_versions import chunk_hash, get_version_store
+from utils.llm_cache import record_llm_call
+from utils.metrics import stage, timed_iter
 from memory.session_memory import (
     init_session,
     set_user_profile,
@@ -10,20 +19,207 @@ from memory.session_memory import (
 )
 from memory.profile_extractor import extract_profile_info
 
-def ingest_contract(contract_text: str, client):
+def contract_id_for(contract_text: str) -> str:
+    """Stable ID derived from the contract text, used when the caller gives none."""
+    return hashlib.sha256(contract_text.encode("utf-8")).hexdigest()[:16]
+
+
+def _chunk_metadata(chunk, with_pages: bool) -> dict:
+    meta = {"start": chunk.start, "end": chunk.end}
+    if with_pages:
+        meta["page"] = chunk.page
+    return meta
+
+
+def _store_chunk_stream(chunks, client, contract_id: str, with_pages: bool) -> int:
+    # Enough chunks per group to keep every embedding batch slot busy.
+    group_size = EMBED_BATCH_SIZE * EMBED_MAX_IN_FLIGHT
+    versions = get_version_store()
+    previous = versions.chunk_rows(contract_id) if versions is not None else []
+    rows = []
+    stored = 0
+    while True:
+        group = list(islice(chunks, group_size))
+        if not group:
+            break
+        texts = [chunk.text for chunk in group]
+        metadatas = [_chunk_metadata(chunk, with_pages) for chunk in group]
+
+        embeddings = embed_texts(client, texts)
+        upsert_chunks(texts, embeddings, contract_id, metadatas, start_index=stored)
+        if versions is not None:
+            rows.extend((chunk_hash(chunk.text), chunk.start, chunk.end, chunk.page) for chunk in group)
+            versions.write_chunks(contract_id, [
+                (stored + i, chunk_hash(chunk.text), chunk.start, chunk.end, chunk.page, chunk.text)
+                for i, chunk in enumerate(group)
+            ])
+        stored += len(group)
+
+    prune_chunks(contract_id, stored)
+    if versions is not None:
+        # Re-storing the same text (e.g. into an emptied vector store) is not a new version.
+        versions.finish_version(contract_id, stored, changed=rows != [tuple(row) for row in previous])
+    return stored
+
+
+class IngestPlan(NamedTuple):
+    """Chunk-level diff of a contract version against the stored one."""
+
+    contract_id: str
+    chunks: list  # every chunk of the new version
+    changed: List[int]  # chunk indexes whose text or position changed
+    added_texts: List[str]  # chunk texts the previous version didn't have
+    removed_texts: List[str]  # chunk texts the new version no longer has
+    previous_count: int
+    previous_version: int  # version the diff is taken against
+    with_pages: bool
+
+
+def plan_ingest(contract_text: str, contract_id: str, page_starts=None):
+    """
+    Diffs a contract against the version stored under `contract_id`.
+
+    Cheap (no API calls), so callers can decide what to re-run before
+    ingesting. Returns None when there is no stored version to diff against.
+    """
+    versions = get_version_store()
+    if versions is None:
+        return None
+    previous = versions.chunk_rows(contract_id)
+    if not previous:
+        return None
+    # The version rows are on disk, but the default Chroma backend lives in
+    # memory: after a restart they describe chunks the vector store no
+    # longer has. Only diff against rows the backend still holds.
+    if stored_chunk_count(contract_id) != len(previous):
+        return None
+
+    chunks = list(timed_iter("splitting", iter_chunks(contract_text, page_starts=page_starts)))
+    rows = [(chunk_hash(chunk.text), chunk.start, chunk.end, chunk.page) for chunk in chunks]
+    previous_hashes = {row[0] for row in previous}
+    current_hashes = {row[0] for row in rows}
+    changed = [i for i, row in enumerate(rows) if i >= len(previous) or tuple(previous[i]) != row]
+    removed = [i for i, row in enumerate(previous) if row[0] not in current_hashes]
+    return IngestPlan(
+        contract_id=contract_id,
+        chunks=chunks,
+        changed=changed,
+        added_texts=[chunk.text for chunk, row in zip(chunks, rows) if row[0] not in previous_hashes],
+        removed_texts=versions.chunk_texts(contract_id, removed),
+        previous_count=len(previous),
+        previous_version=versions.version(contract_id),
+        with_pages=bool(page_starts),
+    )
+
+
+def apply_ingest(plan: IngestPlan, client) -> dict:
+    """
+    Brings the vector store in line with a planned version: upserts only the
+    changed chunks (unchanged text that merely moved is served from the
+    embedding cache) and deletes chunks past the new end.
+
+    Returns a report of what was reused.
+    """
+    versions = get_version_store()
+    changed = [plan.chunks[i] for i in plan.changed]
+    added = set(plan.added_texts)
+
+    # Changed positions are contiguous runs; upsert each run at its offset.
+    run_start = 0
+    while run_start < len(plan.changed):
+        run_end = run_start
+        while run_end + 1 < len(plan.changed) and plan.changed[run_end + 1] == plan.changed[run_end] + 1:
+            run_end += 1
+        run = changed[run_start:run_end + 1]
+        texts = [chunk.text for chunk in run]
+        upsert_chunks(
+            texts,
+            embed_texts(client, texts),
+            plan.contract_id,
+            [_chunk_metadata(chunk, plan.with_pages) for chunk in run],
+            start_index=plan.changed[run_start],
+        )
+        run_start = run_end + 1
+
+    prune_chunks(plan.contract_id, len(plan.chunks))
+    versions.write_chunks(plan.contract_id, [
+        (i, chunk_hash(chunk.text), chunk.start, chunk.end, chunk.page, chunk.text)
+        for i, chunk in zip(plan.changed, changed)
+    ])
+    version = versions.finish_version(
+        plan.contract_id,
+        len(plan.chunks),
+        changed=bool(plan.changed) or plan.previous_count != len(plan.chunks),
+    )
+
+    embedded = sum(chunk.text in added for chunk in changed)
+    return {
+        "contract_id": plan.contract_id,
+        "version": version,
+        "chunks": len(plan.chunks),
+        "unchanged": len(plan.chunks) - len(changed),
+        "moved": len(changed) - embedded,
+        "embedded": embedded,
+        "deleted": max(0, plan.previous_count - len(plan.chunks)),
+    }
+
+
+def ingest_contract_version(contract_text: str, client, contract_id: str = None, page_starts=None) -> dict:
+    """
+    Ingests a contract, incrementally when a version is already stored under
+    `contract_id` (derived from the text when not given).
+
+    Returns a report with the contract id, version number and chunk counts
+    (unchanged / moved / embedded / deleted).
+    """
+    contract_id = contract_id or contract_id_for(contract_text)
+    plan = plan_ingest(contract_text, contract_id, page_starts)
+    if plan is not None:
+        return apply_ingest(plan, client)
+
+    chunks = timed_iter("splitting", iter_chunks(contract_text, page_starts=page_starts))
+    stored = _store_chunk_stream(chunks, client, contract_id, with_pages=bool(page_starts))
+    versions = get_version_store()
+    return {
+        "contract_id": contract_id,
+        "version": versions.version(contract_id) if versions is not None else 1,
+        "chunks": stored,
+        "unchanged": 0,
+        "moved": 0,
+        "embedded": stored,
+        "deleted": 0,
+    }
+
+
+def ingest_contract(contract_text: str, client, contract_id: str = None, page_starts=None) -> str:
     """
-    Splits contract, embeds chunks, and stores them in ChromaDB
+    Splits contract, embeds chunks, and stores them in ChromaDB under
+    `contract_id` (derived from the text when not given).
+
+    Chunks are streamed from the splitter and embedded and stored a group at
+    a time, so memory stays flat for very long contracts. `page_starts`
+    optionally lists the character offset at which each page begins, so every
+    chunk can record the page it starts on. A revised version ingested under
+    an existing id only re-embeds its changed chunks.
+
+    Returns the contract id.
     """
-    chunks = split_text(contract_text)
-    embeddings = embed_texts(client, chunks)
-    store_chunks(chunks, embeddings)
+    return ingest_contract_version(contract_text, client, contract_id, page_starts)["contract_id"]
 
 
-def ask_contract(question: str, client, session_id: str):
+def ingest_pages(pages, client, contract_id: str) -> str:
     """
-    Retrieves relevant contract chunks, uses conversational memory,
-    and asks Gemini.
+    Ingests a contract from an iterable of page texts (e.g. PageText.text
+    from utils.pdf_reader.iter_pdf_pages), chunking and embedding each group
+    of chunks while later pages are still being extracted.
+
+    Returns the contract id.
     """
+    _store_chunk_stream(iter_chunks(pages), client, contract_id, with_pages=True)
+    return contract_id
+
+
+def _record_question(session_id: str, question: str) -> None:
     # Initialize / update session
     init_session(session_id)
 
@@ -35,15 +231,10 @@ def ask_contract(question: str, client, session_id: str):
     # Log user message
     add_message(session_id, "user", question)
 
-    # RAG retrieval
-    query_embedding = embed_texts(client, [question])[0]
-    relevant_chunks = retrieve_chunks(query_embedding)
-    context = "\n\n".join(relevant_chunks)
-
-    # Build memory context for the model
-    memory_context = get_memory_context(session_id)
 
-    prompt = f"""
+def _qa_prompt(question: str, hits, memory_context: str) -> str:
+    context = "\n\n".join(hit["document"] for hit in hits)
+    return f"""
 You are a contract analysis assistant.
 
 Use the contract context AND conversation memory to answer.
@@ -58,12 +249,47 @@ Question:
 {question}
 """
 
-    response = client.models.generate_content(
-        model="models/gemini-2.5-flash",
-        contents=prompt,
-    )
+
+def ask_contract(question: str, client, session_id: str, contract_id: str = None):
+    """
+    Retrieves relevant contract chunks (from one contract when `contract_id`
+    is given), uses conversational memory, and asks Gemini.
+    """
+    _record_question(session_id, question)
+
+    # RAG retrieval: BM25 + vector hits fused, or BM25 alone when the
+    # question names exact terms it matches (no embedding call then)
+    hits, _ = hybrid_search(question, client, top_k=3, contract_id=contract_id)
+
+    # Build memory context for the model
+    prompt = _qa_prompt(question, hits, get_memory_context(session_id))
+
+    with stage("llm", agent="rag_qa"):
+        response = client.models.generate_content(
+            model="models/gemini-2.5-flash",
+            contents=prompt,
+        )
 
     answer = response.text
+    record_llm_call("rag_qa", "uncached", prompt, answer, getattr(response, "usage_metadata", None))
     add_message(session_id, "assistant", answer)
     return answer
 
+
+async def aask_contract(question: str, client, session_id: str, contract_id: str = None):
+    """Async ask_contract; session memory and index lookups run on a worker thread."""
+    await asyncio.to_thread(_record_question, session_id, question)
+    hits, _ = await ahybrid_search(question, client, top_k=3, contract_id=contract_id)
+    memory_context = await asyncio.to_thread(get_memory_context, session_id)
+    prompt = _qa_prompt(question, hits, memory_context)
+
+    with stage("llm", agent="rag_qa"):
+        response = await client.aio.models.generate_content(
+            model="models/gemini-2.5-flash",
+            contents=prompt,
+        )
+
+    answer = response.text
+    record_llm_call("rag_qa", "uncached", prompt, answer, getattr(response, "usage_metadata", None))
+    await asyncio.to_thread(add_message, session_id, "assistant", answer)
+    return answer
@@ -1,12 +1,175 @@
-# used to split text into chunks
-def split_text(text: str, chunk_size=500, overlap=50):
-    chunks = []
-    start = 0
+"""
+Clause-aware, streaming text splitter.
+
+Chunks are packed from whole sentences up to a token budget. A chunk is
+closed early at a section heading (e.g. "14.2 Indemnification",
+"ARTICLE IV", "Section 3") once it is at least half full, so clauses are not
+cut mid-sentence and sections tend to start their own chunk. Sentences that
+alone exceed the budget are split at whitespace.
+
+`iter_chunks` is a generator over either one string or an iterable of page
+strings (e.g. straight from the PDF reader), so a 10 MB contract never
+needs its chunk list materialized. Every chunk carries its character offsets
+in the full text (pages joined with "\n") and the page it starts on.
+"""
+import os
+import re
+from bisect import bisect_right
+from typing import Iterable, Iterator, NamedTuple, Union
+
+# Rough English average; good enough for budgeting without a tokenizer.
+CHARS_PER_TOKEN = 4
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# A chunk this full is closed at the next section heading.
+_HEADING_MIN_FILL = 0.5
+
+_HEADING = (
+    r"(?:(?i:section|article|clause|schedule|exhibit|annex|appendix)\s+[\dIVXLC]+"
+    r"|\d+(?:\.\d+)*[.)]?[ \t]+[A-Z]"
+    r"|[A-Z][A-Z0-9 ,&'\-]{3,}[ \t]*$)"
+)
+# Boundaries between units: before a heading line (strong), after a blank
+# line, or after sentence-ending punctuation.
+_BOUNDARY = re.compile(
+    rf"(?P<heading>\n(?:[ \t]*\n)*[ \t]*(?={_HEADING}))"
+    r"|\n[ \t]*\n\s*"
+    r"|(?<=[.!?;])[\"')\]]*\s+",
+    re.M,
+)
 
+
+class Chunk(NamedTuple):
+    text: str
+    start: int  # offset of the first character in the full text
+    end: int  # offset one past the last character
+    page: int  # 1-based page the chunk starts on
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _iter_units(text: str, max_chars: int):
+    """Yields (offset, unit_text, starts_section) spans that tile `text`."""
+    start = 0
+    strong = False
+    matches = _BOUNDARY.finditer(text)
     while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - overlap
+        match = next(matches, None)
+        if match is None:
+            end, next_strong = len(text), False
+        elif match.group("heading") is not None:
+            end, next_strong = match.end(), True
+        else:
+            end, next_strong = match.end(), False
+        if end <= start:
+            strong = strong or next_strong
+            continue
+
+        unit = text[start:end]
+        if len(unit) <= max_chars:
+            yield start, unit, strong
+        else:
+            # Oversized sentence: cut at the last whitespace within budget.
+            offset = 0
+            while offset < len(unit):
+                piece = unit[offset:offset + max_chars]
+                if offset + max_chars < len(unit):
+                    cut = max(piece.rfind(" "), piece.rfind("\n"))
+                    if cut > max_chars // 2:
+                        piece = piece[:cut + 1]
+                yield start + offset, piece, strong and offset == 0
+                offset += len(piece)
+        start, strong = end, next_strong
 
-    return chunks
+
+def _make_chunk(units, page_of) -> Chunk:
+    raw = "".join(text for _, text, _ in units)
+    text = raw.strip()
+    start = units[0][0] + (len(raw) - len(raw.lstrip()))
+    return Chunk(text, start, start + len(text), page_of(start))
+
+
+def iter_chunks(
+    source: Union[str, Iterable[str]],
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    page_starts=None,
+) -> Iterator[Chunk]:
+    """
+    Yields clause-aware chunks of at most `max_tokens` (estimated) each.
+
+    Args:
+        source: The full text, or an iterable of page texts
+        max_tokens: Token budget per chunk
+        overlap_tokens: Trailing sentences (up to this many tokens) repeated at
+            the start of the next chunk, unless that chunk starts a new section
+        page_starts: For a string source, the offset where each page begins
+
+    Yields:
+        Chunk(text, start, end, page) tuples in document order
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    overlap_chars = max(0, overlap_tokens * CHARS_PER_TOKEN)
+
+    if isinstance(source, str):
+        pages = [source]
+        starts = list(page_starts) if page_starts else [0]
+    else:
+        pages = source
+        starts = []
+
+    def page_of(offset: int) -> int:
+        return max(1, bisect_right(starts, offset))
+
+    current = []
+    current_len = 0
+    base = 0
+    for page_index, page in enumerate(pages):
+        if page_index and not isinstance(source, str):
+            # Pages are joined with a newline; it belongs to the previous page.
+            if current:
+                offset, text, strong = current[-1]
+                current[-1] = (offset, text + "\n", strong)
+                current_len += 1
+            base += 1
+        if not isinstance(source, str):
+            starts.append(base)
+
+        for offset, unit, strong in _iter_units(page, max_chars):
+            has_content = current_len and any(t.strip() for _, t, _ in current)
+            starts_section = strong and current_len >= max_chars * _HEADING_MIN_FILL
+            if has_content and (current_len + len(unit) > max_chars or starts_section):
+                yield _make_chunk(current, page_of)
+                carried = []
+                carried_len = 0
+                if not strong:
+                    for previous in reversed(current):
+                        if carried_len + len(previous[1]) > overlap_chars:
+                            break
+                        carried.insert(0, previous)
+                        carried_len += len(previous[1])
+                # Never carry so much that the next unit cannot fit.
+                while carried and carried_len + len(unit) > max_chars:
+                    carried_len -= len(carried.pop(0)[1])
+                current, current_len = carried, carried_len
+            current.append((base + offset, unit, strong))
+            current_len += len(unit)
+        base += len(page)
+
+    if current and any(t.strip() for _, t, _ in current):
+        yield _make_chunk(current, page_of)
+
+
+def split_text(text: str, chunk_size=500, overlap=50):
+    """Character-budget wrapper around iter_chunks, returning chunk texts."""
+    return [
+        chunk.text
+        for chunk in iter_chunks(
+            text,
+            max_tokens=max(1, chunk_size // CHARS_PER_TOKEN),
+            overlap_tokens=overlap // CHARS_PER_TOKEN,
+        )
+    ]
@@ -1,22 +1,146 @@
-import chromadb
+import os
 
-client = chromadb.Client()
+from rag.lexical_index import get_lexical_index, keep_in_memory
+from utils.metrics import stage
 
-collection = client.get_or_create_collection(
-    name="contracts"
-)
+# "chroma" (default) or "local" for the memory-mapped index in rag/local_index.py
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# When set, Chroma persists to this directory instead of living in memory.
+CHROMA_PATH = os.getenv("CHROMA_PATH")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(".cache", "vector_index"))
 
-def store_chunks(chunks, embeddings):
-    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-        collection.add(
-            documents=[chunk],
-            embeddings=[embedding],
-            ids=[f"chunk_{i}"]
+# Chunks per upsert call; one request per batch instead of one per chunk.
+UPSERT_BATCH_SIZE = int(os.getenv("VECTOR_UPSERT_BATCH_SIZE", "500"))
+
+
+class ChromaBackend:
+    """Adapts a Chroma collection to the interface LocalVectorIndex exposes."""
+
+    def __init__(self, path: str = None):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=path) if path else chromadb.Client()
+        self.collection = self.client.get_or_create_collection(name="contracts")
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        self.collection.upsert(
+            ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas
         )
 
-def retrieve_chunks(query_embedding, top_k=3):
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k
+    def delete(self, ids):
+        ids = list(ids)
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def contract_chunks(self, contract_id: str) -> dict:
+        result = self.collection.get(where={"contract_id": contract_id}, include=["metadatas"])
+        return dict(zip(result["ids"], result["metadatas"]))
+
+    def query(self, embedding, top_k: int = 3, contract_id: str = None) -> list:
+        results = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=top_k,
+            where={"contract_id": contract_id} if contract_id else None,
+        )
+        return [
+            {"id": chunk_id, "document": doc, "metadata": meta, "score": -distance}
+            for chunk_id, doc, meta, distance in zip(
+                results["ids"][0],
+                results["documents"][0],
+                results["metadatas"][0],
+                results["distances"][0],
+            )
+        ]
+
+
+def _create_backend():
+    if VECTOR_BACKEND == "local":
+        from rag.local_index import LocalVectorIndex
+
+        return LocalVectorIndex(LOCAL_INDEX_DIR)
+    if VECTOR_BACKEND != "chroma":
+        raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND!r}")
+    return ChromaBackend(CHROMA_PATH)
+
+
+backend = _create_backend()
+if VECTOR_BACKEND == "chroma" and not CHROMA_PATH:
+    # The BM25 index has to start empty whenever the vectors do.
+    keep_in_memory()
+
+
+def chunk_id(contract_id: str, index: int) -> str:
+    return f"{contract_id}:{index}"
+
+
+def upsert_chunks(chunks, embeddings, contract_id: str = "default", metadatas=None, start_index: int = 0):
+    """
+    Upserts chunks in batches under per-contract IDs.
+
+    Each chunk gets the ID "<contract_id>:<index>" (indexes counting from
+    `start_index`) and metadata with the contract id and chunk index, merged
+    with the optional per-chunk `metadatas` (e.g. character offsets and page).
+    Chunks are added to the lexical index under the same IDs.
+    """
+    chunks = list(chunks)
+    embeddings = list(embeddings)
+    metadatas = list(metadatas) if metadatas is not None else [{}] * len(chunks)
+
+    for start in range(0, len(chunks), UPSERT_BATCH_SIZE):
+        end = min(start + UPSERT_BATCH_SIZE, len(chunks))
+        indexes = range(start_index + start, start_index + end)
+        ids = [chunk_id(contract_id, i) for i in indexes]
+        batch_metadatas = [
+            {**meta, "contract_id": contract_id, "chunk_index": i}
+            for i, meta in zip(indexes, metadatas[start:end])
+        ]
+        with stage("vector_add", backend=VECTOR_BACKEND) as span:
+            span["chunks"] = len(ids)
+            backend.upsert(
+                ids=ids,
+                documents=chunks[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=batch_metadatas,
+            )
+        # Keep the BM25 index (rag/lexical_index.py) in step with the vectors.
+        lexical = get_lexical_index()
+        if lexical is not None:
+            with stage("lexical_add"):
+                lexical.upsert(ids, chunks[start:end], batch_metadatas)
+
+
+def prune_chunks(contract_id: str, keep: int):
+    """Deletes a contract's chunks with index >= keep (left over from a longer version)."""
+    backend.delete(
+        cid for cid, meta in backend.contract_chunks(contract_id).items()
+        if meta["chunk_index"] >= keep
     )
-    return results["documents"][0]
+    lexical = get_lexical_index()
+    if lexical is not None:
+        lexical.prune(contract_id, keep)
+
+
+def stored_chunk_count(contract_id: str) -> int:
+    """Number of chunks the vector backend holds for a contract."""
+    return len(backend.contract_chunks(contract_id))
+
+
+def store_chunks(chunks, embeddings, contract_id: str = "default", metadatas=None):
+    """
+    Stores the complete chunk list of a contract: upserts every chunk and
+    removes any left over from a longer earlier version.
+    """
+    chunks = list(chunks)
+    upsert_chunks(chunks, embeddings, contract_id, metadatas)
+    prune_chunks(contract_id, len(chunks))
+
+
+def query_chunks(query_embedding, top_k=3, contract_id: str = None) -> list:
+    """Returns the top_k hits as dicts with id, document, metadata and score."""
+    with stage("vector_query", backend=VECTOR_BACKEND):
+        return backend.query(query_embedding, top_k=top_k, contract_id=contract_id)
+
+
+def retrieve_chunks(query_embedding, top_k=3, contract_id: str = None):
+    """Returns the top_k closest chunks, restricted to one contract if given."""
+    return [hit["document"] for hit in query_chunks(query_embedding, top_k, contract_id)]
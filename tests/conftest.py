@@ -0,0 +1,52 @@
+"""
+Shared fixtures: every test runs against FakeGeminiClient (benchmarks/
+fake_gemini.py) with zero latency, and every on-disk cache and index points
+into a temporary directory.
+
+Settings are read from the environment at import time, so they are set here,
+before any repo module is imported.
+"""
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+_CACHE_DIR = tempfile.mkdtemp(prefix="clm-tests-")
+os.environ.update({
+    "GEMINI_API_KEY": "test",
+    "GEMINI_RPM": "0",
+    "GEMINI_EMBED_RPM": "0",
+    # Tests count model calls, so the response cache is off unless a test turns it on.
+    "LLM_CACHE": "0",
+    "LLM_CACHE_PATH": os.path.join(_CACHE_DIR, "llm_responses.sqlite3"),
+    "EMBEDDING_CACHE_DIR": os.path.join(_CACHE_DIR, "embeddings"),
+    "CONTRACT_VERSIONS_PATH": os.path.join(_CACHE_DIR, "contract_versions.sqlite3"),
+    "LEXICAL_INDEX_PATH": os.path.join(_CACHE_DIR, "lexical_index.sqlite3"),
+    "NEAR_DUPLICATES": "0",
+    "NEAR_DUPLICATES_PATH": os.path.join(_CACHE_DIR, "near_duplicates.sqlite3"),
+    "PDF_TEXT_CACHE_DIR": os.path.join(_CACHE_DIR, "pdf_text"),
+    "OCR_CACHE_DIR": os.path.join(_CACHE_DIR, "ocr"),
+    "LOCAL_INDEX_DIR": os.path.join(_CACHE_DIR, "vector_index"),
+    "SESSION_DB_PATH": os.path.join(_CACHE_DIR, "sessions.sqlite3"),
+    "JOBS_DB_PATH": os.path.join(_CACHE_DIR, "jobs.sqlite3"),
+    "JOBS_UPLOAD_DIR": os.path.join(_CACHE_DIR, "job_uploads"),
+    "PORTFOLIO_OUTPUT_DIR": os.path.join(_CACHE_DIR, "portfolio"),
+})
+
+import pytest  # noqa: E402
+
+from benchmarks.fake_gemini import FakeGeminiClient  # noqa: E402
+from utils.gemini_client import RateLimitedClient  # noqa: E402
+
+
+@pytest.fixture
+def fake_gemini():
+    return FakeGeminiClient(latency=0, embed_latency=0)
+
+
+@pytest.fixture
+def client(fake_gemini):
+    return RateLimitedClient(fake_gemini)
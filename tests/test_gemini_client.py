@@ -0,0 +1,28 @@
+import pytest
+from google.genai.errors import ClientError
+
+from benchmarks.fake_gemini import FakeGeminiClient
+from utils.gemini_client import RateLimitedClient
+
+
+def test_long_retry_hint_fails_fast_without_pausing():
+    fake = FakeGeminiClient(latency=0, error_rate=1.0, retry_after=6 * 3600)
+    client = RateLimitedClient(fake, max_retries=3)
+
+    with pytest.raises(ClientError):
+        client.models.generate_content(model="m", contents="hello")
+
+    assert fake.models.generate_calls == 1
+    assert client.stats()["retries"] == 0
+    assert client.stats()["generate"]["paused_for"] == 0
+
+
+def test_short_retry_hint_pauses_and_retries():
+    fake = FakeGeminiClient(latency=0, error_rate=1.0, retry_after=0.01)
+    client = RateLimitedClient(fake, max_retries=2)
+
+    with pytest.raises(ClientError):
+        client.models.generate_content(model="m", contents="hello")
+
+    assert fake.models.generate_calls == 3
+    assert client.stats()["retries"] == 2
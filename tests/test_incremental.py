@@ -0,0 +1,58 @@
+import uuid
+
+from agents.orchestrator import ANALYSIS_AGENTS, run_full_analysis
+from benchmarks.synthetic import synthetic_contract
+from rag.rag_qa import ingest_contract_version
+
+# One sentence more, with no number in it, so the diff stays narrow.
+EXTRA = "\nThe Vendor shall keep records of its work in a safe place."
+
+
+def _document_id():
+    return f"doc-{uuid.uuid4().hex[:8]}"
+
+
+def test_unchanged_version_reuses_every_result(client, fake_gemini):
+    text = synthetic_contract("5KB", 1)
+    document_id = _document_id()
+    run_full_analysis(text, client, document_id=document_id)
+
+    calls = fake_gemini.models.generate_calls
+    result = run_full_analysis(text, client, document_id=document_id)
+
+    assert result["incremental"]["reused_agents"] == list(ANALYSIS_AGENTS)
+    assert result["incremental"]["recommendation_reused"]
+    assert fake_gemini.models.generate_calls == calls
+
+
+def test_reused_results_carry_over_to_the_new_version(client, fake_gemini):
+    text = synthetic_contract("5KB", 2)
+    document_id = _document_id()
+    run_full_analysis(text, client, document_id=document_id)
+    revised = run_full_analysis(text + EXTRA, client, document_id=document_id)
+    assert revised["incremental"]["version"] == 2
+
+    # Results reused for version 2 were re-stamped, so a third run reuses all of them.
+    calls = fake_gemini.models.generate_calls
+    result = run_full_analysis(text + EXTRA, client, document_id=document_id)
+    assert result["incremental"]["reused_agents"] == list(ANALYSIS_AGENTS)
+    assert fake_gemini.models.generate_calls == calls
+
+
+def test_reingest_between_analyses_invalidates_stored_results(client, fake_gemini):
+    text = synthetic_contract("5KB", 3)
+    document_id = _document_id()
+    first = run_full_analysis(text, client, document_id=document_id)
+
+    # Re-ingested outside an analysis (e.g. /rag/ingest): the version moves
+    # on, but the stored results still describe the first text.
+    report = ingest_contract_version(text + EXTRA, client, document_id)
+    assert report["version"] == 2
+
+    calls = fake_gemini.models.generate_calls
+    result = run_full_analysis(text + EXTRA, client, document_id=document_id)
+
+    assert result["incremental"]["reused_agents"] == []
+    assert not result["incremental"]["recommendation_reused"]
+    assert fake_gemini.models.generate_calls - calls == len(ANALYSIS_AGENTS) + 1
+    assert result["risks"] != first["risks"]
@@ -0,0 +1,12 @@
+import rag.vector_store as vector_store
+from rag.lexical_index import get_lexical_index, tokenize
+
+
+def test_index_lives_in_memory_with_in_memory_chroma():
+    assert vector_store.VECTOR_BACKEND == "chroma" and not vector_store.CHROMA_PATH
+    (_, _, filename), = get_lexical_index()._db.execute("PRAGMA database_list").fetchall()
+    assert filename == ""
+
+
+def test_long_words_share_a_stem():
+    assert len(set(tokenize("indemnify indemnity indemnification"))) == 1
@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.genai import types
+
+import utils.llm_cache as llm_cache
+from utils.llm_cache import ResponseCache, cache_scope, finished
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), ttl_seconds=3600, max_bytes=1 << 20)
+    monkeypatch.setattr(llm_cache, "get_llm_cache", lambda: cache)
+    return cache
+
+
+def _truncate(fake_gemini, reason):
+    fake_gemini.models._response = lambda contents, config: SimpleNamespace(
+        text="The contract says the Vendor sha", candidates=[SimpleNamespace(finish_reason=reason)]
+    )
+
+
+def test_repeat_call_is_a_hit(cache, client, fake_gemini):
+    for expected in ("miss", "hit"):
+        with cache_scope() as status:
+            response = llm_cache.generate_content(client, "risk_analyzer", "prompt", "model")
+        assert status == {"risk_analyzer": expected}
+        assert response.text
+    assert fake_gemini.models.generate_calls == 1
+
+
+def test_bypass_skips_the_lookup(cache, client, fake_gemini):
+    llm_cache.generate_content(client, "risk_analyzer", "prompt", "model")
+    with cache_scope(bypass=True) as status:
+        llm_cache.generate_content(client, "risk_analyzer", "prompt", "model")
+    assert status == {"risk_analyzer": "bypass"}
+    assert fake_gemini.models.generate_calls == 2
+
+
+@pytest.mark.parametrize("reason", ["MAX_TOKENS", types.FinishReason.SAFETY])
+def test_unfinished_response_is_not_cached(cache, client, fake_gemini, reason):
+    _truncate(fake_gemini, reason)
+    for _ in range(2):
+        with cache_scope() as status:
+            llm_cache.generate_content(client, "risk_analyzer", "prompt", "model")
+        assert status == {"risk_analyzer": "miss"}
+    assert cache.stats()["entries"] == 0
+
+
+def test_unfinished_response_is_not_cached_async(cache, client, fake_gemini):
+    _truncate(fake_gemini, "MAX_TOKENS")
+    asyncio.run(llm_cache.agenerate_content(client, "risk_analyzer", "prompt", "model"))
+    assert cache.stats()["entries"] == 0
+
+
+def test_completed_stream_is_cached(cache, client, fake_gemini):
+    text = "".join(llm_cache.generate_content_stream(client, "recommendation", "prompt", "model"))
+    with cache_scope() as status:
+        assert "".join(llm_cache.generate_content_stream(client, "recommendation", "prompt", "model")) == text
+    assert status == {"recommendation": "hit"}
+
+
+def test_finished_accepts_the_sdk_enum():
+    assert finished(SimpleNamespace(candidates=[SimpleNamespace(finish_reason=types.FinishReason.STOP)]))
+    assert not finished(SimpleNamespace(candidates=[]))
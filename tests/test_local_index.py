@@ -0,0 +1,39 @@
+import numpy as np
+
+from rag.local_index import LocalVectorIndex
+
+
+def _add(index, contract_id, n, start=0):
+    ids = [f"{contract_id}:{i}" for i in range(start, start + n)]
+    vectors = np.random.default_rng(sum(map(ord, contract_id)) + start).normal(size=(n, 8))
+    index.upsert(ids, [f"chunk {i}" for i in ids], vectors, [{"contract_id": contract_id}] * n)
+    return ids, vectors
+
+
+def test_deleted_rows_are_reused(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    _add(index, "a", 10)
+    index.delete([f"a:{i}" for i in range(2, 7)])
+    _add(index, "b", 5)
+
+    assert index.count == 10
+    assert len(index.contract_chunks("a")) == 5 and len(index.contract_chunks("b")) == 5
+
+
+def test_trailing_deletes_shrink_the_scanned_rows(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    _add(index, "a", 10)
+    index.delete([f"a:{i}" for i in range(6, 10)])
+    assert index.count == 6
+
+
+def test_processes_sharing_a_directory_do_not_overwrite_rows(tmp_path):
+    first = LocalVectorIndex(str(tmp_path))
+    second = LocalVectorIndex(str(tmp_path))
+    _add(first, "a", 3)
+    ids, vectors = _add(second, "b", 3)
+
+    assert second.count == 6
+    assert len(first.contract_chunks("a")) == 3
+    hit, = first.query(vectors[0], top_k=1)
+    assert hit["id"] == ids[0]
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+from PIL import Image
+
+import utils.pdf_reader as pdf_reader
+
+
+def _create_concurrently(get_pool, *args):
+    barrier = threading.Barrier(8)
+    pools = []
+
+    def create():
+        barrier.wait()
+        pools.append(get_pool(*args))
+
+    threads = [threading.Thread(target=create) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return pools
+
+
+def test_concurrent_callers_share_one_pool(monkeypatch):
+    monkeypatch.setattr(pdf_reader, "_pools", {})
+    pools = _create_concurrently(pdf_reader._get_pool, 2)
+    assert len({id(pool) for pool in pools}) == 1
+    assert pdf_reader._get_pool(3) is not pools[0]
+    for pool in pdf_reader._pools.values():
+        pool.shutdown()
+
+
+def test_concurrent_callers_share_one_ocr_pool(monkeypatch):
+    monkeypatch.setattr(pdf_reader, "_ocr_pool", None)
+    pools = _create_concurrently(pdf_reader._get_ocr_pool)
+    assert len({id(pool) for pool in pools}) == 1
+    pools[0].shutdown()
+
+
+@pytest.fixture
+def scanned_pdf(tmp_path, monkeypatch):
+    """A one-page, image-only PDF, OCR'd in-process."""
+    monkeypatch.setattr(pdf_reader, "OCR_WORKERS", 1)
+    monkeypatch.setattr(pdf_reader, "OCR_CACHE_DIR", str(tmp_path / "ocr"))
+    monkeypatch.setattr(pdf_reader, "PDF_TEXT_CACHE_DIR", str(tmp_path / "pdf_text"))
+    path = str(tmp_path / "scan.pdf")
+    Image.new("RGB", (200, 100), "white").save(path)
+    return path
+
+
+def test_failed_ocr_is_not_cached(scanned_pdf, monkeypatch):
+    def no_tesseract(*args):
+        raise RuntimeError("tesseract is not installed")
+
+    monkeypatch.setattr(pdf_reader, "_ocr_page", no_tesseract)
+    assert pdf_reader.extract_pdf(scanned_pdf).text == ""
+    assert pdf_reader.cached_pdf_text(pdf_reader.file_sha256(scanned_pdf)) is None
+
+    # Once OCR works, the same file is read properly and then cached.
+    monkeypatch.setattr(pdf_reader, "_ocr_page", lambda *args: "Scanned clause text")
+    assert pdf_reader.extract_pdf(scanned_pdf).text == "Scanned clause text"
+    cached = pdf_reader.cached_pdf_text(pdf_reader.file_sha256(scanned_pdf))
+    assert cached is not None and cached.text == "Scanned clause text"
@@ -0,0 +1,72 @@
+import asyncio
+import contextvars
+import threading
+import uuid
+
+import httpx
+import pytest
+
+import agents.runtime as runtime
+from agents.orchestrator import ANALYSIS_AGENTS, arun_full_analysis, run_full_analysis
+from benchmarks.synthetic import synthetic_contract
+
+
+def _failing_for(agent_name, generate):
+    def wrapper(client, agent, *args, **kwargs):
+        if agent == agent_name:
+            raise httpx.ConnectError("connection refused")
+        return generate(client, agent, *args, **kwargs)
+    return wrapper
+
+
+def _check_partial(result):
+    assert result["fraud_indicators"]["error"] == "connection refused"
+    for key in ANALYSIS_AGENTS:
+        if key != "fraud_indicators":
+            assert "error" not in result[key], key
+    assert "error" not in result["recommendation"]
+
+
+def test_network_error_fails_only_that_agent(client, monkeypatch):
+    monkeypatch.setattr(runtime, "generate_content", _failing_for("fraud_detector", runtime.generate_content))
+    result = run_full_analysis(synthetic_contract("5KB", 21), client, document_id=f"doc-{uuid.uuid4().hex[:8]}")
+    _check_partial(result)
+
+
+def test_network_error_fails_only_that_agent_async(client, monkeypatch):
+    generate = runtime.agenerate_content
+
+    async def failing(client, agent, *args, **kwargs):
+        if agent == "fraud_detector":
+            raise httpx.ConnectError("connection refused")
+        return await generate(client, agent, *args, **kwargs)
+
+    monkeypatch.setattr(runtime, "agenerate_content", failing)
+    result = asyncio.run(arun_full_analysis(
+        synthetic_contract("5KB", 22), client, document_id=f"doc-{uuid.uuid4().hex[:8]}"
+    ))
+    _check_partial(result)
+
+
+@pytest.mark.parametrize("error", [ValueError("malformed response"), runtime.AgentTimeout()])
+def test_failure_result(error):
+    result = runtime._failure("fraud_detector", error)
+    assert "error" in result and "cancelled" not in result
+
+
+def test_cancellation_wins_over_other_errors():
+    event = threading.Event()
+    event.set()
+    result = contextvars.copy_context().run(
+        runtime.with_cancellation, event, runtime._failure, "fraud_detector", httpx.ReadTimeout("read timed out")
+    )
+    assert result["cancelled"]
+
+
+def test_slow_agent_times_out_and_the_rest_finish(client, fake_gemini, monkeypatch):
+    fake_gemini.models.latency = 0.3
+    monkeypatch.setitem(runtime.AGENT_TIMEOUTS, "fraud_detector", 0.05)
+    result = run_full_analysis(synthetic_contract("5KB", 23), client, document_id=f"doc-{uuid.uuid4().hex[:8]}")
+
+    assert result["fraud_indicators"]["timed_out"]
+    assert all("error" not in result[key] for key in ANALYSIS_AGENTS if key != "fraud_indicators")
@@ -0,0 +1,400 @@
+"""
+Quota-aware wrapper around the Gemini client.
+
+Every agent and the embedding helper call `client.models.*`, so wrapping the
+client once in Main gives all of them the same limits:
+
+- Token buckets per call type (generate / embed) for requests per minute and
+  tokens per minute, so bursts are smoothed before they turn into 429s
+- Retries of 429 and 5xx responses; a 429 that carries a retry hint
+  (Retry-After header or RetryInfo.retryDelay) pauses the whole bucket for
+  that long, otherwise the call backs off exponentially with jitter. A hint
+  longer than GEMINI_MAX_RETRY_PAUSE is not waited out: the call fails at
+  once and the bucket stays open
+- Priority classes: callers waiting for capacity are served interactive
+  first, then default, then bulk, so /rag/ask is not stuck behind batch jobs
+
+Only once retries are exhausted does the ClientError reach the agent, which
+reports it the same way as before.
+
+`client.aio.models` gets the same limits for the SDK's async API, which the
+async request path uses: waiting for capacity and backing off are
+`asyncio.sleep`s, so a waiting call holds no thread. Both APIs draw from the
+same buckets, and the async calls share the SDK client's pooled connections.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from google.genai.errors import ClientError, ServerError
+
+from rag.text_splitter import estimate_tokens
+from utils.metrics import inc
+
+# 0 disables a limit.
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "1000"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_EMBED_RPM = int(os.getenv("GEMINI_EMBED_RPM", "3000"))
+GEMINI_EMBED_TPM = int(os.getenv("GEMINI_EMBED_TPM", "1000000"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_SECONDS = float(os.getenv("GEMINI_BACKOFF_SECONDS", "1"))
+GEMINI_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "60"))
+# Longest retry hint honoured; a 429 asking for more (e.g. a daily quota) fails at once.
+GEMINI_MAX_RETRY_PAUSE = float(os.getenv("GEMINI_MAX_RETRY_PAUSE", "60"))
+
+# How often an async caller that isn't first in line re-checks the queue.
+_ASYNC_POLL_SECONDS = 0.02
+
+# Priority classes; lower values are served first.
+INTERACTIVE = 0
+DEFAULT = 1
+BULK = 2
+
+_priority = contextvars.ContextVar("gemini_priority", default=DEFAULT)
+
+
+@contextmanager
+def request_priority(level: int):
+    """Runs the enclosed Gemini calls (and tasks copied from this context) at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Refills continuously up to `per_minute`; a limit of 0 never blocks."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # A single call larger than the whole bucket waits for a full bucket.
+        missing = min(cost, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, cost: float) -> None:
+        if self.capacity:
+            self.level -= min(cost, self.capacity)
+
+
+class RateLimiter:
+    """Request and token buckets shared by every caller, served in priority order."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    def acquire(self, tokens: int, priority: int = DEFAULT) -> None:
+        started = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._waiting[0] != ticket:
+                        # Someone more urgent (or earlier) is first in line.
+                        self._cond.wait()
+                        continue
+                    wait = max(
+                        self._paused_until - now,
+                        self.requests.wait_time(1, now),
+                        self.tokens.wait_time(tokens, now),
+                    )
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        break
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                waited = time.monotonic() - started
+                if waited > 0.001:
+                    self.waits += 1
+                    self.waited_seconds += waited
+
+    async def acquire_async(self, tokens: int, priority: int = DEFAULT) -> None:
+        """`acquire` for coroutines: sleeps on the event loop instead of blocking."""
+        started = time.monotonic()
+        ticket = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    if self._waiting[0] != ticket:
+                        wait = _ASYNC_POLL_SECONDS
+                    else:
+                        wait = max(
+                            self._paused_until - now,
+                            self.requests.wait_time(1, now),
+                            self.tokens.wait_time(tokens, now),
+                        )
+                        if wait <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            return
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                waited = time.monotonic() - started
+                if waited > 0.001:
+                    self.waits += 1
+                    self.waited_seconds += waited
+
+    def pause(self, seconds: float) -> None:
+        """Holds back every caller for `seconds` (after a 429 with a retry hint)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "waiting": len(self._waiting),
+                "waits": self.waits,
+                "waited_seconds": round(self.waited_seconds, 3),
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+            }
+
+
+def _parse_seconds(value):
+    match = re.fullmatch(r"\s*([\d.]+)\s*s?\s*", str(value))
+    return float(match.group(1)) if match else None
+
+
+def retry_after(error):
+    """Returns the server's retry hint in seconds, or None."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers:
+        seconds = _parse_seconds(headers.get("retry-after", ""))
+        if seconds is not None:
+            return seconds
+
+    # google.rpc.RetryInfo: {"@type": ".../google.rpc.RetryInfo", "retryDelay": "37s"}
+    pending = [getattr(error, "details", None)]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, dict):
+            if "retryDelay" in item:
+                return _parse_seconds(item["retryDelay"])
+            pending.extend(item.values())
+        elif isinstance(item, list):
+            pending.extend(item)
+    return None
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter keeps retrying callers from synchronizing.
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX_SECONDS, GEMINI_BACKOFF_SECONDS * 2 ** attempt))
+
+
+def _prompt_tokens(contents) -> int:
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(str(item)) for item in contents)
+    return estimate_tokens(str(contents))
+
+
+class RateLimitedModels:
+    """Drop-in for `client.models` that queues, limits and retries calls."""
+
+    def __init__(self, models, limiters: dict, max_retries: int):
+        self._models = models
+        self._limiters = limiters
+        self.max_retries = max_retries
+        self.retries = 0
+        self.rate_limited = 0
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+    def _retry_delay(self, kind: str, error, attempt: int):
+        """
+        Seconds to back off before retrying `error` (0 after pausing the
+        limiter for a retry hint), or None if it shouldn't be retried.
+        """
+        # Other client errors (bad request, auth) won't succeed on retry.
+        if isinstance(error, ClientError) and error.code != 429:
+            return None
+        if error.code == 429:
+            self.rate_limited += 1
+            inc("clm_gemini_rate_limited_total", kind=kind)
+        if attempt > self.max_retries:
+            return None
+        hint = retry_after(error) if error.code == 429 else None
+        if hint is not None and hint > GEMINI_MAX_RETRY_PAUSE:
+            return None
+        self.retries += 1
+        inc("clm_gemini_retries_total", kind=kind)
+        if hint is not None:
+            self._limiters[kind].pause(hint)
+            return 0.0
+        return _backoff(attempt)
+
+    def _call(self, kind: str, tokens: int, fn):
+        limiter = self._limiters[kind]
+        attempt = 0
+        while True:
+            limiter.acquire(tokens, _priority.get())
+            try:
+                return fn()
+            except (ClientError, ServerError) as e:
+                attempt += 1
+                delay = self._retry_delay(kind, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    def generate_content(self, model: str, contents, config=None, **kwargs):
+        return self._call(
+            "generate",
+            _prompt_tokens(contents),
+            lambda: self._models.generate_content(model=model, contents=contents, config=config, **kwargs),
+        )
+
+    def generate_content_stream(self, model: str, contents, config=None, **kwargs):
+        # Retries only cover the call up to the first chunk; a stream that
+        # fails midway can't be resumed without repeating output.
+        def start():
+            stream = iter(
+                self._models.generate_content_stream(model=model, contents=contents, config=config, **kwargs)
+            )
+            return next(stream, None), stream
+
+        first, stream = self._call("generate", _prompt_tokens(contents), start)
+        if first is not None:
+            yield first
+            yield from stream
+
+    def embed_content(self, model: str, contents, config=None, **kwargs):
+        return self._call(
+            "embed",
+            _prompt_tokens(contents),
+            lambda: self._models.embed_content(model=model, contents=contents, config=config, **kwargs),
+        )
+
+
+class RateLimitedAsyncModels(RateLimitedModels):
+    """Drop-in for `client.aio.models`; coroutines and async iterators."""
+
+    async def _call(self, kind: str, tokens: int, fn):
+        limiter = self._limiters[kind]
+        attempt = 0
+        while True:
+            await limiter.acquire_async(tokens, _priority.get())
+            try:
+                return await fn()
+            except (ClientError, ServerError) as e:
+                attempt += 1
+                delay = self._retry_delay(kind, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    async def generate_content(self, model: str, contents, config=None, **kwargs):
+        return await self._call(
+            "generate",
+            _prompt_tokens(contents),
+            lambda: self._models.generate_content(model=model, contents=contents, config=config, **kwargs),
+        )
+
+    async def generate_content_stream(self, model: str, contents, config=None, **kwargs):
+        # As for the sync stream, only the call up to the first chunk is retried.
+        async def start():
+            stream = await self._models.generate_content_stream(
+                model=model, contents=contents, config=config, **kwargs
+            )
+            return await anext(stream, None), stream
+
+        first, stream = await self._call("generate", _prompt_tokens(contents), start)
+        if first is not None:
+            yield first
+            async for chunk in stream:
+                yield chunk
+
+    async def embed_content(self, model: str, contents, config=None, **kwargs):
+        return await self._call(
+            "embed",
+            _prompt_tokens(contents),
+            lambda: self._models.embed_content(model=model, contents=contents, config=config, **kwargs),
+        )
+
+
+class RateLimitedAsyncClient:
+    """The `client.aio` of a RateLimitedClient; everything but `.models` passes through."""
+
+    def __init__(self, aio, models: RateLimitedAsyncModels):
+        self._aio = aio
+        self.models = models
+
+    def __getattr__(self, name):
+        return getattr(self._aio, name)
+
+
+class RateLimitedClient:
+    """Wraps a `genai.Client` (or a stand-in); everything but `.models` passes through."""
+
+    def __init__(
+        self,
+        client,
+        rpm: int = None,
+        tpm: int = None,
+        embed_rpm: int = None,
+        embed_tpm: int = None,
+        max_retries: int = None,
+    ):
+        self._client = client
+        self.limiters = {
+            "generate": RateLimiter(
+                GEMINI_RPM if rpm is None else rpm, GEMINI_TPM if tpm is None else tpm
+            ),
+            "embed": RateLimiter(
+                GEMINI_EMBED_RPM if embed_rpm is None else embed_rpm,
+                GEMINI_EMBED_TPM if embed_tpm is None else embed_tpm,
+            ),
+        }
+        max_retries = GEMINI_MAX_RETRIES if max_retries is None else max_retries
+        self.models = RateLimitedModels(client.models, self.limiters, max_retries)
+        self.aio = RateLimitedAsyncClient(
+            client.aio, RateLimitedAsyncModels(client.aio.models, self.limiters, max_retries)
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def stats(self) -> dict:
+        return {
+            "retries": self.models.retries + self.aio.models.retries,
+            "rate_limited": self.models.rate_limited + self.aio.models.rate_limited,
+            **{kind: limiter.stats() for kind, limiter in self.limiters.items()},
+        }
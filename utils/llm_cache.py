@@ -0,0 +1,319 @@
+"""
+Shared response cache for agent LLM calls.
+
+Agents build their prompts deterministically from the contract text, so the
+same (agent, model, prompt) always asks Gemini the same question. This module
+stores response text in a local SQLite database keyed on a hash of those three
+values. Entries expire after LLM_CACHE_TTL_SECONDS, and the least recently used
+ones are evicted once the store grows past LLM_CACHE_MAX_MB.
+
+Only responses that finished normally (finish reason STOP) are stored; one cut
+off at MAX_TOKENS or blocked by a safety filter is returned but not cached, so
+the next identical request asks again.
+
+Endpoints open a `cache_scope()` around a request. Inside the scope, agents
+record whether their call was a cache "hit" or "miss" (or "bypass" when the
+caller asked to skip the cache), and the endpoint returns that status map.
+`agenerate_content` does the same for the async request path.
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from rag.text_splitter import estimate_tokens
+from utils.metrics import inc, stage
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite3"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+
+class CachedResponse:
+    """Minimal stand-in for a GenerateContentResponse served from the cache."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.candidates = []
+
+
+def response_text(response):
+    """Returns the text of a Gemini response, or None if it has none."""
+    text = getattr(response, "text", None)
+    if text:
+        return text
+    try:
+        for c in response.candidates:
+            for p in c.content.parts:
+                if getattr(p, "text", None):
+                    return p.text
+    except Exception:
+        pass
+    return None
+
+
+def finished(response) -> bool:
+    """True if the response's first candidate stopped normally (finish reason STOP)."""
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return False
+    return getattr(reason, "name", reason) == "STOP"
+
+
+class ResponseCache:
+    """SQLite-backed store of response text with TTL and size-based LRU eviction."""
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, agent TEXT NOT NULL, text TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(agent: str, model: str, prompt: str, config: dict = None) -> str:
+        if config:
+            # A response schema changes the answer's format, so it is part of the key.
+            prompt = f"{prompt}\0{json.dumps(config, sort_keys=True)}"
+        return hashlib.sha256(f"{agent}\0{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            text, created = row
+            if now - created > self.ttl_seconds:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return text
+
+    def put(self, key: str, agent: str, text: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, agent, text, size, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent, text, len(text.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now: float) -> None:
+        self._db.execute(
+            "DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)
+        )
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk entries from least to most recently used until under budget.
+        excess = total - self.max_bytes
+        stale = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Returns the process-wide response cache, or None when LLM_CACHE=0."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, int(LLM_CACHE_MAX_MB * 1024 * 1024)
+            )
+    return _cache
+
+
+# Per-request settings and per-agent status, set by `cache_scope()`.
+_scope = contextvars.ContextVar("llm_cache_scope", default=None)
+
+
+@contextmanager
+def cache_scope(bypass: bool = False):
+    """
+    Opens a per-request cache scope.
+
+    Yields a dict that fills with {agent: "hit" | "miss" | "bypass"} as agents
+    run inside the scope. With bypass=True, agents skip the lookup and refresh
+    the stored entry with the new response.
+    """
+    scope = {"bypass": bypass, "status": {}}
+    token = _scope.set(scope)
+    try:
+        yield scope["status"]
+    finally:
+        _scope.reset(token)
+
+
+def record_llm_call(agent: str, outcome: str, prompt: str = None, text: str = None, usage=None) -> None:
+    """
+    Counts an LLM call by cache outcome ("hit", "miss", "bypass" or
+    "uncached"), and for live calls its tokens, from the response's usage
+    metadata when present and estimated otherwise.
+    """
+    inc("clm_llm_calls_total", agent=agent, cache=outcome)
+    if outcome == "hit":
+        return
+    input_tokens = getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt)
+    output_tokens = getattr(usage, "candidates_token_count", None) or estimate_tokens(text or "")
+    inc("clm_llm_tokens_total", input_tokens, agent=agent, direction="input")
+    inc("clm_llm_tokens_total", output_tokens, agent=agent, direction="output")
+
+
+def cache_bypassed() -> bool:
+    """True inside a cache_scope(bypass=True), i.e. the caller asked for fresh results."""
+    scope = _scope.get()
+    return bool(scope and scope["bypass"])
+
+
+def generate_content(client, agent: str, prompt: str, model: str, config: dict = None):
+    """
+    Cache-aware replacement for `client.models.generate_content`.
+
+    Returns either the live Gemini response or a CachedResponse; both expose
+    `.text` and `.candidates`, so agents extract text the same way. `config`
+    (e.g. a response schema) is passed to Gemini as is. API errors propagate
+    unchanged.
+    """
+    scope = _scope.get()
+    bypass = bool(scope and scope["bypass"])
+    cache = get_llm_cache()
+
+    key = ResponseCache.make_key(agent, model, prompt, config)
+    if cache is not None and not bypass:
+        text = cache.get(key)
+        if text is not None:
+            if scope is not None:
+                scope["status"][agent] = "hit"
+            record_llm_call(agent, "hit")
+            return CachedResponse(text)
+
+    with stage("llm", agent=agent) as span:
+        response = client.models.generate_content(model=model, contents=prompt, config=config)
+        text = response_text(response)
+        span["chars"] = len(text or "")
+
+    outcome = "bypass" if bypass else "miss"
+    record_llm_call(agent, outcome, prompt, text, getattr(response, "usage_metadata", None))
+    if cache is not None and text and finished(response):
+        cache.put(key, agent, text)
+    if scope is not None:
+        scope["status"][agent] = outcome
+    return response
+
+
+async def agenerate_content(client, agent: str, prompt: str, model: str, config: dict = None):
+    """
+    Async `generate_content` over `client.aio.models`. Cache reads and writes
+    run on a worker thread so SQLite never blocks the event loop.
+    """
+    scope = _scope.get()
+    bypass = bool(scope and scope["bypass"])
+    cache = get_llm_cache()
+
+    key = ResponseCache.make_key(agent, model, prompt, config)
+    if cache is not None and not bypass:
+        text = await asyncio.to_thread(cache.get, key)
+        if text is not None:
+            if scope is not None:
+                scope["status"][agent] = "hit"
+            record_llm_call(agent, "hit")
+            return CachedResponse(text)
+
+    with stage("llm", agent=agent) as span:
+        response = await client.aio.models.generate_content(model=model, contents=prompt, config=config)
+        text = response_text(response)
+        span["chars"] = len(text or "")
+
+    outcome = "bypass" if bypass else "miss"
+    record_llm_call(agent, outcome, prompt, text, getattr(response, "usage_metadata", None))
+    if cache is not None and text and finished(response):
+        await asyncio.to_thread(cache.put, key, agent, text)
+    if scope is not None:
+        scope["status"][agent] = outcome
+    return response
+
+
+def generate_content_stream(client, agent: str, prompt: str, model: str):
+    """
+    Cache-aware replacement for `client.models.generate_content_stream`.
+
+    Yields text pieces as Gemini produces them. A cached response is yielded
+    as one piece; a streamed response is cached once it completes, if its
+    last chunk reports STOP.
+    API errors propagate unchanged.
+    """
+    scope = _scope.get()
+    bypass = bool(scope and scope["bypass"])
+    cache = get_llm_cache()
+
+    key = ResponseCache.make_key(agent, model, prompt)
+    if cache is not None and not bypass:
+        text = cache.get(key)
+        if text is not None:
+            if scope is not None:
+                scope["status"][agent] = "hit"
+            record_llm_call(agent, "hit")
+            yield text
+            return
+
+    pieces = []
+    usage = None
+    complete = False
+    # The span covers the time consumers spend between pieces as well.
+    with stage("llm", agent=agent) as span:
+        for chunk in client.models.generate_content_stream(model=model, contents=prompt):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            complete = finished(chunk)
+            text = response_text(chunk)
+            if text:
+                pieces.append(text)
+                yield text
+        text = "".join(pieces)
+        span["chars"] = len(text)
+
+    outcome = "bypass" if bypass else "miss"
+    record_llm_call(agent, outcome, prompt, text, usage)
+    if cache is not None and text and complete:
+        cache.put(key, agent, text)
+    if scope is not None:
+        scope["status"][agent] = outcome
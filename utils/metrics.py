@@ -0,0 +1,211 @@
+"""
+In-process metrics and per-request trace spans.
+
+Stages of the pipeline (PDF extraction, splitting, embedding, vector store
+add / query, each agent's LLM call, session memory) wrap their work in
+`stage(...)`, which records a latency histogram and an error counter, and
+adds a span to the current request's trace when one is active. Counters
+track token counts, cache hits and rate-limited calls.
+
+`render()` returns everything in the Prometheus text format for /metrics.
+A request sent with the `X-Debug-Trace: 1` header gets its spans back in the
+`X-Trace` response header (see Main). Work done on other threads is traced
+as long as it runs in a copy of the request's context, as the orchestrator's
+worker pool does.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+METRICS = os.getenv("METRICS", "1") != "0"
+TRACE_HEADER = os.getenv("METRICS_TRACE_HEADER", "1") != "0"
+# Spans kept per trace, so the debug header stays a reasonable size.
+TRACE_MAX_SPANS = int(os.getenv("METRICS_TRACE_MAX_SPANS", "200"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_HELP = {
+    "clm_stage_seconds": "Latency of pipeline stages",
+    "clm_stage_errors_total": "Pipeline stage calls that raised, by exception type",
+    "clm_llm_calls_total": "Agent LLM calls by cache outcome",
+    "clm_llm_tokens_total": "LLM tokens sent and received (cache hits excluded)",
+    "clm_embedding_texts_total": "Texts embedded, by embedding cache outcome",
+    "clm_gemini_rate_limited_total": "Gemini calls rejected with 429",
+    "clm_gemini_retries_total": "Gemini calls retried after 429 / 5xx",
+    "clm_http_request_seconds": "HTTP request latency by route and status",
+    "clm_agent_timeouts_total": "Agents that returned a timeout error at their deadline",
+    "clm_agent_errors_total": "Agents that returned an error result, by exception type",
+    "clm_agent_hedges_total": "Duplicate (hedged) Gemini requests sent for slow calls",
+    "clm_agent_hedge_wins_total": "Hedged requests that answered before the original",
+    "clm_pdf_text_cache_total": "PDF text lookups by extraction cache outcome",
+}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = [*key, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Registry:
+    """Counters and histograms keyed by metric name and label set."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}    # name -> {label key: value}
+        self._histograms = {}  # name -> {label key: [bucket counts..., sum, count]}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            row = series.get(key)
+            if row is None:
+                # One count per bucket plus one past the last bound, then sum and count.
+                row = series[key] = [0] * (len(self.buckets) + 3)
+            row[bisect_left(self.buckets, value)] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, row in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, row):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {row[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {row[-2]:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {row[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# The active request's trace: {"start": perf_counter at request start, "spans": [...]}.
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    if METRICS:
+        registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    if METRICS:
+        registry.observe(name, value, **labels)
+
+
+def render() -> str:
+    return registry.render()
+
+
+def _add_span(name: str, labels: dict, start: float, seconds: float, attrs: dict) -> None:
+    trace = _trace.get()
+    if trace is not None and len(trace["spans"]) < TRACE_MAX_SPANS:
+        trace["spans"].append({
+            "stage": name,
+            **labels,
+            "start_ms": round((start - trace["start"]) * 1000, 1),
+            "ms": round(seconds * 1000, 1),
+            **attrs,
+        })
+
+
+@contextmanager
+def stage(name: str, **labels):
+    """
+    Times a pipeline stage into clm_stage_seconds{stage=name, **labels}.
+
+    Yields a dict; anything put in it (e.g. item counts) is attached to the
+    trace span. Exceptions are counted and re-raised.
+    """
+    attrs = {}
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        attrs["error"] = error
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        observe("clm_stage_seconds", seconds, stage=name, **labels)
+        if error is not None:
+            inc("clm_stage_errors_total", stage=name, error=error, **labels)
+        _add_span(name, labels, start, seconds, attrs)
+
+
+def timed_iter(name: str, iterable, **labels):
+    """
+    Yields from `iterable`, timing only the time spent producing items, and
+    records it as one stage once the iterable is exhausted or abandoned.
+    """
+    attrs = {"items": 0}
+    seconds = 0.0
+    iterator = iter(iterable)
+    first_start = time.perf_counter()
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                seconds += time.perf_counter() - start
+                return
+            seconds += time.perf_counter() - start
+            attrs["items"] += 1
+            yield item
+    finally:
+        observe("clm_stage_seconds", seconds, stage=name, **labels)
+        _add_span(name, labels, first_start, seconds, attrs)
+
+
+@contextmanager
+def request_trace(enabled: bool = True):
+    """Collects the spans of the enclosed work; yields the span list (None if disabled)."""
+    if not enabled:
+        yield None
+        return
+    trace = {"start": time.perf_counter(), "spans": []}
+    token = _trace.set(trace)
+    try:
+        yield trace["spans"]
+    finally:
+        _trace.reset(token)
+
+
+def trace_header(spans) -> str:
+    """Compact JSON of a trace's spans, for the X-Trace response header."""
+    return json.dumps(spans, separators=(",", ":"), default=str)
@@ -1,13 +1,299 @@
-# used to extract text from a pdf file and return it as a string
+"""
+Page-level PDF text extraction.
+
+Large PDFs are split into page ranges that are extracted in a process pool,
+so parsing uses every core instead of one. `iter_pdf_pages` yields pages in
+order as soon as their range is done, so callers can start chunking and
+embedding before the last page is parsed. Small PDFs are extracted inline,
+where a pool would cost more than it saves.
+
+Scanned pages have no text layer. Pages whose text layer is (nearly) empty
+but that contain images are rendered at OCR_DPI and run through Tesseract in
+a separate process pool; every other page skips OCR entirely. OCR output is
+cached on disk under a hash of the page's raw content and image streams, so
+re-uploading the same scan never re-OCRs it.
+
+`extract_pdf` caches the extracted text of a whole file under the SHA-256
+of its bytes, so a file seen before skips pdfplumber entirely. Callers that
+already hashed the file (see utils/uploads.py) pass the hash in, and can
+check `cached_pdf_text` before the file is even written to disk.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, NamedTuple
+
 import pdfplumber
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    extracted_text = ""
+from utils.metrics import inc, stage
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+
+OCR_ENABLED = os.getenv("OCR", "1") != "0"
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+# Pages with fewer extracted characters than this are OCR candidates.
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "20"))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(".cache", "ocr"))
+# Path to the tesseract binary when it is not on PATH (e.g. on Windows).
+TESSERACT_CMD = os.getenv("TESSERACT_CMD")
+
+PDF_TEXT_CACHE = os.getenv("PDF_TEXT_CACHE", "1") != "0"
+PDF_TEXT_CACHE_DIR = os.getenv("PDF_TEXT_CACHE_DIR", os.path.join(".cache", "pdf_text"))
+_HASH_CHUNK_BYTES = 1 << 20
+
+
+class PageText(NamedTuple):
+    number: int  # 1-based page number
+    text: str
+    seconds: float  # time spent extracting this page (including OCR)
+    ocr: bool = False  # text came from OCR rather than the text layer
+    ocr_failed: bool = False  # OCR was needed but raised; text is the text layer only
+
+
+class PdfText(NamedTuple):
+    text: str  # every page's text joined with "\n"
+    page_starts: List[int]  # offset in `text` where each page begins
+    page_seconds: List[float]  # extraction time per page
+
+
+# Long-lived pools, one per size; spawning workers per request would eat the gain.
+_pools = {}
+_pools_lock = threading.Lock()
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
 
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # Uploads are extracted on several threads at once; the lock keeps them
+    # from each starting (and leaking) a pool.
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return _pools[workers]
+
+
+def _get_ocr_pool() -> ProcessPoolExecutor:
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+    return _ocr_pool
+
+
+def _page_content_hash(page) -> str:
+    """Hash of the page's raw content and image streams (what OCR would see)."""
+    digest = hashlib.sha256()
+    digest.update(repr(page.bbox).encode())
+    for stream in page.page_obj.contents:
+        digest.update(stream.get_rawdata() or b"")
+    for image in page.images:
+        digest.update(image["stream"].get_rawdata() or b"")
+    return digest.hexdigest()
+
+
+def _extract_range(pdf_path: str, first: int, last: int) -> list:
+    """
+    Returns (PageText, ocr_key) pairs; ocr_key is set for image-only pages
+    that still need OCR.
+    """
+    pages = []
     with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if text:
-                extracted_text += text + "\n"
+        for index in range(first, last):
+            started = time.perf_counter()
+            page = pdf.pages[index]
+            text = page.extract_text() or ""
+            ocr_key = None
+            if OCR_ENABLED and len(text.strip()) < OCR_MIN_CHARS and page.images:
+                ocr_key = f"{_page_content_hash(page)}-{OCR_DPI}"
+            pages.append((PageText(index + 1, text, time.perf_counter() - started), ocr_key))
+    return pages
+
+
+def _ocr_page(pdf_path: str, number: int, dpi: int) -> str:
+    import pytesseract
+
+    if TESSERACT_CMD:
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    with pdfplumber.open(pdf_path) as pdf:
+        image = pdf.pages[number - 1].to_image(resolution=dpi).original
+    return pytesseract.image_to_string(image)
+
+
+def _ocr_cache_path(ocr_key: str) -> str:
+    return os.path.join(OCR_CACHE_DIR, ocr_key[:2], f"{ocr_key}.txt")
+
+
+def _read_ocr_cache(ocr_key: str):
+    try:
+        with open(_ocr_cache_path(ocr_key), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
 
-    return extracted_text.strip()
+def _write_atomic(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write-then-rename so a concurrent reader never sees a partial file.
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def _write_ocr_cache(ocr_key: str, text: str) -> None:
+    _write_atomic(_ocr_cache_path(ocr_key), text)
+
+
+def _start_ocr(pdf_path: str, page: PageText, ocr_key: str):
+    """Returns cached OCR text, or a future / callable that produces it."""
+    cached = _read_ocr_cache(ocr_key)
+    if cached is not None:
+        return cached
+    if OCR_WORKERS <= 1:
+        return lambda: _ocr_page(pdf_path, page.number, OCR_DPI)
+    return _get_ocr_pool().submit(_ocr_page, pdf_path, page.number, OCR_DPI)
+
+
+def _finish_ocr(page: PageText, ocr_key: str, pending) -> PageText:
+    started = time.perf_counter()
+    if isinstance(pending, str):
+        text = pending
+    else:
+        try:
+            text = pending() if callable(pending) else pending.result()
+        except Exception as e:
+            # Missing Tesseract shouldn't fail the whole document; the page
+            # keeps whatever text layer it had, and is flagged so the
+            # document's text isn't cached.
+            inc("clm_stage_errors_total", stage="ocr", error=type(e).__name__)
+            return page._replace(ocr_failed=True)
+        _write_ocr_cache(ocr_key, text)
+    seconds = page.seconds + time.perf_counter() - started
+    return page._replace(text=text, seconds=seconds, ocr=True)
+
+
+def _is_ready(ocr) -> bool:
+    # Inline OCR (a callable) runs when its page's turn comes.
+    return ocr is None or isinstance(ocr, str) or callable(ocr) or ocr.done()
+
+
+def page_count(pdf_path: str) -> int:
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def iter_pdf_pages(pdf_path: str, workers: int = None, pages_per_task: int = None) -> Iterator[PageText]:
+    """
+    Yields PageText for every page of the PDF, in page order.
+
+    Args:
+        pdf_path: Path to the PDF file
+        workers: Process pool size (defaults to PDF_WORKERS)
+        pages_per_task: Pages per pool task (defaults to PDF_PAGES_PER_TASK)
+    """
+    workers = workers or PDF_WORKERS
+    pages_per_task = max(1, pages_per_task or PDF_PAGES_PER_TASK)
+    total = page_count(pdf_path)
+    ranges = [(first, min(first + pages_per_task, total)) for first in range(0, total, pages_per_task)]
+
+    if workers <= 1 or total < PDF_PARALLEL_MIN_PAGES:
+        range_results = (_extract_range(pdf_path, first, last) for first, last in ranges)
+        futures = []
+    else:
+        pool = _get_pool(workers)
+        futures = [pool.submit(_extract_range, pdf_path, first, last) for first, last in ranges]
+        range_results = (future.result() for future in futures)
+
+    # OCR for a range is started as soon as the range is parsed, so it
+    # overlaps with text extraction of later ranges. Pages are yielded once
+    # everything before them is ready.
+    pending = []
+    try:
+        for results in range_results:
+            for page, ocr_key in results:
+                ocr = _start_ocr(pdf_path, page, ocr_key) if ocr_key else None
+                pending.append((page, ocr_key, ocr))
+            while pending and _is_ready(pending[0][2]):
+                page, ocr_key, ocr = pending.pop(0)
+                yield _finish_ocr(page, ocr_key, ocr) if ocr_key else page
+        for page, ocr_key, ocr in pending:
+            yield _finish_ocr(page, ocr_key, ocr) if ocr_key else page
+    finally:
+        # Stop queued ranges if the caller abandons the generator early.
+        for future in futures:
+            future.cancel()
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _text_cache_path(content_hash: str) -> str:
+    # OCR settings change the text of scanned pages, so they are part of the key.
+    variant = f"ocr{OCR_DPI}" if OCR_ENABLED else "no-ocr"
+    return os.path.join(PDF_TEXT_CACHE_DIR, content_hash[:2], f"{content_hash}-{variant}.json")
+
+
+def cached_pdf_text(content_hash: str):
+    """The cached PdfText of the file with this SHA-256, or None."""
+    if not PDF_TEXT_CACHE:
+        return None
+    try:
+        with open(_text_cache_path(content_hash), encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        inc("clm_pdf_text_cache_total", outcome="miss")
+        return None
+    inc("clm_pdf_text_cache_total", outcome="hit")
+    return PdfText(data["text"], data["page_starts"], data["page_seconds"])
+
+
+def extract_pdf(pdf_path: str, content_hash: str = None, check_cache: bool = True) -> PdfText:
+    """
+    Extracts every page and joins them once, keeping page offsets and timings.
+
+    The result is cached under `content_hash` (the SHA-256 of the file,
+    computed here when not given) unless PDF_TEXT_CACHE=0 or OCR failed on
+    a page. Callers that already missed in `cached_pdf_text` pass
+    check_cache=False.
+    """
+    if PDF_TEXT_CACHE:
+        content_hash = content_hash or file_sha256(pdf_path)
+        cached = cached_pdf_text(content_hash) if check_cache else None
+        if cached is not None:
+            return cached
+
+    parts = []
+    page_starts = []
+    page_seconds = []
+    offset = 0
+    with stage("pdf_extraction") as span:
+        ocr_pages = 0
+        ocr_failed = 0
+        for page in iter_pdf_pages(pdf_path):
+            page_starts.append(offset)
+            page_seconds.append(page.seconds)
+            parts.append(page.text)
+            offset += len(page.text) + 1
+            ocr_pages += page.ocr
+            ocr_failed += page.ocr_failed
+        span.update(pages=len(parts), ocr_pages=ocr_pages, ocr_failed=ocr_failed)
+    pdf = PdfText("\n".join(parts), page_starts, page_seconds)
+    # Partial text from failed OCR would otherwise be served forever; retry next time.
+    if PDF_TEXT_CACHE and not ocr_failed:
+        _write_atomic(_text_cache_path(content_hash), json.dumps(pdf._asdict()))
+    return pdf
+
+
+def extract_text_from_pdf(pdf_path: str) -> str:
+    return "\n".join(page.text for page in iter_pdf_pages(pdf_path) if page.text).strip()
@@ -0,0 +1,141 @@
+"""
+Streaming upload handling.
+
+Uploads are copied in UPLOAD_CHUNK_BYTES pieces into a buffer that stays in
+memory up to UPLOAD_SPOOL_MB and moves to a temp file beyond that, and are
+hashed on the way. The body is never held in memory as one `bytes` object,
+and copying stops as soon as it passes UPLOAD_MAX_MB. Endpoints use the
+SHA-256 to look up text already extracted from the same file (see
+utils/pdf_reader.py), so a re-upload is not parsed again, and one under
+UPLOAD_SPOOL_MB is not even written to disk.
+
+`SpooledUpload` is a context manager; leaving it deletes the temp file, on
+success and on error alike.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from fastapi import UploadFile
+
+from utils.pdf_reader import PdfText, cached_pdf_text, extract_pdf
+
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "100"))
+UPLOAD_SPOOL_MB = float(os.getenv("UPLOAD_SPOOL_MB", "8"))
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+MAX_UPLOAD_BYTES = int(UPLOAD_MAX_MB * 1024 * 1024)
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def _too_large() -> UploadTooLarge:
+    return UploadTooLarge(f"Upload exceeds the {UPLOAD_MAX_MB:g} MB limit")
+
+
+class SpooledUpload:
+    """An upload held in memory up to `spool_bytes`, in a temp file beyond."""
+
+    def __init__(self, suffix: str = "", spool_bytes: int = None):
+        self.suffix = suffix
+        self.spool_bytes = int(UPLOAD_SPOOL_MB * 1024 * 1024) if spool_bytes is None else spool_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._path = None
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def on_disk(self) -> bool:
+        return self._file is not None
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self._file is None and self._buffer.tell() + len(chunk) > self.spool_bytes:
+            self._spill()
+        (self._file or self._buffer).write(chunk)
+
+    def _spill(self) -> None:
+        self._file = tempfile.NamedTemporaryFile(delete=False, suffix=self.suffix)
+        self._path = self._file.name
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = io.BytesIO()
+
+    def path(self) -> str:
+        """Path of a file holding the upload, written out on first use."""
+        if self._file is None:
+            self._spill()
+        self._file.flush()
+        return self._path
+
+    def move_to(self, destination: str) -> str:
+        """Hands the file over to `destination`; it is no longer cleaned up here."""
+        path = self.path()
+        self._file.close()
+        # A rename when both are on one filesystem, a copy otherwise.
+        shutil.move(path, destination)
+        self._file = self._path = None
+        return destination
+
+    def close(self) -> None:
+        self._buffer = io.BytesIO()
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.unlink(self._path)
+            except FileNotFoundError:
+                pass
+            self._file = self._path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def spool_upload(file: UploadFile, suffix: str = "", max_bytes: int = None) -> SpooledUpload:
+    """
+    Copies `file` into a SpooledUpload chunk by chunk, hashing it.
+
+    Raises UploadTooLarge once more than `max_bytes` (default
+    MAX_UPLOAD_BYTES) have been read.
+    """
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large()
+
+    upload = SpooledUpload(suffix)
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            if upload.size + len(chunk) > max_bytes:
+                raise _too_large()
+            if upload.on_disk:
+                await asyncio.to_thread(upload.write, chunk)
+            else:
+                upload.write(chunk)
+    except BaseException:
+        upload.close()
+        raise
+    return upload
+
+
+async def extract_pdf_upload(file: UploadFile) -> PdfText:
+    """Text of an uploaded PDF; the file is only written out and parsed on a cache miss."""
+    with await spool_upload(file, suffix=".pdf") as upload:
+        pdf = await asyncio.to_thread(cached_pdf_text, upload.sha256)
+        if pdf is None:
+            path = await asyncio.to_thread(upload.path)
+            # PDF parsing and OCR are CPU-bound; keep them off the event loop.
+            pdf = await asyncio.to_thread(extract_pdf, path, upload.sha256, False)
+        return pdf